@@ -96,11 +96,23 @@ if b in ORGMODE._documents:
 EOF
 endfunction
 
+function! <SID>OrgInvalidateSettings()
+	exe s:py_version . 'ORGMODE_SETTINGS.invalidate()'
+endfunction
+
 " show and hide Org menu depending on the filetype
 augroup orgmode
 	au BufEnter * :if &filetype == "org" | call <SID>OrgRegisterMenu() | endif
 	au BufLeave * :if &filetype == "org" | call <SID>OrgUnregisterMenu() | endif
 	au BufDelete * :call <SID>OrgDeleteUnusedDocument(expand('<abuf>'))
+	" settings are read from a snapshot of all org_ variables that is taken
+	" again after variables might have been changed
+	if exists('##CmdlineLeave')
+		au CmdlineLeave,BufEnter,FileType * :call <SID>OrgInvalidateSettings()
+	endif
+	if exists('##SourcePost')
+		au SourcePost * :call <SID>OrgInvalidateSettings()
+	endif
 augroup END
 
 " Start orgmode {{{1
@@ -118,9 +130,13 @@ for p in vim.eval("&runtimepath").split(','):
 				break
 
 from orgmode._vim import ORGMODE, insert_at_cursor, get_user_input, date_to_str
+from orgmode import settings as ORGMODE_SETTINGS
+# the settings snapshot is opt-in, without CmdlineLeave variables changed on
+# the command line can't be detected
+ORGMODE_SETTINGS.snapshots_enabled = bool(int(vim.eval(
+	'get(g:, "org_settings_snapshot", 0) && exists("##CmdlineLeave")')))
 ORGMODE.start()
 
-from Date import Date
 import datetime
 EOF
 
@@ -157,7 +173,7 @@ fun CalendarAction(day, month, year, week, dir)
 	" get_user_input
 	exe s:py_version . "modifier = get_user_input(org_timestamp)"
 	" change date according to user input
-	exe s:py_version . "newdate = Date._modify_time(selected_date, modifier)"
+	exe s:py_version . "newdate = ORGMODE.plugins[u'Date']._modify_time(selected_date, modifier)"
 	exe s:py_version . "newdate = date_to_str(newdate)"
 	" close Calendar
 	exe "q"
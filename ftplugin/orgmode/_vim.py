@@ -12,6 +12,7 @@ import re
 import sys
 
 import vim
+from bisect import bisect_left, bisect_right
 from datetime import datetime
 
 import orgmode.keybinding
@@ -19,7 +20,8 @@ import orgmode.menu
 import orgmode.plugins
 import orgmode.settings
 from orgmode.exceptions import PluginError
-from orgmode.vimbuffer import VimBuffer
+from orgmode.pluginloader import LazyPlugin, PluginDict, get_manifest_entry
+from orgmode.vimbuffer import VimBuffer, get_changedticks
 from orgmode.liborgmode.agenda import AgendaManager
 
 
@@ -32,6 +34,18 @@ from orgmode.py3compat.unicode_compatibility import *
 from orgmode.py3compat.encode_compatibility import *
 
 
+def entry_point(f):
+    u"""
+    Decorator for functions that are called from vim. org_ variables might
+    have been changed since the last call, e.g. by a mapping, a timer or
+    another plugin, so the settings snapshot is taken again.
+    """
+    def r(*args, **kwargs):
+        orgmode.settings.invalidate()
+        return f(*args, **kwargs)
+    return r
+
+
 def realign_tags(f):
     u"""
     Update tag alignment, dependency to TagsProperties plugin!
@@ -166,6 +180,7 @@ def get_bufname(bufnr):
             return b.name
 
 
+@entry_point
 def indent_orgmode():
     u""" Set the indent value for the current line in the variable
     b:indent_level
@@ -180,7 +195,7 @@ def indent_orgmode():
     heading = d.current_heading(line - 1)
     if heading and line != heading.start_vim:
         heading.init_checkboxes()
-        checkbox = heading.current_checkbox()
+        checkbox = heading.current_checkbox(line - 1)
         level = heading.level + 1
         if checkbox:
             if line != checkbox.start_vim:
@@ -192,6 +207,7 @@ def indent_orgmode():
         vim.command(u_encode((u'let b:indent_level = %d' % level)))
 
 
+@entry_point
 def fold_text(allow_dirty=False):
     u""" Set the fold text
         :setlocal foldtext=Method-which-calls-foldtext
@@ -222,44 +238,134 @@ def fold_text(allow_dirty=False):
                 str_heading).replace( u'\\', u'\\\\').replace(u'"', u'\\"'), )))
 
 
-def fold_orgmode(allow_dirty=False):
-    u""" Set the fold expression/value for the current line in the variable
-    b:fold_expr
+def _fold_expr(level):
+    u""" Convert a fold level to a vim expression """
+    if isinstance(level, int):
+        return u'%d' % level
+    return u'"%s"' % level
 
-    Vim prerequisites:
-        :setlocal foldmethod=expr
-        :setlocal foldexpr=Method-which-calls-fold_orgmode
 
-    :allow_dirty:    Perform a query without (re)building the DOM if True
+@entry_point
+def fold_levels_orgmode():
+    u""" Store the fold levels of all lines of the current buffer in the list
+    b:orgmode_fold_levels and the changedtick they belong to in
+    b:orgmode_fold_levels_tick. GetOrgFolding() just looks up the fold level
+    of a line as long as the buffer doesn't change. The variables are outside
+    of the org_ namespace, so they don't end up in the settings snapshot.
+
     :returns: None
     """
-    line = int(vim.eval(u_encode(u'v:lnum')))
-    d = ORGMODE.get_document(allow_dirty=allow_dirty)
-    heading = None
-    if allow_dirty:
-        heading = d.find_current_heading(line - 1)
-    else:
-        heading = d.current_heading(line - 1)
+    d = ORGMODE.get_document()
+    vim.command(u_encode(
+        u'let b:orgmode_fold_levels = [%s] | let b:orgmode_fold_levels_tick = %d' % (
+            u','.join(_fold_expr(level) for level in d.fold_levels()),
+            d.changedtick)))
 
-    # if cache_heading != heading:
-        # heading.init_checkboxes()
-        # checkbox = heading.current_checkbox()
 
-    # cache_heading = heading
-    if heading:
-        # if checkbox:
-            # vim.command((u'let b:fold_expr = ">%d"' % heading.level + checkbox.level).encode(u'utf-8'))
-        if 0:
-            pass
-        elif line == heading.start_vim:
-            vim.command(u_encode(u'let b:fold_expr = ">%d"' % heading.level))
-        #elif line == heading.end_vim:
-        #    vim.command((u'let b:fold_expr = "<%d"' % heading.level).encode(u'utf-8'))
-        # end_of_last_child_vim is a performance junky and is actually not needed
-        #elif line == heading.end_of_last_child_vim:
-        #    vim.command((u'let b:fold_expr = "<%d"' % heading.level).encode(u'utf-8'))
+def _closed_folds(starts):
+    # manual folds move with the text, a closed fold still starts at its
+    # heading
+    return set(int(i) for i in vim.eval(u_encode(
+        u"filter([%s], 'foldclosed(v:val) == v:val')" %
+        u','.join(u'%d' % start for start in starts))) or [])
+
+
+@entry_point
+def apply_folds_orgmode(incremental=False):
+    u""" Create a manual fold for every heading of the current buffer, ranging
+    from the heading to the end of its last child. All folds are replaced in
+    one batched command sequence. Folds that were closed before stay closed,
+    when the folds are created for the first time 'foldlevel' decides which
+    folds are closed. The changedtick the folds belong to is stored in
+    b:orgmode_folds_tick.
+
+    If incremental is True only the folds of the top level headings that were
+    parsed again since the folds were applied the last time are replaced. The
+    other folds and their state are left alone.
+
+    Vim prerequisites:
+        :setlocal foldmethod=manual
+
+    :incremental:    Replace just the folds of the changed headings if possible
+    :returns: None
+    """
+    d = ORGMODE.get_document()
+    changed = d.pop_changed_range()
+    first = int(vim.eval(u_encode(u'get(b:, "orgmode_folds_tick", -1)'))) == -1
+
+    if not incremental or first or changed is None:
+        ranges = [(h.start_vim, h.end_of_last_child_vim)
+                  for h in d.all_headings()]
+        closed = set()
+        if ranges and not first:
+            closed = _closed_folds(start for start, _ in ranges)
+
+        # nested folds are created before the folds containing them,
+        # otherwise a new fold inside of a closed fold would cover the
+        # whole closed fold
+        cmds = [u'exe "normal! zE"']
+        cmds.extend(u'%d,%dfold' % r for r in reversed(ranges))
+        if first:
+            cmds.append(u'let &l:foldlevel = &l:foldlevel')
         else:
-            vim.command(u_encode(u'let b:fold_expr = %d' % heading.level))
+            cmds.append(u'%foldopen!')
+            # close the innermost folds first
+            cmds.extend(u'%dfoldclose' % start
+                        for start, _ in reversed(ranges) if start in closed)
+        cmds.append(u'let b:orgmode_folds_tick = %d' % d.changedtick)
+        vim.command(u_encode(u' | '.join(cmds)))
+        return
+
+    # the changed range consists of complete top level headings
+    toplevel = d.headings
+    starts = [h.start for h in toplevel]
+    i = max(0, bisect_right(starts, changed[0]) - 1)
+    j = bisect_left(starts, changed[1])
+    if i >= j:
+        vim.command(u_encode(u'let b:orgmode_folds_tick = %d' % d.changedtick))
+        return
+
+    ranges = []
+    h = toplevel[i]
+    stop = toplevel[j] if j < len(toplevel) else None
+    while h is not None and h is not stop:
+        ranges.append((h.start_vim, h.end_of_last_child_vim))
+        h = h.next_heading
+    start, end = ranges[0][0], toplevel[j - 1].end_of_last_child_vim
+    closed = _closed_folds(r[0] for r in ranges)
+
+    # delete the folds of the range with zD in visual mode, the cursor
+    # position and the last visual selection are restored afterwards
+    cmds = [
+        u'let g:orgmode_fold_view = [winsaveview(), getpos("\'<"), getpos("\'>")]',
+        u'silent! exe "keepjumps normal! %dGV%dGzD"' % (start, end)]
+    cmds.extend(u'%d,%dfold' % r for r in reversed(ranges))
+    cmds.append(u'%d,%dfoldopen!' % (start, end))
+    cmds.extend(u'%dfoldclose' % r[0]
+                for r in reversed(ranges) if r[0] in closed)
+    cmds.extend((
+        u'call setpos("\'<", g:orgmode_fold_view[1])',
+        u'call setpos("\'>", g:orgmode_fold_view[2])',
+        u'call winrestview(g:orgmode_fold_view[0])',
+        u'unlet g:orgmode_fold_view',
+        u'let b:orgmode_folds_tick = %d' % d.changedtick))
+    vim.command(u_encode(u' | '.join(cmds)))
+
+
+@entry_point
+def update_folds_orgmode():
+    u""" Re-apply the manual folds of the changed headings of the current
+    buffer if it changed since the folds were created. Nothing is done if the
+    folds are not created by apply_folds_orgmode().
+
+    :returns: None
+    """
+    tick = vim.eval(u_encode(u'get(b:, "orgmode_folds_tick", -1)'))
+    if tick is None or int(tick) == -1:
+        return
+    d = ORGMODE.get_document()
+    if int(tick) != d.changedtick:
+        apply_folds_orgmode(incremental=True)
 
 
 def date_to_str(date):
@@ -299,12 +405,57 @@ class OrgMode(object):
         if bufnr in self._documents:
             if allow_dirty or self._documents[bufnr].is_insync:
                 return self._documents[bufnr]
+        return self._load_document(bufnr)
+
+    def get_documents(self, bufnrs, allow_dirty=False):
+        u""" Retrieve the documents of many vim buffers. Whether the known
+        documents are still in sync is checked with a single call into vim.
+
+        :bufnrs:         Retrieve documents with these bufnrs, 0 is the
+                        current buffer
+        :allow_dirty:    Allow the retrieved documents to be dirty
+
+        :returns:    list of vim buffer instances in the order of bufnrs
+        """
+        current = vim.current.buffer.number
+        bufnrs = [current if bufnr == 0 else bufnr for bufnr in bufnrs]
+
+        known = []
+        for bufnr in bufnrs:
+            if bufnr in self._documents and bufnr not in known:
+                known.append(bufnr)
+        if allow_dirty:
+            insync = set(known)
+        else:
+            insync = set(
+                bufnr for bufnr, tick in zip(known, get_changedticks(known))
+                if self._documents[bufnr].sync_changedtick(tick))
+
+        for bufnr in bufnrs:
+            if bufnr not in insync:
+                self._load_document(bufnr)
+                insync.add(bufnr)
+        return [self._documents[bufnr] for bufnr in bufnrs]
+
+    def _load_document(self, bufnr):
+        if bufnr in self._documents:
+            # reparse just the changed parts of the document
+            if self._documents[bufnr].update_dom():
+                return self._documents[bufnr]
         self._documents[bufnr] = VimBuffer(bufnr).init_dom()
         return self._documents[bufnr]
 
     @property
     def plugins(self):
-        return self._plugins.copy()
+        u""" The registered plugins by name. Plugins that were deferred by
+        defer_plugin() are imported when they are looked up.
+
+        All mappings, commands, autocommands and timers call the plugins
+        through this property, the settings snapshot is taken again for
+        every call.
+        """
+        orgmode.settings.invalidate()
+        return PluginDict(self._plugins, self._load_deferred_plugin)
 
     @orgmode.keybinding.register_keybindings
     @orgmode.keybinding.register_commands
@@ -321,12 +472,84 @@ class OrgMode(object):
         if plugin in self._plugins:
             raise PluginError(u'Plugin %s has already been loaded')
 
+        instance = self._load_plugin(plugin)
+        if instance is not None:
+            self._plugins[plugin] = instance
+        return instance
+
+    @orgmode.keybinding.register_keybindings
+    @orgmode.keybinding.register_commands
+    @orgmode.menu.register_menu
+    def defer_plugin(self, plugin):
+        u""" Register the keybindings, commands and menu entries of a plugin
+        from the manifest without importing the plugin. It's imported when
+        it's looked up in ORGMODE.plugins for the first time.
+
+        :plugin:    name of the plugin
+        :returns:   LazyPlugin or None if the plugin isn't in the manifest
+        """
+        if plugin in self._plugins:
+            raise PluginError(u'Plugin %s has already been loaded')
+
+        description = get_manifest_entry(plugin)
+        if description is None:
+            return
+        # other plugins might depend on the default settings
+        for setting, value in description[u'settings']:
+            orgmode.settings.set(setting, value)
+        self._plugins[plugin] = LazyPlugin(plugin, description, self.orgmenu)
+        return self._plugins[plugin]
+
+    @staticmethod
+    def _is_deferrable(plugin):
+        u""" Return True if the plugin is in the manifest and registering it
+        just creates keybindings, commands and menu entries
+        """
+        description = get_manifest_entry(plugin)
+        return description is not None and not description[u'eager']
+
+    def _load_deferred_plugin(self, plugin):
+        u""" Import a plugin that was deferred. Its keybindings, commands and
+        menu entries have already been created from the manifest.
+
+        :plugin:    name of the plugin
+        :returns:   the plugin instance
+        """
+        lazy = self._plugins.get(plugin)
+        if not isinstance(lazy, LazyPlugin):
+            return self._plugins[plugin]
+
+        # the plugin adds its menu to the end of the org menu, the menu of
+        # the LazyPlugin is kept at its place instead
+        menu = self.orgmenu.children
+        instance = self._load_plugin(plugin)
+        for entry in self.orgmenu.children:
+            if entry not in menu:
+                self.orgmenu - entry
+        if instance is None:
+            del self._plugins[plugin]
+            raise KeyError(plugin)
+        self._plugins[plugin] = instance
+        return instance
+
+    def _load_plugin(self, plugin):
+        u""" Import a plugin and register it, the keybindings, commands and
+        menu entries are not created
+
+        :plugin:    name of the plugin
+        :returns:   the plugin instance or None if the plugin can't be
+                    created
+        """
+
         # a python module
         module = None
 
         # actual plugin class
         _class = None
 
+        # instance of the plugin class
+        instance = None
+
         # locate module and initialize plugin class
         try:
             module = imp.find_module(plugin, orgmode.plugins.__path__)
@@ -348,17 +571,19 @@ class OrgMode(object):
                     raise PluginError(u'Unable to find class %s' % plugin)
                 return
             _class = getattr(module, plugin)
-            self._plugins[plugin] = _class()
-            self._plugins[plugin].register()
+            instance = _class()
+            instance.register()
             if self.debug:
                 echo(u'Plugin registered: %s' % plugin)
-            return self._plugins[plugin]
+            return instance
         except BaseException as e:
             echoe(u'Unable to activate plugin: %s' % plugin)
             echoe(u"%s" % e)
             if self.debug:
                 import traceback
                 echoe(traceback.format_exc())
+            # the plugin is kept if just its registration failed
+            return instance
 
     def register_keybindings(self):
         @orgmode.keybinding.register_keybindings
@@ -379,24 +604,26 @@ class OrgMode(object):
         vim.command(u_encode(u'silent! aunmenu Org'))
 
     def start(self):
-        u""" Start orgmode and load all requested plugins
+        u""" Start orgmode and load all requested plugins. If
+        g:org_lazy_plugins is set, plugins that are in the manifest are just
+        imported when they are used for the first time.
         """
         plugins = orgmode.settings.get(u"org_plugins")
+        lazy = bool(int(orgmode.settings.get(u'org_lazy_plugins', 0)))
 
         if not plugins:
             echom(u'orgmode: No plugins registered.')
 
         if isinstance(plugins, basestring):
-            try:
-                self.register_plugin(plugins)
-            except BaseException as e:
-                import traceback
-                traceback.print_exc()
-        elif isinstance(plugins, list) or \
+            plugins = [plugins]
+        if isinstance(plugins, list) or \
                 isinstance(plugins, tuple):
             for p in plugins:
                 try:
-                    self.register_plugin(p)
+                    if lazy and p != u'|' and self._is_deferrable(p):
+                        self.defer_plugin(p)
+                    else:
+                        self.register_plugin(p)
                 except BaseException as e:
                     echoe('Error in %s plugin:' % p)
                     import traceback
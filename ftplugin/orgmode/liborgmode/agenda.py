@@ -10,12 +10,17 @@ u"""
     Features:
     * filtering
     * sorting
+
+    The headings are looked up in the agenda index of every document instead
+    of filtering all headings, see agendaindex.
 """
 
+from datetime import datetime
+from datetime import timedelta
+
+from orgmode.liborgmode.agendafilter import active_todo
 from orgmode.liborgmode.agendafilter import filter_items
-from orgmode.liborgmode.agendafilter import is_within_week_and_active_todo
-from orgmode.liborgmode.agendafilter import contains_active_todo
-from orgmode.liborgmode.agendafilter import contains_active_date
+from orgmode.liborgmode.agendafilter import get_active_todo_states
 
 
 class AgendaManager(object):
@@ -31,9 +36,10 @@ class AgendaManager(object):
         """
         filtered = []
         for document in iter(documents):
-            # filter and return headings
-            filtered.extend(filter_items(document.all_headings(),
-                                [contains_active_todo]))
+            # look up the headings in the document's agenda index, the todo
+            # states are resolved once per document
+            filtered.extend(document.agenda_index().todos(
+                get_active_todo_states(document)))
         return sorted(filtered)
 
     def get_next_week_and_active_todo(self, documents):
@@ -41,11 +47,14 @@ class AgendaManager(object):
         Get the agenda for next week for the given documents (list of
         document).
         """
+        next_week = datetime.today() + timedelta(days=7)
         filtered = []
         for document in iter(documents):
-            # filter and return headings
-            filtered.extend(filter_items(document.all_headings(),
-                                [is_within_week_and_active_todo]))
+            # look up the headings in the document's agenda index, the todo
+            # filter is compiled once per document
+            filtered.extend(filter_items(
+                document.agenda_index().dated_before(next_week),
+                [active_todo(document)]))
         return sorted(filtered)
 
     def get_timestamped_items(self, documents):
@@ -55,7 +64,6 @@ class AgendaManager(object):
         """
         filtered = []
         for document in iter(documents):
-            # filter and return headings
-            filtered.extend(filter_items(document.all_headings(),
-                                [contains_active_date]))
+            # look up the headings in the document's agenda index
+            filtered.extend(document.agenda_index().dated())
         return sorted(filtered)
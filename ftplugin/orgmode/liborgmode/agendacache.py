@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+
+u"""
+    agendacache
+    ~~~~~~~~~~~~~~~~
+
+    AgendaCache keeps the agenda relevant data of org files on disk. For
+    every file the headings with a todo state or an active date are stored
+    together with their tags and line numbers.
+
+    An entry is valid as long as the path, mtime and size of the file match.
+    If just the mtime or the size changed, the content hash decides whether
+    the file needs to be parsed again. Files with a valid entry are never
+    read.
+
+    Files that need to be parsed can be scanned in a pool of worker
+    processes. The workers just return the compact heading records that are
+    stored in the cache, the headings are created in the main process.
+"""
+
+import codecs
+import hashlib
+import json
+import os
+import threading
+
+from orgmode.liborgmode.documents import Document
+from orgmode.liborgmode.filedocument import FileDocument
+from orgmode.liborgmode.headings import Heading
+from orgmode.liborgmode.orgdate import get_orgdate
+
+from orgmode.py3compat.encode_compatibility import *
+from orgmode.py3compat.unicode_compatibility import *
+
+# increase when the format of the entries changes
+CACHE_VERSION = 1
+
+
+class AgendaFile(Document):
+    u"""
+    Read only document of an agenda file. It contains just the agenda
+    relevant headings, without their bodies and without the tree structure.
+    """
+
+    def __init__(self, path, headings, todo_states, bufnr=None):
+        u"""
+        Args:
+            path (str): path of the org file
+            headings (list): agenda relevant headings of the file
+            todo_states (list): todo states the file was parsed with
+            bufnr (int): number of the file's vim buffer if there is one
+        """
+        Document.__init__(self)
+        self.path = path
+        self.bufnr = bufnr
+        self.todo_states = todo_states
+        self._agenda_headings = headings
+        for h in headings:
+            h._document = self
+
+    def all_headings(self):
+        u""" Iterate over the agenda relevant headings of the file """
+        return iter(self._agenda_headings)
+
+
+def hash_file(path):
+    u""" Compute the hash of the content of a file """
+    digest = hashlib.sha1()
+    with open(path, u'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def extract_headings(path, todo_states):
+    u""" Parse a file and extract the agenda relevant headings
+
+    Returns:
+        list: [[start, level, todo, title, tags, active date], ..]
+    """
+    document = FileDocument(path, todo_states).init_dom()
+
+    headings = []
+    for h in document.all_headings():
+        active_date = h.active_date
+        if h.todo is None and active_date is None:
+            continue
+        headings.append([
+            h.start, h.level, h.todo, h.title, list(h.tags),
+            unicode(active_date) if active_date is not None else None])
+    return headings
+
+
+def scan_file(job):
+    u""" Hash a file and extract its agenda relevant headings if the hash
+    differs from the known one. This runs in worker processes, the job and
+    the result are kept small for that reason.
+
+    Args:
+        job (tuple): (path, todo states, known hash or None)
+
+    Returns:
+        tuple: (hash, headings), headings is None if the hash is the known
+            one and both are None if the file can't be read
+    """
+    path, todo_states, known_hash = job
+    try:
+        digest = hash_file(path)
+        if digest == known_hash:
+            return digest, None
+        return digest, extract_headings(path, todo_states)
+    except (IOError, OSError):
+        return None, None
+
+
+def _is_main_thread():
+    main_thread = getattr(threading, u'main_thread', None)
+    if main_thread is not None:
+        return threading.current_thread() is main_thread()
+    # python 2
+    return isinstance(threading.current_thread(), threading._MainThread)
+
+
+def parallel_map(function, items, processes=0):
+    u""" Apply function to all items in a pool of worker processes. The
+    workers are forked from the current process because inside vim the
+    python executable isn't available to spawn new ones. Forking copies the
+    whole vim process, the workers just run function and exit.
+
+    If processes is lower than 2, forking isn't supported, e.g. on Windows or
+    with Python 2, this isn't the main thread or other threads are running,
+    e.g. an AgendaLoader, the items are processed one after another. Forking
+    isn't safe while there are other threads: the child only gets the forking
+    thread, locks held by the other threads, e.g. the lock of an LRUCache,
+    stay locked in it.
+
+    Args:
+        function: module level function that is applied to every item
+        items (list): picklable items
+        processes (int): maximum number of worker processes
+
+    Returns:
+        list: results in the order of the items
+    """
+    items = list(items)
+    processes = min(processes, len(items))
+    if processes < 2 or not _is_main_thread() or \
+            threading.active_count() > 1:
+        return [function(i) for i in items]
+    try:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context(u'fork'))
+    except (ImportError, AttributeError, TypeError, ValueError):
+        return [function(i) for i in items]
+    with executor:
+        # a few chunks per worker keep the load balanced
+        return list(executor.map(function, items,
+                                 chunksize=max(1, len(items) // (processes * 4))))
+
+
+class AgendaCache(object):
+    u"""
+    Persistent cache of the agenda relevant data of org files. Every file is
+    stored as a JSON file of its own in the cache directory.
+    """
+
+    def __init__(self, directory):
+        u"""
+        Args:
+            directory (str): cache directory, it's created when the first
+                entry is stored. If it's None, nothing is stored and all files
+                are scanned every time.
+        """
+        object.__init__(self)
+        self.directory = directory
+        # path -> (mtime, size, todo states, AgendaFile) of the documents that
+        # were returned before, they are reused as long as the file doesn't
+        # change to keep their agenda indexes
+        self._documents = {}
+        # the agenda files might be loaded in a background thread while
+        # the main thread reads the cache too, see AgendaLoader
+        self._lock = threading.RLock()
+
+    def _entry_path(self, path):
+        name = hashlib.sha1(path.encode(u'utf-8') if isinstance(path, unicode)
+                            else path).hexdigest()
+        return os.path.join(self.directory, name + u'.json')
+
+    def _read_entry(self, path):
+        if self.directory is None:
+            return None
+        try:
+            with codecs.open(self._entry_path(path), u'r', u'utf-8') as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if not isinstance(entry, dict) or \
+                entry.get(u'version') != CACHE_VERSION or \
+                entry.get(u'path') != path:
+            return None
+        return entry
+
+    def _write_entry(self, path, entry):
+        if self.directory is None:
+            return
+        entry_path = self._entry_path(path)
+        tmp_path = u'%s.%d.tmp' % (entry_path, os.getpid())
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            with codecs.open(tmp_path, u'w', u'utf-8') as f:
+                f.write(unicode(json.dumps(entry)))
+            if os.name == u'nt' and os.path.exists(entry_path):
+                os.remove(entry_path)
+            os.rename(tmp_path, entry_path)
+        except (IOError, OSError):
+            # the cache is just an optimization, ignore failures
+            pass
+
+    def load(self, path, todo_states, bufnr=None):
+        u""" Get the agenda relevant data of an org file. The file is just
+        read if the cache doesn't contain a valid entry for it.
+
+        Args:
+            path (str): absolute path of the org file
+            todo_states (list): [([todo states], [done states]), ..]
+            bufnr (int): number of the file's vim buffer if there is one
+
+        Returns:
+            AgendaFile: document with the agenda relevant headings
+
+        Raises:
+            IOError, OSError: if the file can't be read
+        """
+        # raise an error for missing files
+        os.stat(path)
+        document = self.load_all([path], todo_states)[0]
+        if document is None:
+            # the file disappeared or isn't readable anymore
+            open(path, u'rb').close()
+            raise IOError(u'Unable to read %s' % path)
+        document.bufnr = bufnr
+        return document
+
+    def load_all(self, paths, todo_states, processes=0):
+        u""" Get the agenda relevant data of many org files. Files without a
+        valid entry are scanned one after another or, if processes is
+        greater than 1, in a pool of worker processes.
+
+        Args:
+            paths (list): absolute paths of the org files
+            todo_states (list): [([todo states], [done states]), ..]
+            processes (int): number of worker processes
+
+        Returns:
+            list: AgendaFile for every path, None for files that can't be
+                read
+        """
+        with self._lock:
+            return self._load_all(paths, todo_states, processes)
+
+    def _load_all(self, paths, todo_states, processes):
+        states = [[list(todo), list(done)] for todo, done in todo_states]
+        entries = [None] * len(paths)
+        jobs = []
+        pending = []
+        documents = [None] * len(paths)
+        for i, path in enumerate(paths):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            known = self._documents.get(path)
+            if known is not None and \
+                    known[:3] == (stat.st_mtime, stat.st_size, states):
+                documents[i] = known[3]
+                documents[i].bufnr = None
+                continue
+            entry = self._read_entry(path)
+            if entry is not None and entry[u'todo_states'] != states:
+                entry = None
+            if entry is not None and entry[u'mtime'] == stat.st_mtime and \
+                    entry[u'size'] == stat.st_size:
+                entries[i] = entry
+                continue
+            jobs.append((path, todo_states,
+                         entry[u'hash'] if entry is not None else None))
+            pending.append((i, path, stat, entry))
+
+        for (i, path, stat, entry), (digest, headings) in \
+                zip(pending, parallel_map(scan_file, jobs, processes)):
+            if digest is None:
+                continue
+            if headings is not None:
+                entry = {
+                    u'version': CACHE_VERSION,
+                    u'path': path,
+                    u'todo_states': states,
+                    u'hash': digest,
+                    u'headings': headings}
+            entry[u'mtime'] = stat.st_mtime
+            entry[u'size'] = stat.st_size
+            self._write_entry(path, entry)
+            entries[i] = entry
+
+        for i, (path, entry) in enumerate(zip(paths, entries)):
+            if entry is None:
+                continue
+            documents[i] = AgendaFile(
+                path, self._restore(entry[u'headings']), todo_states)
+            self._documents[path] = (entry[u'mtime'], entry[u'size'], states,
+                                     documents[i])
+        return documents
+
+    @staticmethod
+    def _restore(headings):
+        u""" Create headings from the stored data """
+        res = []
+        for start, level, todo, title, tags, active_date in headings:
+            h = Heading(level=level, title=title, tags=tags, todo=todo)
+            if active_date is not None:
+                h.active_date = get_orgdate(active_date)
+            h._dirty_heading = False
+            h._dirty_body = False
+            h._orig_start = start
+            h._orig_len = 1
+            res.append(h)
+        return res
@@ -8,11 +8,17 @@ u"""
     agenda.
 
 
-    All functions except filter_items() in the module are filters. Given a
-    heading they return if the heading meets the criteria of the filter.
+    The functions contains_active_todo(), contains_active_date(),
+    is_within_week() and is_within_week_and_active_todo() are filters. Given
+    a heading they return if the heading meets the criteria of the filter.
 
     The function filter_items() can combine different filters and only returns
     the filtered headings.
+
+    Filters that depend on settings or on the current time should be compiled
+    once per query with the filter factories, e.g. active_todo() or
+    within_week(). Compiled filters precompute everything they need and don't
+    call vim when they are applied to a heading.
 """
 from datetime import datetime
 from datetime import timedelta
@@ -51,10 +57,7 @@ def is_within_week(heading):
         bool: True if the date in the deading is within a week in the future (or
             older False otherwise.
     """
-    if contains_active_date(heading):
-        next_week = datetime.today() + timedelta(days=7)
-        if heading.active_date < next_week:
-            return True
+    return within_week()(heading)
 
 
 def is_within_week_and_active_todo(heading):
@@ -66,20 +69,31 @@ def is_within_week_and_active_todo(heading):
     return is_within_week(heading) and contains_active_todo(heading)
 
 
+def get_active_todo_states(document=None):
+    u"""
+    Args:
+        document (Document): document whose todo states are used, the current
+            document if None
+
+    Returns:
+        frozenset: The active todo states of the document.
+    """
+    if document is None:
+        # TODO why is this import failing at top level? circular dependency...
+        from orgmode._vim import ORGMODE
+        document = ORGMODE.get_document()
+    return document.todo_keywords().active
+
+
 def contains_active_todo(heading):
     u"""
+    The todo states of the heading's document are used. Use active_todo() to
+    test many headings.
 
     Returns:
         bool: True if heading contains an active TODO.
     """
-    # TODO make this more efficient by checking some val and not calling the
-    # function
-    # TODO why is this import failing at top level? circular dependency...
-    from orgmode._vim import ORGMODE
-    active = []
-    for act in ORGMODE.get_document().get_todo_states():
-        active.extend(act[0])
-    return heading.todo in active
+    return active_todo(heading.document)(heading)
 
 
 def contains_active_date(heading):
@@ -89,3 +103,39 @@ def contains_active_date(heading):
         bool: True if heading contains an active date.
     """
     return not(heading.active_date is None)
+
+
+def active_todo(document=None):
+    u""" Compile a filter for headings with an active TODO of document.
+
+    Args:
+        document (Document): document whose todo states are used, the current
+            document if None
+
+    Returns:
+        function: filter that tests a heading's todo state against the
+            precomputed set of active todo states
+    """
+    active = get_active_todo_states(document)
+
+    def contains_active_todo(heading):
+        return heading.todo in active
+    return contains_active_todo
+
+
+def within_week(now=None):
+    u""" Compile a filter for headings with an active date within a week.
+
+    Args:
+        now (datetime): start of the week, the current time if None
+
+    Returns:
+        function: filter that tests a heading's active date against the
+            precomputed end of the week
+    """
+    next_week = (now or datetime.today()) + timedelta(days=7)
+
+    def is_within_week(heading):
+        active_date = heading.active_date
+        return active_date is not None and active_date < next_week
+    return is_within_week
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+u"""
+    agendaindex
+    ~~~~~~~~~~~~~~~~
+
+    AgendaIndex keeps the headings of a document by todo state, by active
+    date and by tag so that the agenda doesn't need to look at every heading
+    of every document.
+
+    The index is built when it's requested for the first time. Headings that
+    change afterwards are marked stale and indexed again with the next
+    request, structural changes of the document drop the whole index.
+"""
+
+import datetime
+from bisect import bisect_left, bisect_right, insort
+
+from orgmode.liborgmode.orgdate import OrgTimeRange
+
+
+def _date_key(active_date):
+    u""" Get the key of an active date in the date index and the kind of the
+    key. Dates and datetimes are kept apart because a date is compared to a
+    datetime by the day only. Time ranges are indexed by their start.
+
+    Returns:
+        tuple: (key, True if key is a datetime) or (None, None)
+    """
+    if isinstance(active_date, OrgTimeRange):
+        active_date = active_date.start
+    if isinstance(active_date, datetime.datetime):
+        return (active_date.year, active_date.month, active_date.day,
+                active_date.hour, active_date.minute), True
+    if isinstance(active_date, datetime.date):
+        return (active_date.year, active_date.month, active_date.day), False
+    return None, None
+
+
+class AgendaIndex(object):
+    u"""
+    Secondary indexes of the headings of a document: by todo state, by
+    active date and by tag.
+    """
+
+    def __init__(self, headings):
+        u"""
+        Args:
+            headings: all headings of the document in serialized order
+        """
+        object.__init__(self)
+        # heading -> (sequence number, todo, date key, datetime, tags)
+        self._entries = {}
+        # todo state -> sorted [(sequence number, heading)]
+        self._todos = {}
+        # sorted [(date key, sequence number, heading)] of dates and datetimes
+        self._dates = []
+        self._datetimes = []
+        # tag -> sorted [(sequence number, heading)]
+        self._tags = {}
+        # headings that changed since they were indexed
+        self._stale = set()
+        self._next_seq = 0
+        for h in headings:
+            self._add(h, self._next_seq)
+            self._next_seq += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _add(self, heading, seq):
+        todo = heading.todo
+        key, is_datetime = _date_key(heading.active_date)
+        # don't create empty tag lists for headings without tags
+        heading._parse_heading()
+        tags = tuple(heading._tags or ())
+        self._entries[heading] = (seq, todo, key, is_datetime, tags)
+        if todo is not None:
+            insort(self._todos.setdefault(todo, []), (seq, heading))
+        if key is not None:
+            insort(self._datetimes if is_datetime else self._dates,
+                   (key, seq, heading))
+        for tag in tags:
+            insort(self._tags.setdefault(tag, []), (seq, heading))
+
+    def _remove(self, heading):
+        u""" Remove heading from all indexes
+
+        Returns:
+            int: the sequence number of heading or None if it isn't indexed
+        """
+        entry = self._entries.pop(heading, None)
+        if entry is None:
+            return
+        seq, todo, key, is_datetime, tags = entry
+        if todo is not None:
+            self._todos[todo].remove((seq, heading))
+        if key is not None:
+            dates = self._datetimes if is_datetime else self._dates
+            del dates[bisect_left(dates, (key, seq))]
+        for tag in tags:
+            self._tags[tag].remove((seq, heading))
+        return seq
+
+    def mark_stale(self, heading):
+        u""" Index heading again before the next lookup """
+        self._stale.add(heading)
+
+    def refresh(self, document):
+        u""" Index the stale headings again
+
+        Args:
+            document (Document): document of the index, stale headings that
+                were moved to a different document are removed
+        """
+        if not self._stale:
+            return
+        stale, self._stale = self._stale, set()
+        for h in stale:
+            seq = self._remove(h)
+            if h._document is not document:
+                continue
+            if seq is None:
+                seq = self._next_seq
+                self._next_seq += 1
+            self._add(h, seq)
+
+    def todos(self, states):
+        u""" Get the headings with one of the todo states
+
+        Args:
+            states (list): todo states
+
+        Returns:
+            list: headings in serialized order
+        """
+        res = []
+        for s in set(states):
+            res.extend(self._todos.get(s, ()))
+        res.sort()
+        return [h for _, h in res]
+
+    def dated(self):
+        u""" Get all headings with an active date
+
+        Returns:
+            list: headings in serialized order
+        """
+        return self._merge(self._dates, self._datetimes)
+
+    def dated_before(self, moment):
+        u""" Get the headings with an active date before moment. Dates without
+        a time are compared to the day of moment only.
+
+        Args:
+            moment (datetime): upper bound, excluding
+
+        Returns:
+            list: headings in serialized order
+        """
+        dates = self._dates[:bisect_left(
+            self._dates, ((moment.year, moment.month, moment.day), ))]
+        key = (moment.year, moment.month, moment.day, moment.hour,
+               moment.minute)
+        if moment.second or moment.microsecond:
+            # the keys don't contain seconds, datetimes within the minute of
+            # moment are before moment
+            end = bisect_right(self._datetimes, (key, float(u'inf')))
+        else:
+            end = bisect_left(self._datetimes, (key, ))
+        return self._merge(dates, self._datetimes[:end])
+
+    def tagged(self, tag):
+        u""" Get the headings with tag
+
+        Returns:
+            list: headings in serialized order
+        """
+        return [h for _, h in self._tags.get(tag, ())]
+
+    @staticmethod
+    def _merge(dates, datetimes):
+        u""" Merge date and datetime entries into serialized order. Sorting
+        the result by date keeps the serialized order of headings with equal
+        dates, just like filtering all headings does.
+        """
+        res = [(seq, h) for _, seq, h in dates]
+        res.extend((seq, h) for _, seq, h in datetimes)
+        res.sort()
+        return [h for _, h in res]
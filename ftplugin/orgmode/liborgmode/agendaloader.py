@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+u"""
+    agendaloader
+    ~~~~~~~~~~~~~~~~
+
+    AgendaLoader loads agenda files in a background thread so that the editor
+    isn't blocked while they are read and parsed. Finished files are queued
+    and fetched from the main thread, e.g. by a vim timer, which is the only
+    thread that is allowed to access vim.
+"""
+
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class AgendaLoader(object):
+    u"""
+    Load agenda files in a background thread, a batch of files at a time.
+    """
+
+    def __init__(self, load, paths, batch_size=1):
+        u"""
+        Args:
+            load: function that loads a list of paths and returns a document
+                or None for every path, it's called in the background thread
+            paths (list): paths of the agenda files
+            batch_size (int): number of files that are loaded together
+        """
+        object.__init__(self)
+        self.paths = list(paths)
+        self.batch_size = max(1, batch_size)
+        self._load = load
+        self._queue = queue.Queue()
+        self._cancelled = threading.Event()
+        self._finished = False
+        self._error = None
+        self._thread = threading.Thread(target=self._run)
+        # don't keep vim from exiting
+        self._thread.daemon = True
+
+    def _run(self):
+        try:
+            for i in range(0, len(self.paths), self.batch_size):
+                if self._cancelled.is_set():
+                    break
+                paths = self.paths[i:i + self.batch_size]
+                documents = self._load(paths)
+                if self._cancelled.is_set():
+                    break
+                self._queue.put(list(zip(paths, documents)))
+        except Exception as e:
+            self._error = e
+        finally:
+            # marks the end of the results
+            self._queue.put(None)
+
+    def start(self):
+        u""" Start loading the files in the background """
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        u""" Stop loading, the batch that's loaded right now is dropped """
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        u""" True if loading was cancelled """
+        return self._cancelled.is_set()
+
+    @property
+    def finished(self):
+        u""" True if all results were fetched """
+        return self._finished
+
+    def fetch(self, timeout=None):
+        u""" Fetch the files that were loaded since the last call. Doesn't
+        block unless a timeout is given.
+
+        Args:
+            timeout (float): seconds to wait for the next batch
+
+        Returns:
+            list: [(path, document or None), ..]
+
+        Raises:
+            Exception: the error that stopped the background thread
+        """
+        res = []
+        block = timeout is not None
+        while not self._finished:
+            try:
+                batch = self._queue.get(block, timeout)
+            except queue.Empty:
+                break
+            block = False
+            if batch is None:
+                self._finished = True
+                if self._error is not None:
+                    raise self._error
+            else:
+                res.extend(batch)
+        return res
+
+    def join(self, timeout=None):
+        u""" Wait for the background thread to finish """
+        self._thread.join(timeout)
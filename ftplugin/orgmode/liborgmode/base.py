@@ -20,6 +20,8 @@ except ImportError:
     from collections import Iterable
 
 import sys
+import threading
+from collections import OrderedDict
 from orgmode.py3compat.unicode_compatibility import *
 
 
@@ -149,6 +151,164 @@ class MultiPurposeList(UserList):
         self._changed()
 
 
+class FenwickTree(object):
+    u"""
+    A Fenwick tree (binary indexed tree) stores a list of numbers. Single
+    values can be changed and prefix sums computed in O(log n).
+    """
+
+    def __init__(self, values=None):
+        u"""
+        :values:    Initial values, the tree is built in O(n)
+        """
+        object.__init__(self)
+        tree = [0]
+        if values:
+            tree.extend(values)
+        size = len(tree)
+        for i in range(1, size):
+            j = i + (i & -i)
+            if j < size:
+                tree[j] += tree[i]
+        self._tree = tree
+
+    def __len__(self):
+        return len(self._tree) - 1
+
+    def add(self, index, delta):
+        u""" Add delta to the value at index """
+        i = index + 1
+        size = len(self._tree)
+        while i < size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, index):
+        u""" Return the sum of the values before index """
+        res = 0
+        i = index
+        while i > 0:
+            res += self._tree[i]
+            i -= i & -i
+        return res
+
+    def search(self, value):
+        u""" Return the number of leading values whose sum doesn't exceed
+        value. All values must be positive. """
+        tree = self._tree
+        size = len(tree) - 1
+        res = 0
+        step = 1 << size.bit_length() if size else 0
+        while step:
+            i = res + step
+            if i <= size and tree[i] <= value:
+                res = i
+                value -= tree[i]
+            step >>= 1
+        return res
+
+
+class LRUCache(object):
+    u"""
+    A mapping with a maximum size. If it's full, the least recently used
+    item is dropped. Hits and misses are counted.
+
+    It can be shared between threads, e.g. the agenda files are parsed in a
+    background thread, see agendaloader.
+    """
+
+    def __init__(self, maxsize):
+        u"""
+        :maxsize:    Maximum number of items
+        """
+        object.__init__(self)
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        u""" Return the value of key and mark it as recently used, default
+        if the key isn't cached
+        """
+        with self._lock:
+            try:
+                value = self._items.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._items[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        u""" Cache value for key, the least recently used item is dropped if
+        the cache is full
+        """
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = value
+            if len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        u""" Drop all items, the statistics are kept """
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        u""" Return the statistics of the cache
+
+        :returns:    dict with the number of hits, misses and cached items
+        """
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses,
+                        size=len(self._items))
+
+    def reset_stats(self):
+        u""" Reset the statistics of the cache """
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+def get_changed_range(old, new):
+    u"""
+    Compare two versions of a list and determine the range that differs
+    between them by stripping the common prefix and suffix.
+
+    :old:        List before the change
+    :new:        List after the change
+
+    :return:    None if both lists are equal, otherwise a tuple (first,
+                old_last, new_last): the items old[first:old_last] were
+                replaced by new[first:new_last]
+    """
+    len_old = len(old)
+    len_new = len(new)
+    shortest = min(len_old, len_new)
+
+    first = 0
+    while first < shortest and old[first] == new[first]:
+        first += 1
+    if first == len_old == len_new:
+        return None
+
+    common = 0
+    while common < shortest - first and \
+            old[len_old - common - 1] == new[len_new - common - 1]:
+        common += 1
+
+    return (first, len_old - common, len_new - common)
+
+
 def get_domobj_range(content=[], position=0, direction=Direction.FORWARD, identify_fun=None):
     u"""
     Get the start and end line number of the dom obj lines from content.
@@ -13,7 +13,6 @@ try:
 except:
     from UserList import UserList
 
-import vim
 from orgmode.liborgmode.base import MultiPurposeList, flatten_list
 from orgmode.liborgmode.orgdate import OrgTimeRange
 from orgmode.liborgmode.orgdate import get_orgdate
@@ -30,6 +29,8 @@ class Checkbox(DomObj):
     # intermediate status
     STATUS_INT = u'[-]'
 
+    __slots__ = ('_heading', '_dirty_checkbox', '_type', '_status')
+
     def __init__(self, level=1, type=u'-', title=u'', status=u'[ ]', body=None):
         u"""
         :level:        Indent level of the checkbox
@@ -43,7 +44,6 @@ class Checkbox(DomObj):
         # heading
         self._heading = None
 
-        self._children = CheckboxList(obj=self)
         self._dirty_checkbox = False
         # list type
         self._type = u'-'
@@ -63,7 +63,10 @@ class Checkbox(DomObj):
 
     def __len__(self):
         # 1 is for the heading's title
-        return 1 + len(self.body)
+        return 1 + self._body_len()
+
+    def _new_children(self):
+        return CheckboxList(obj=self)
 
     def copy(self, including_children=True, parent=None):
         u"""
@@ -89,7 +92,7 @@ class Checkbox(DomObj):
         checkbox._orig_start = self._orig_start
         checkbox._orig_len = self._orig_len
 
-        checkbox._dirty_heading = self.is_dirty_checkbox
+        checkbox._dirty_checkbox = self.is_dirty_checkbox
 
         return checkbox
 
@@ -124,7 +127,7 @@ class Checkbox(DomObj):
         nc.level, nc.type, nc.status, nc.title = parse_title(data[0])
         nc.body = data[1:]
         if orig_start is not None:
-            nc._dirty_heading = False
+            nc._dirty_checkbox = False
             nc._dirty_body = False
             nc._orig_start = orig_start
             nc._orig_len = len(nc)
@@ -134,14 +137,7 @@ class Checkbox(DomObj):
         return nc
 
     def update_subtasks(self, total=0, on=0):
-        if total != 0:
-            percent = (on * 100) / total
-        else:
-            percent = 0
-
-        count = "%d/%d" % (on, total)
-        self.title = REGEX_SUBTASK.sub("[%s]" % (count), self.title)
-        self.title = REGEX_SUBTASK_PERCENT.sub("[%d%%]" % (percent), self.title)
+        self.title = update_subtasks_cookies(self.title, total, on)
         d = self._heading.document.write_checkbox(self, including_children=False)
 
     @classmethod
@@ -397,7 +393,131 @@ class CheckboxList(DomObjList):
     def is_checkbox(cls, obj):
         return CheckboxList.is_domobj(obj)
 
+    def _changed(self):
+        u""" The structure of the checkboxes changed, the heading has to build
+        them afresh """
+        heading = self._obj
+        if isinstance(heading, Checkbox):
+            heading = heading._heading
+        if heading is not None and hasattr(heading, u'invalidate_checkboxes'):
+            heading.invalidate_checkboxes()
+        DomObjList._changed(self)
+
     def _get_heading(self):
         if self.__class__.is_checkbox(self._obj):
             return self._obj._document
         return self._obj
+
+
+def update_subtasks_cookies(title, total=0, on=0):
+    u""" Fill in the [n/m] and [n%] cookies of a title
+
+    :title:    Title of a heading or checkbox
+    :total:    total # of checkboxes
+    :on:    # of checkboxes which are on
+
+    :returns:    The updated title
+    """
+    if total != 0:
+        percent = (on * 100) / total
+    else:
+        percent = 0
+
+    count = "%d/%d" % (on, total)
+    title = REGEX_SUBTASK.sub("[%s]" % (count), title)
+    return REGEX_SUBTASK_PERCENT.sub("[%d%%]" % (percent), title)
+
+
+def propagate_status(heading):
+    u""" Compute the status of all checkboxes of a heading from their children
+    and the subtask cookies of the heading and its checkboxes in one bottom-up
+    pass. Nothing is written to the buffer, the changed objects are marked
+    dirty and can be written at once with Document.write_checkboxes().
+
+    :heading:    The heading, its checkboxes have to be initialized
+
+    :returns:    List of the heading and checkboxes that are dirty
+    """
+    c = heading.first_checkbox
+    if c is None:
+        return []
+
+    dirty = []
+    _, total, on, _ = _propagate_status(c, dirty)
+    title = update_subtasks_cookies(heading.title, total, on)
+    if title != heading.title:
+        heading.title = title
+    if heading.is_dirty_heading:
+        dirty.append(heading)
+    return dirty
+
+
+def _propagate_status(checkbox, dirty):
+    u""" Helper of propagate_status()
+
+    :checkbox:    The first checkbox of this indent level
+    :dirty:        List the dirty checkboxes are added to
+
+    :returns:    (parent_status, total, on, has_status)
+        parent_status:    The status of the parent checkbox
+        total:            total # of checkboxes with a status on this level
+        on:                # of checkboxes which are on on this level
+        has_status:        True if a checkbox on this level or below has a
+                        status
+    """
+    status_off, status_on, status_int, total = 0, 0, 0, 0
+    has_status = False
+    c = checkbox
+    while c:
+        current_status = c.status
+        if c.children:
+            # if this checkbox is not leaf, its status is determined by all
+            # its children
+            status, child_total, child_on, child_has_status = \
+                _propagate_status(c.first_checkbox, dirty)
+            if child_has_status:
+                has_status = True
+                current_status = status
+            title = update_subtasks_cookies(c.title, child_total, child_on)
+            if title != c.title:
+                c.title = title
+
+        # don't update status if the checkbox has no status
+        if c.status is None:
+            current_status = None
+        # the checkbox needs to have status
+        else:
+            total += 1
+            has_status = True
+
+        # count number of status in this checkbox level
+        if current_status == Checkbox.STATUS_OFF:
+            status_off += 1
+        elif current_status == Checkbox.STATUS_ON:
+            status_on += 1
+        elif current_status == Checkbox.STATUS_INT:
+            status_int += 1
+
+        if current_status is not None and c.status != current_status:
+            c.status = current_status
+        if c.is_dirty:
+            dirty.append(c)
+        c = c.next_sibling
+
+    parent_status = Checkbox.STATUS_INT
+    # all silbing checkboxes are off status
+    if total == 0:
+        pass
+    elif status_off == total:
+        parent_status = Checkbox.STATUS_OFF
+    # all silbing checkboxes are on status
+    elif status_on == total:
+        parent_status = Checkbox.STATUS_ON
+    # one silbing checkbox is on or int status
+    elif status_on != 0 or status_int != 0:
+        parent_status = Checkbox.STATUS_INT
+    # other cases
+    else:
+        parent_status = None
+
+    return parent_status, total, status_on, has_status
@@ -7,13 +7,19 @@
     TODO: explain this :)
 """
 
+from bisect import bisect_right
+
 try:
     from collections import UserList
 except:
     from UserList import UserList
 
-from orgmode.liborgmode.base import MultiPurposeList, flatten_list, Direction, get_domobj_range
+from orgmode.liborgmode.base import MultiPurposeList, flatten_list, Direction, get_domobj_range, \
+        FenwickTree
 from orgmode.liborgmode.headings import Heading, HeadingList
+from orgmode.liborgmode.dom_obj import LineIndex
+from orgmode.liborgmode.agendaindex import AgendaIndex
+from orgmode.liborgmode.todokeywords import TodoKeywordModel
 
 from orgmode.py3compat.encode_compatibility import *
 from orgmode.py3compat.unicode_compatibility import *
@@ -46,6 +52,31 @@ class Document(object):
         self._headings = HeadingList(obj=self)
         self._deleted_headings = []
 
+        # index of the headings' positions, it's built when the positions of
+        # a dirty document are requested and dropped when the structure of the
+        # document changes
+        self._heading_index = None
+        self._heading_list = None
+        self._heading_lengths = None
+        self._heading_offsets = None
+        # original start lines of all headings and the headings in the same
+        # order, see heading_at()
+        self._heading_start_lines = None
+
+        # classification of all lines of the content and the key it was
+        # computed for, see line_index()
+        self._line_index = None
+        # snapshot of all lines of the content and the key it was read for,
+        # see lines()
+        self._lines = None
+        # increased whenever the content is changed through the document, the
+        # default key of the line index and the snapshot
+        self._content_version = 0
+
+        # index of the headings by todo state, active date and tag, see
+        # agenda_index()
+        self._agenda_index = None
+
         # settings needed to align tags properly
         self._tabstop = 8
         self._tag_column = 77
@@ -68,8 +99,16 @@ class Document(object):
         Returns:
             list: [all todo/done states]
         """
-        # TODO This is not necessary remove
-        return flatten_list(self.get_todo_states())
+        return list(self.todo_keywords().all_states)
+
+    def todo_keywords(self):
+        u""" Get the compiled todo keywords of the document. Models are shared
+        between all documents with the same keywords.
+
+        Returns:
+            TodoKeywordModel: the todo keywords
+        """
+        return TodoKeywordModel.from_sequences(self.get_todo_states())
 
     def get_todo_states(self):
         u""" Returns a list containing a tuple of two lists of allowed todo
@@ -106,69 +145,306 @@ class Document(object):
         u""" Initialize all headings in document - build DOM. This method
         should be call prior to accessing the document.
 
+        The content is read just once. All heading lines are identified in a
+        single pass and the tree is wired up from that index afterwards, which
+        keeps building the DOM linear in the length of the document. The
+        headings are created lazily, their titles, todo states, tags and
+        active dates are parsed when they are accessed for the first time.
+
         Returns:
             self
         """
-        def init_heading(_h):
-            u"""
-            :returns    the initialized heading
-            """
-            start = _h.end + 1
-            prev_heading = None
-            while True:
-                new_heading = self.find_heading(start, heading=heading)
-
-                # * Heading 1 <- heading
-                # * Heading 1 <- sibling
-                # or
-                # * Heading 2 <- heading
-                # * Heading 1 <- parent's sibling
-                if not new_heading or \
-                    new_heading.level <= _h.level:
-                    break
-
-                # * Heading 1 <- heading
-                #  * Heading 2 <- first child
-                #  * Heading 2 <- another child
-                new_heading._parent = _h
-                if prev_heading:
-                    prev_heading._next_sibling = new_heading
-                    new_heading._previous_sibling = prev_heading
-                _h.children.data.append(new_heading)
-                # the start and end computation is only
-                # possible when the new heading was properly
-                # added to the document structure
-                init_heading(new_heading)
-                if new_heading.children:
-                    # skip children
-                    start = new_heading.end_of_last_child + 1
-                else:
-                    start = new_heading.end + 1
-                prev_heading = new_heading
-
-            return _h
-
-        h = self.find_heading(heading=heading)
+        content = self._read_content()
+        index = LineIndex(content)
+        self._line_index = (self._line_index_key(), index)
+        starts = self._heading_starts(content, index, heading)
+
         # initialize meta information
-        if h:
-            self._meta_information.data.extend(self._content[:h._orig_start])
-        else:
-            self._meta_information.data.extend(self._content[:])
+        self._meta_information.data.extend(
+            content[:starts[0] if starts else len(content)])
         self._orig_meta_information_len = len(self.meta_information)
 
         # initialize dom tree
-        prev_h = None
-        while h:
-            if prev_h:
-                prev_h._next_sibling = h
-                h._previous_sibling = prev_h
-            self.headings.data.append(h)
-            init_heading(h)
-            prev_h = h
-            h = self.find_heading(h.end_of_last_child + 1, heading=heading)
+        self.headings.data.extend(
+            self._build_headings(content, starts, heading=heading))
+        self.invalidate_agenda_index()
 
         return self
 
+    def _has_valid_positions(self, length):
+        u""" Check whether the original start positions of all headings can
+        be trusted. This is not the case for a dirty document, if headings
+        were modified without tainting the document or if the headings don't
+        cover the document without gaps.
+
+        Args:
+            length (int): number of lines the document had when the positions
+                    were recorded
+
+        Returns:
+            bool: True if the positions are valid
+        """
+        if self.is_dirty:
+            return False
+        position = self._orig_meta_information_len
+        for h in self.all_headings():
+            if h._orig_start != position or h._document is not self:
+                return False
+            position += h._orig_len
+        return position == length
+
+    def update_dom(self, first, old_last, new_last, heading=Heading,
+            content=None):
+        u""" Update the DOM after the lines first to old_last (exclusive) of
+        the content have been replaced by the lines first to new_last
+        (exclusive). Only the top level headings touching the changed range
+        are parsed again and spliced into the DOM. The headings that follow
+        are just moved by the number of added or removed lines.
+
+        Args:
+            first (int): first changed line
+            old_last (int): end of the changed range before the change
+            new_last (int): end of the changed range after the change
+            heading: Heading class from which new heading objects will be
+                    instantiated
+            content (list): the complete changed content if it has been read
+                    already, otherwise the affected lines are read from the
+                    document
+
+        Returns:
+            bool: True if the DOM was updated. False if the change can't be
+                applied incrementally, e.g. because the document is dirty or
+                the meta information changed, and the DOM must be rebuilt.
+        """
+        toplevel = self.headings.data
+        delta = new_last - old_last
+        length = len(self._content if content is None else content) - delta
+        if not toplevel or not self._has_valid_positions(length):
+            return False
+
+        starts = [h._orig_start for h in toplevel]
+        i = bisect_right(starts, first) - 1
+        if i >= 0 and starts[i] == first:
+            # a changed heading line might add its body to the previous
+            # heading, start parsing at the previous heading in that case
+            i -= 1
+        if i < 0:
+            # the meta information changed
+            return False
+        last = old_last - 1 if old_last > first else first - 1
+        j = max(i, bisect_right(starts, last) - 1)
+        following = toplevel[j + 1:]
+        if following:
+            end = following[0]._orig_start
+        else:
+            end = toplevel[j].end_of_last_child + 1
+
+        if content is None:
+            self.invalidate_line_index()
+            content = self._content[starts[i]:end + delta]
+            index = LineIndex(content)
+        else:
+            # the whole content is available, classify it completely so that
+            # the index can be reused afterwards
+            index = LineIndex(content)
+            self._line_index = (self._line_index_key(), index)
+            content = content[starts[i]:end + delta]
+            index = index.slice(starts[i], end + delta)
+        new_starts = self._heading_starts(content, index, heading)
+        if not new_starts or new_starts[0] != 0:
+            return False
+        new_headings = self._build_headings(
+            content, new_starts, heading=heading, offset=starts[i])
+        if following and new_headings[-1].level < following[0].level:
+            # the following headings would become children of the new ones
+            return False
+
+        # move everything after the changed range
+        h = following[0] if following else None
+        while h:
+            h._orig_start += delta
+            h = h.next_heading
+
+        # splice the new headings into the DOM
+        if i > 0:
+            toplevel[i - 1]._next_sibling = new_headings[0]
+            new_headings[0]._previous_sibling = toplevel[i - 1]
+        if following:
+            new_headings[-1]._next_sibling = following[0]
+            following[0]._previous_sibling = new_headings[-1]
+        toplevel[i:j + 1] = new_headings
+        self.invalidate_heading_positions()
+        self.invalidate_agenda_index()
+        self._dom_updated(starts[i], end, end + delta)
+
+        return True
+
+    def _dom_updated(self, start, old_end, new_end):
+        u""" Called by update_dom() with the lines of the top level headings
+        that were parsed again.
+
+        Args:
+            start (int): first line of the headings
+            old_end (int): end of the headings before the change (exclusive)
+            new_end (int): end of the headings after the change (exclusive)
+        """
+        pass
+
+    def _heading_starts(self, content, index, heading=Heading):
+        u""" Get the positions of all heading lines in content.
+
+        Args:
+            content (list): lines of the document or a part of it
+            index (LineIndex): classification of content
+            heading: Heading class that identifies heading lines
+
+        Returns:
+            list: sorted positions of the heading lines
+        """
+        if heading.identify_heading is Heading.identify_heading:
+            return index.heading_lines
+        identify_heading = heading.identify_heading
+        return [i for i, line in enumerate(content)
+                if identify_heading(line) is not None]
+
+    def _line_index_key(self):
+        u""" Get the key that identifies the state of the content the line
+        index was computed for. By default the content only changes through
+        the document, which calls invalidate_line_index() afterwards.
+        Documents that can change behind the back of the DOM return a new key
+        after every change, None if the lines must be read on every call.
+        """
+        return self._content_version
+
+    def line_index(self):
+        u""" Classify all lines of the document as heading, checkbox or plain
+        body lines. The result is cached until the content changes.
+
+        Returns:
+            LineIndex: classification of all lines of the content
+        """
+        return self._line_index_for(self._line_index_key())
+
+    def _line_index_for(self, key):
+        if self._line_index is None or self._line_index[0] != key:
+            self._line_index = (key, LineIndex(self._lines_for(key)))
+        return self._line_index[1]
+
+    def lines(self):
+        u""" Get a snapshot of all lines of the document. Documents that can
+        tell when their content changed, see _line_index_key(), read the
+        lines just once per change. Headings keep views into the snapshot
+        instead of copies of their lines.
+
+        Returns:
+            tuple: all lines of the content
+        """
+        return self._lines_for(self._line_index_key())
+
+    def _lines_for(self, key):
+        if key is None:
+            return self._fetch_lines()
+        if self._lines is None or self._lines[0] != key:
+            self._lines = (key, self._fetch_lines())
+        return self._lines[1]
+
+    def _fetch_lines(self):
+        u""" Read all lines of the content
+
+        Returns:
+            tuple: all lines of the content
+        """
+        return tuple(self._content[:])
+
+    def invalidate_line_index(self):
+        u""" Drop the cached line index and the snapshot of the lines, e.g.
+        after writing to the content """
+        self._line_index = None
+        self._lines = None
+        self._content_version += 1
+
+    def agenda_index(self):
+        u""" Get the index of the headings by todo state, active date and tag.
+        It's built on the first call and kept up to date afterwards.
+
+        Returns:
+            AgendaIndex: index of all headings of the document
+        """
+        if self._agenda_index is None:
+            self._agenda_index = AgendaIndex(self.all_headings())
+        else:
+            self._agenda_index.refresh(self)
+        return self._agenda_index
+
+    def invalidate_agenda_index(self):
+        u""" Drop the agenda index, e.g. after headings were added or removed
+        """
+        self._agenda_index = None
+
+    def update_agenda_index(self, heading):
+        u""" Index heading again after its todo state, tags or active date
+        might have changed.
+
+        Args:
+            heading (Heading): heading of this document
+        """
+        if self._agenda_index is not None:
+            self._agenda_index.mark_stale(heading)
+
+    def _read_content(self):
+        u""" Read the complete content of the document at once
+
+        Returns:
+            list: all lines of the document
+        """
+        return self._content[:]
+
+    def _build_headings(self, content, starts, heading=Heading, offset=0):
+        u""" Create the headings starting at the given lines and wire up
+        parent, sibling and child links.
+
+        Args:
+            content (list): lines of the document or a part of it
+            starts (list): sorted positions of all heading lines in content
+            heading: Heading class from which new heading objects will be
+                    instantiated
+            offset (int): line number of content[0] in the document
+
+        Returns:
+            list: top level headings, linked with one another
+        """
+        # the compiled keywords are shared by all headings of the document
+        todo_states = self.todo_keywords()
+        toplevel = []
+        # chain of the most recent heading on each level, the innermost last
+        stack = []
+        for i, start in enumerate(starts):
+            end = starts[i + 1] if i + 1 < len(starts) else len(content)
+            new_heading = heading.parse_heading_from_lines(
+                content, start, end, todo_states, document=self,
+                orig_start=start + offset)
+
+            # * Heading 1 <- parent
+            #  * Heading 2 <- sibling
+            #  * Heading 2 <- new_heading
+            # or
+            # * Heading 1 <- sibling
+            # * Heading 1 <- new_heading
+            while stack and stack[-1].level >= new_heading.level:
+                stack.pop()
+            if stack:
+                new_heading._parent = stack[-1]
+                siblings = stack[-1].children.data
+            else:
+                siblings = toplevel
+            if siblings:
+                siblings[-1]._next_sibling = new_heading
+                new_heading._previous_sibling = siblings[-1]
+            siblings.append(new_heading)
+            stack.append(new_heading)
+
+        return toplevel
+
     @property
     def meta_information(self):
         u""" Meta information is text that precedes all headings in an org-mode
@@ -230,8 +506,97 @@ class Document(object):
             changed computation of start and end positions from a static to a
             dynamic computation
         """
+        if not self._dirty_document:
+            # positions might have changed while the document was clean
+            self.invalidate_heading_positions()
         self._dirty_document = True
 
+    def invalidate_heading_positions(self):
+        u""" Drop the index of heading positions. It's rebuilt the next time
+        the start of a heading of the dirty document is requested.
+        """
+        self._heading_index = None
+        self._heading_list = None
+        self._heading_lengths = None
+        self._heading_offsets = None
+        self._heading_start_lines = None
+
+    def _build_heading_index(self):
+        if self._heading_index is None:
+            headings = list(self.all_headings())
+            self._heading_index = dict((h, i) for i, h in enumerate(headings))
+            self._heading_list = headings
+            self._heading_lengths = [len(h) for h in headings]
+            self._heading_offsets = FenwickTree(self._heading_lengths)
+
+    def heading_offset(self, heading):
+        u""" Compute the number of lines in front of a heading, excluding the
+        meta information, in O(log n).
+
+        Args:
+            heading (Heading): heading of this document
+
+        Returns:
+            int: the number of lines of all headings in front of heading or
+                None if heading is not part of this document
+        """
+        self._build_heading_index()
+        i = self._heading_index.get(heading)
+        if i is not None:
+            return self._heading_offsets.prefix_sum(i)
+
+    def heading_at(self, position):
+        u""" Find the heading whose title or body, not counting its children,
+        contains a line in O(log n). The sorted start lines of all headings
+        are searched if the document is clean, the index of heading positions
+        otherwise.
+
+        Args:
+            position (int): line number, counting from 0
+
+        Returns:
+            heading or None: the heading or None if the line belongs to the
+                meta information or is beyond the end of the document
+        """
+        if not self.headings or position < 0:
+            return None
+
+        if not self.is_dirty:
+            if self._heading_start_lines is None:
+                headings = list(self.all_headings())
+                self._heading_start_lines = (
+                    [h._orig_start for h in headings], headings)
+            starts, headings = self._heading_start_lines
+            i = bisect_right(starts, position) - 1
+            if i < 0 or position >= starts[i] + len(headings[i]):
+                return None
+            return headings[i]
+
+        self._build_heading_index()
+        meta_len = len(self.meta_information) if \
+                self.meta_information else 0
+        if position < meta_len:
+            return None
+        i = self._heading_offsets.search(position - meta_len)
+        if i >= len(self._heading_list):
+            return None
+        return self._heading_list[i]
+
+    def update_heading_length(self, heading):
+        u""" Update the index of heading positions after the length of a
+        heading changed.
+
+        Args:
+            heading (Heading): heading of this document
+        """
+        if self._heading_index is None:
+            return
+        i = self._heading_index.get(heading)
+        if i is not None:
+            length = len(heading)
+            self._heading_offsets.add(i, length - self._heading_lengths[i])
+            self._heading_lengths[i] = length
+
     @property
     def is_dirty(self):
         u""" Return information about unsaved changes for the document and all
@@ -295,18 +660,24 @@ class Document(object):
         Returns:
             heading or None: New heading
         """
-        start, end = get_domobj_range(
-            content=self._content, position=position, direction=direction,
-            identify_fun=heading.identify_heading)
+        key = self._line_index_key()
+        lines = self._lines_for(key)
+        if heading.identify_heading is Heading.identify_heading:
+            start, end = self._line_index_for(key).heading_range(
+                position, direction)
+        else:
+            start, end = get_domobj_range(
+                content=lines, position=position, direction=direction,
+                identify_fun=heading.identify_heading)
 
         if start is None:
             return None
 
         if end is None:
-            end = len(self._content) - 1
+            end = len(lines) - 1
 
         document = self if connect_with_document else None
 
-        return heading.parse_heading_from_data(
-            self._content[start:end + 1], self.get_all_todo_states(),
-            document=document, orig_start=start)
+        return heading.parse_heading_from_lines(
+            lines, start, end + 1, self.todo_keywords(), document=document,
+            orig_start=start)
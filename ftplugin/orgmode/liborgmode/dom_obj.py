@@ -8,7 +8,9 @@
 """
 
 import re
-from orgmode.liborgmode.base import MultiPurposeList, flatten_list
+from bisect import bisect_left, bisect_right
+
+from orgmode.liborgmode.base import MultiPurposeList, flatten_list, Direction
 
 from orgmode.py3compat.encode_compatibility import *
 from orgmode.py3compat.unicode_compatibility import *
@@ -43,6 +45,139 @@ REGEX_CHECKBOX = re.compile(
     % (''.join(UnOrderListType), ''.join(OrderListType)), flags=re.U)
 
 
+# the same patterns as Heading.identify_heading and Checkbox.identify_checkbox
+# but applied to many lines joined by newlines at once
+REGEX_HEADING_LINES = re.compile(r'^(\*+)[ \t]', flags=re.M)
+REGEX_CHECKBOX_LINES = re.compile(
+    r'^([^\S\n]*)(?:[%s]|(?:[a-zA-Z]|\d+)[%s])'
+    % (''.join(UnOrderListType), ''.join(OrderListType)), flags=re.M | re.U)
+
+
+class LineIndex(object):
+    u"""
+    A LineIndex classifies all lines of a document as heading, checkbox or
+    plain body lines. The classification is done by running one compiled
+    regular expression per kind over the joined lines instead of testing
+    every line on its own.
+
+    The heading and checkbox lines are stored as sorted lists of line numbers
+    with the corresponding levels in separate lists of the same length.
+    """
+
+    def __init__(self, lines):
+        u"""
+        :lines:        List of lines to classify
+        """
+        object.__init__(self)
+        self.line_count = len(lines)
+        self.heading_lines = []
+        self.heading_levels = []
+        self.checkbox_lines = []
+        self.checkbox_levels = []
+
+        text = u'\n'.join(lines)
+        if text.count(u'\n') != max(self.line_count - 1, 0):
+            # lines that contain newlines can't be joined, classify them one
+            # by one
+            for i, line in enumerate(lines):
+                self._classify(i, line)
+            return
+
+        for i, m in self._iter_lines(text, REGEX_HEADING_LINES):
+            self.heading_lines.append(i)
+            self.heading_levels.append(len(m.group(1)))
+        for i, m in self._iter_lines(text, REGEX_CHECKBOX_LINES):
+            # a checkbox must not be a heading
+            if text[m.start()] == u'*' and REGEX_HEADING.match(lines[i]):
+                continue
+            self.checkbox_lines.append(i)
+            self.checkbox_levels.append(len(m.group(1)))
+
+    @staticmethod
+    def _iter_lines(text, regex):
+        u""" Iterate over the matches of regex and their line numbers """
+        line = 0
+        position = 0
+        for m in regex.finditer(text):
+            line += text.count(u'\n', position, m.start())
+            position = m.start()
+            yield line, m
+
+    def _classify(self, i, line):
+        m = REGEX_HEADING_LINES.match(line)
+        if m:
+            self.heading_lines.append(i)
+            self.heading_levels.append(len(m.group(1)))
+            return
+        m = REGEX_CHECKBOX_LINES.match(line)
+        if m and not REGEX_HEADING.match(line):
+            self.checkbox_lines.append(i)
+            self.checkbox_levels.append(len(m.group(1)))
+
+    def slice(self, start, end):
+        u""" Get the classification of the lines start to end (exclusive) as
+        a LineIndex of its own without classifying the lines again.
+
+        :start:        First line of the slice
+        :end:        End of the slice (exclusive)
+
+        :return:    LineIndex with line numbers relative to start
+        """
+        index = LineIndex([])
+        end = min(end, self.line_count)
+        index.line_count = max(end - start, 0)
+        i, j = bisect_left(self.heading_lines, start), bisect_left(self.heading_lines, end)
+        index.heading_lines = [l - start for l in self.heading_lines[i:j]]
+        index.heading_levels = self.heading_levels[i:j]
+        i, j = bisect_left(self.checkbox_lines, start), bisect_left(self.checkbox_lines, end)
+        index.checkbox_lines = [l - start for l in self.checkbox_lines[i:j]]
+        index.checkbox_levels = self.checkbox_levels[i:j]
+        return index
+
+    def _find_range(self, lines, position, direction):
+        if position < 0 or position > self.line_count:
+            return (None, None)
+        if direction == Direction.FORWARD:
+            i = bisect_left(lines, position)
+        else:
+            if position == self.line_count:
+                return (None, None)
+            i = bisect_right(lines, position) - 1
+            if i < 0:
+                return (None, None)
+        if i >= len(lines):
+            return (None, None)
+        if i + 1 < len(lines):
+            return (lines[i], lines[i + 1] - 1)
+        return (lines[i], None)
+
+    def heading_range(self, position=0, direction=Direction.FORWARD):
+        u""" Get the start and end line number of the heading found from
+        position in the given direction. The same as get_domobj_range() with
+        Heading.identify_heading.
+
+        :position:        Line number to start the search from
+        :direction:        Search direction
+
+        :return:        Start and end line number, end is None if the heading
+                        ends with the document
+        """
+        return self._find_range(self.heading_lines, position, direction)
+
+    def checkbox_range(self, position=0, direction=Direction.FORWARD):
+        u""" Get the start and end line number of the checkbox found from
+        position in the given direction. The same as get_domobj_range() with
+        Checkbox.identify_checkbox.
+
+        :position:        Line number to start the search from
+        :direction:        Search direction
+
+        :return:        Start and end line number, end is None if the
+                        checkbox ends with the document
+        """
+        return self._find_range(self.checkbox_lines, position, direction)
+
+
 class DomObj(object):
     u"""
     A DomObj is DOM structure element, like Heading and Checkbox.
@@ -59,6 +194,11 @@ class DomObj(object):
     # TODO should this and DomObj_list be abstract methods? If so use ABC to
     # force abstract methods
 
+    # big documents consist of many dom objects, slots keep them small
+    __slots__ = ('_document', '_parent', '_previous_sibling', '_next_sibling',
+                 '_children', '_orig_start', '_orig_len', '_level', '_title',
+                 '_dirty_body', '_body', '_source')
+
     def __init__(self, level=1, title=u'', body=None):
         u"""
         :level:        Level of the dom object
@@ -71,7 +211,9 @@ class DomObj(object):
         self._parent = None
         self._previous_sibling = None
         self._next_sibling = None
-        self._children = MultiPurposeList()
+        # the list of children is created when it's accessed for the first
+        # time, most dom objects don't have children
+        self._children = None
         self._orig_start = None
         self._orig_len = 0
 
@@ -83,7 +225,10 @@ class DomObj(object):
 
         # body
         self._dirty_body = False
-        self._body = MultiPurposeList(on_change=self.set_dirty_body)
+        # the body is either a list of its own or, until it's accessed, the
+        # lines start + 1 to end (exclusive) of the list of lines in source
+        self._body = None
+        self._source = None
         if body:
             self.body = body
 
@@ -95,7 +240,19 @@ class DomObj(object):
 
     def __len__(self):
         # 1 is for the heading's title
-        return 1 + len(self.body)
+        return 1 + self._body_len()
+
+    def _body_len(self):
+        u""" Number of lines of the body without creating the body list """
+        if self._body is not None:
+            return len(self._body)
+        if self._source is not None:
+            return self._source[2] - self._source[1] - 1
+        return 0
+
+    def _new_children(self):
+        u""" Create the list of children """
+        return MultiPurposeList()
 
     @property
     def is_dirty(self):
@@ -180,8 +337,8 @@ class DomObj(object):
         u""" Serialized access to the previous dom obj """
         if self.previous_sibling:
             h = self.previous_sibling
-            while h.children:
-                h = h.children[-1]
+            while h._children:
+                h = h._children[-1]
             return h
         elif self.parent:
             return self.parent
@@ -189,8 +346,8 @@ class DomObj(object):
     @property
     def next_item(self):
         u""" Serialized access to the next dom obj """
-        if self.children:
-            return self.children[0]
+        if self._children:
+            return self._children[0]
         elif self.next_sibling:
             return self.next_sibling
         else:
@@ -222,7 +379,7 @@ class DomObj(object):
     def end(self):
         u""" Access to the ending line of the dom obj """
         if self.start is not None:
-            return self.start + len(self.body)
+            return self.start + self._body_len()
 
     @property
     def end_vim(self):
@@ -232,10 +389,10 @@ class DomObj(object):
     @property
     def end_of_last_child(self):
         u""" Access to end of the last child """
-        if self.children:
-            child = self.children[-1]
-            while child.children:
-                child = child.children[-1]
+        if self._children:
+            child = self._children[-1]
+            while child._children:
+                child = child._children[-1]
             return child.end
         return self.end
 
@@ -249,6 +406,8 @@ class DomObj(object):
 
         Setter method takes list, tuple or userlist with DOMObjects
         """
+        if self._children is None:
+            self._children = self._new_children()
         return self._children
 
     @children.setter
@@ -256,7 +415,7 @@ class DomObj(object):
         v = value
         if type(v) in (list, tuple) or isinstance(v, UserList):
             v = flatten_list(v)
-        self._children[:] = v
+        self.children[:] = v
 
     @children.deleter
     def children(self):
@@ -265,14 +424,14 @@ class DomObj(object):
     @property
     def first_child(self):
         u""" Access to the first child dom obj or None if no children exist """
-        if self.children:
-            return self.children[0]
+        if self._children:
+            return self._children[0]
 
     @property
     def last_child(self):
         u""" Access to the last child dom obj or None if no children exist """
-        if self.children:
-            return self.children[-1]
+        if self._children:
+            return self._children[-1]
 
     @property
     def level(self):
@@ -317,10 +476,21 @@ class DomObj(object):
     @property
     def body(self):
         u""" MultiPurposeList[]: Holds the content belonging to the heading """
+        if self._body is None:
+            # copy the lines from the source on first access
+            lines = []
+            if self._source is not None:
+                lines, start, end = self._source
+                lines = lines[start + 1:end]
+            self._body = MultiPurposeList(lines, on_change=self.set_dirty_body)
+            self._release_source()
         return self._body
 
     @body.setter
     def body(self, value):
+        if self._body is None:
+            self._body = MultiPurposeList(on_change=self.set_dirty_body)
+            self._release_source()
         if type(value) in (list, tuple) or isinstance(value, UserList):
             self._body[:] = flatten_list(value)
         elif type(value) in (str, ):
@@ -336,6 +506,12 @@ class DomObj(object):
         # call so much code for deleting a list
         self.body = []
 
+    def _release_source(self):
+        u""" Drop the reference to the source lines once they are not needed
+        anymore """
+        if self._body is not None:
+            self._source = None
+
 
 class DomObjList(MultiPurposeList):
     u"""
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+u"""
+    filedocument
+    ~~~~~~~~~~~~~~~~
+
+    FileDocument is a read only document that is read straight from an org
+    file. It's used for files that are not loaded into a vim buffer, e.g.
+    agenda files, so that they don't have to be added to vim's buffer list.
+"""
+
+import io
+
+from orgmode.liborgmode.documents import Document
+
+
+def read_lines(path):
+    u""" Read the lines of a file one after another, the way vim splits
+    them: line breaks are removed and invalid UTF-8 is replaced.
+
+    Args:
+        path (str): path of the file
+
+    Yields:
+        str: the lines of the file
+    """
+    with io.open(path, u'r', encoding=u'utf-8', errors=u'replace',
+                 newline=u'\n') as f:
+        for line in f:
+            if line.endswith(u'\n'):
+                line = line[:-1]
+            if line.endswith(u'\r'):
+                line = line[:-1]
+            yield line
+
+
+class FileDocument(Document):
+    u"""
+    Read only representation of an org file that isn't loaded into a vim
+    buffer.
+    """
+
+    def __init__(self, path, todo_states=None):
+        u"""
+        Args:
+            path (str): path of the org file
+            todo_states (list): [([todo states], [done states]), ..] the file
+                is parsed with
+        """
+        Document.__init__(self)
+        self.path = path
+        # files are not associated with a buffer
+        self.bufnr = None
+        if todo_states is not None:
+            self.todo_states = todo_states
+
+    def _read_content(self):
+        self._content = list(read_lines(self.path))
+        self.invalidate_line_index()
+        return self._content
+
+    def write(self):
+        u""" Files are read only, load them into a buffer to change them
+
+        Returns:
+            bool: False if the document wasn't changed
+        """
+        if not self.is_dirty:
+            return False
+        raise ValueError(u'Unable to write %s, the document is read only.'
+                         % self.path)
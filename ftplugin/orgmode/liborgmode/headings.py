@@ -8,12 +8,12 @@
 """
 
 import re
+from bisect import bisect_right
 
-import vim
 from orgmode.liborgmode.base import MultiPurposeList, flatten_list, Direction, get_domobj_range
 from orgmode.liborgmode.orgdate import OrgTimeRange
-from orgmode.liborgmode.orgdate import get_orgdate
-from orgmode.liborgmode.checkboxes import Checkbox, CheckboxList
+from orgmode.liborgmode.orgdate import get_orgdate, get_orgdates
+from orgmode.liborgmode.checkboxes import Checkbox, CheckboxList, update_subtasks_cookies
 from orgmode.liborgmode.dom_obj import DomObj, DomObjList, REGEX_SUBTASK, REGEX_SUBTASK_PERCENT, REGEX_HEADING, REGEX_TAG, REGEX_TODO
 
 from orgmode.py3compat.xrange_compatibility import *
@@ -29,6 +29,10 @@ except:
 class Heading(DomObj):
     u""" Structural heading object """
 
+    __slots__ = ('_dirty_heading', '_todo', '_tags', '_active_date',
+                 '_checkboxes', '_checkboxes_key', '_checkbox_starts',
+                 '_unparsed_heading', '_unparsed_date')
+
     def __init__(self, level=1, title=u'', tags=None, todo=None, body=None, active_date=None):
         u"""
         :level:        Level of the heading
@@ -38,9 +42,14 @@ class Heading(DomObj):
         :body:        Body of the heading
         :active_date: active date that is used in the agenda
         """
+        # allowed todo states of a lazily created heading whose heading line
+        # hasn't been parsed yet and whether its active date still needs to be
+        # searched for, see parse_heading_from_lines
+        self._unparsed_heading = None
+        self._unparsed_date = False
+
         DomObj.__init__(self, level=level, title=title, body=body)
 
-        self._children = HeadingList(obj=self)
         self._dirty_heading = False
 
         # todo
@@ -48,8 +57,8 @@ class Heading(DomObj):
         if todo:
             self.todo = todo
 
-        # tags
-        self._tags = MultiPurposeList(on_change=self.set_dirty_heading)
+        # tags, the list is created on first access
+        self._tags = None
         if tags:
             self.tags = tags
 
@@ -58,9 +67,14 @@ class Heading(DomObj):
         if active_date:
             self.active_date = active_date
 
-        # checkboxes
-        self._checkboxes = CheckboxList(obj=self)
-        self._cached_checkbox = None
+        # checkboxes, the list is created on first access
+        self._checkboxes = None
+        # start of the heading, checkbox class and state of the document the
+        # checkboxes were built for by init_checkboxes() and the start lines
+        # of all checkboxes with the checkboxes in the same order, see
+        # current_checkbox()
+        self._checkboxes_key = None
+        self._checkbox_starts = None
 
     def __unicode__(self):
         res = u'*' * self.level
@@ -109,7 +123,10 @@ class Heading(DomObj):
 
     def __len__(self):
         # 1 is for the heading's title
-        return 1 + len(self.body)
+        return 1 + self._body_len()
+
+    def _new_children(self):
+        return HeadingList(obj=self)
 
     def __lt__(self, other):
         """
@@ -258,7 +275,12 @@ class Heading(DomObj):
         :returns:    New checkbox object or None
         """
         doc = self.document
-        (start, end) = get_domobj_range(content=doc._content, position=position, direction=direction, identify_fun=checkbox.identify_checkbox)
+        key = doc._line_index_key()
+        lines = doc._lines_for(key)
+        if checkbox.identify_checkbox.__func__ is Checkbox.identify_checkbox.__func__:
+            (start, end) = doc._line_index_for(key).checkbox_range(position, direction)
+        else:
+            (start, end) = get_domobj_range(content=lines, position=position, direction=direction, identify_fun=checkbox.identify_checkbox)
         # if out of current headinig range, return None
         heading_end = self.start + len(self) - 1
         if start is not None and start > heading_end:
@@ -271,14 +293,24 @@ class Heading(DomObj):
             end = heading_end
         if start is not None and end is not None:
             return checkbox.parse_checkbox_from_data(
-                doc._content[start:end + 1],
+                lines[start:end + 1],
                 heading=self if connect_with_heading else None, orig_start=start)
 
     def init_checkboxes(self, checkbox=Checkbox):
-        u""" Initialize all checkboxes in current heading - build DOM.
+        u""" Initialize all checkboxes in current heading - build DOM. The
+        checkboxes are built once and kept until the body of the heading or
+        the structure of the checkboxes changes.
 
         :returns:    self
         """
+        # the checkboxes are read from the document, changes of the document
+        # that bypass the DOM change its line index key
+        doc = self.document
+        key = (self.start, checkbox,
+               doc._line_index_key() if doc is not None else None)
+        if self._checkboxes_key == key:
+            return self
+
         def init_checkbox(_c):
             u"""
             :returns    the initialized checkbox
@@ -318,6 +350,10 @@ class Heading(DomObj):
 
             return _c
 
+        # drop the checkboxes of an earlier call
+        del self.checkboxes.data[:]
+        self._checkbox_starts = None
+
         c = self.find_checkbox(checkbox=checkbox, position=self.start)
 
         # initialize dom tree
@@ -331,58 +367,33 @@ class Heading(DomObj):
             prev_c = c
             c = self.find_checkbox(c.end_of_last_child + 1, checkbox=checkbox)
 
+        self._checkboxes_key = key
         return self
 
-    def current_checkbox(self, position=None):
+    def invalidate_checkboxes(self):
+        u""" Drop the checkboxes built by init_checkboxes() and the index of
+        their positions. The next init_checkboxes() builds them afresh.
+        """
+        self._checkboxes_key = None
+        self._checkbox_starts = None
+
+    def current_checkbox(self, position):
         u""" Find the current checkbox (search backward) and return the related object
+        :position:    line of the checkbox, counting from 0, e.g. the cursor
+                    line
         :returns:    Checkbox object or None
         """
-        if position is None:
-            position = vim.current.window.cursor[0] - 1
-
         if not self.checkboxes:
             return
 
-        def binaryFindInHeading():
-            hi = len(self.checkboxes)
-            lo = 0
-            while lo < hi:
-                mid = (lo + hi) // 2
-                c = self.checkboxes[mid]
-                if c.end_of_last_child < position:
-                    lo = mid + 1
-                elif c.start > position:
-                    hi = mid
-                else:
-                    return binaryFindCheckbox(c)
-
-        def binaryFindCheckbox(checkbox):
-            if not checkbox.children or checkbox.end >= position:
-                return checkbox
-
-            hi = len(checkbox.children)
-            lo = 0
-            while lo < hi:
-                mid = (lo + hi) // 2
-                c = checkbox.children[mid]
-                if c.end_of_last_child < position:
-                    lo = mid + 1
-                elif c.start > position:
-                    hi = mid
-                else:
-                    return binaryFindCheckbox(c)
-
-        # look at the cache to find the heading
-        c_tmp = self._cached_checkbox
-        if c_tmp is not None:
-            if c_tmp.end_of_last_child > position and \
-                c_tmp.start < position:
-                if c_tmp.end < position:
-                    self._cached_checkbox = binaryFindCheckbox(c_tmp)
-                return self._cached_checkbox
-
-        self._cached_checkbox = binaryFindInHeading()
-        return self._cached_checkbox
+        if self._checkbox_starts is None:
+            checkboxes = list(self.all_checkboxes())
+            self._checkbox_starts = ([c.start for c in checkboxes], checkboxes)
+        starts, checkboxes = self._checkbox_starts
+        i = bisect_right(starts, position) - 1
+        if i < 0 or position >= starts[i] + len(checkboxes[i]):
+            return
+        return checkboxes[i]
 
     @property
     def first_checkbox(self):
@@ -390,10 +401,81 @@ class Heading(DomObj):
         if self.checkboxes:
             return self.checkboxes[0]
 
+    @staticmethod
+    def _parse_heading_line(heading_line, allowed_todo_states):
+        u""" Split a heading line into level, todo state, title and tags
+
+        :heading_line:    The line to parse
+        :allowed_todo_states: Todo states that are recognized
+
+        :returns:    (level, todo, title, tags)
+        """
+        test_not_empty = lambda x: x != u''
+
+        # WARNING this regular expression fails if there is just one or no
+        # word in the heading but a tag!
+        m = REGEX_HEADING.match(heading_line)
+        if m:
+            r = m.groupdict()
+            level = len(r[u'level'])
+            todo = None
+            title = u''
+            tags = filter(test_not_empty, r[u'tags'].split(u':')) if r[u'tags'] else []
+            tags = list(tags)
+
+            # if there is just one or no word in the heading, redo the parsing
+            mt = REGEX_TAG.match(r[u'title'])
+            if not tags and mt:
+                r = mt.groupdict()
+                tags = filter(test_not_empty, r[u'tags'].split(u':')) if r[u'tags'] else []
+                tags = list(tags)
+            if r[u'title'] is not None:
+                _todo_title = [i.strip() for i in r[u'title'].split(None, 1)]
+                if _todo_title and _todo_title[0] in allowed_todo_states:
+                    todo = _todo_title[0]
+                    if len(_todo_title) > 1:
+                        title = _todo_title[1]
+                else:
+                    title = r[u'title'].strip()
+
+            return (level, todo, title, tags)
+        raise ValueError(u'Data doesn\'t start with a heading definition.')
+
+    @staticmethod
+    def _find_active_date(data):
+        u""" Find the first active date in the provided lines
+
+        :data:        List of lines
+
+        :returns:    OrgDate or OrgDateTime object or None
+        """
+        tmp_orgdate = get_orgdate(data)
+        if tmp_orgdate and tmp_orgdate.active \
+            and not isinstance(tmp_orgdate, OrgTimeRange):
+            return tmp_orgdate
+
+    def get_timestamps(self):
+        u""" Find all timestamps of the heading and its body, every line is
+        scanned just once
+
+        :returns:    [(line, start column, end column, OrgDate, OrgDateTime or
+                    OrgTimeRange object), ..] in the order of their position.
+                    The line counts from 0, the heading's title line.
+        """
+        if self._source is not None and self._body is None and \
+                not self._dirty_heading:
+            # the unchanged lines the heading was created from are available
+            lines, start, end = self._source
+            lines = lines[start:end]
+        else:
+            lines = [unicode(self)]
+            lines.extend(self.body)
+        return get_orgdates(list(lines))
+
     @classmethod
     def parse_heading_from_data(
         cls, data, allowed_todo_states, document=None,
-        orig_start=None):
+        orig_start=None, lazy=False):
         u""" Construct a new heading from the provided data
 
         :data:            List of lines
@@ -402,47 +484,24 @@ class Heading(DomObj):
         :orig_start:    The original start of the heading in case it was read
                         from a document. If orig_start is provided, the
                         resulting heading will not be marked dirty.
+        :lazy:            If True, just the level and the lines are stored.
+                        Title, todo state, tags and the active date are parsed
+                        when they are accessed for the first time.
 
         :returns:    The newly created heading
         """
-        test_not_empty = lambda x: x != u''
-
-        def parse_title(heading_line):
-            # WARNING this regular expression fails if there is just one or no
-            # word in the heading but a tag!
-            m = REGEX_HEADING.match(heading_line)
-            if m:
-                r = m.groupdict()
-                level = len(r[u'level'])
-                todo = None
-                title = u''
-                tags = filter(test_not_empty, r[u'tags'].split(u':')) if r[u'tags'] else []
-                tags = list(tags)
-
-                # if there is just one or no word in the heading, redo the parsing
-                mt = REGEX_TAG.match(r[u'title'])
-                if not tags and mt:
-                    r = mt.groupdict()
-                    tags = filter(test_not_empty, r[u'tags'].split(u':')) if r[u'tags'] else []
-                    tags = list(tags)
-                if r[u'title'] is not None:
-                    _todo_title = [i.strip() for i in r[u'title'].split(None, 1)]
-                    if _todo_title and _todo_title[0] in allowed_todo_states:
-                        todo = _todo_title[0]
-                        if len(_todo_title) > 1:
-                            title = _todo_title[1]
-                    else:
-                        title = r[u'title'].strip()
-
-                return (level, todo, title, tags)
-            raise ValueError(u'Data doesn\'t start with a heading definition.')
-
         if not data:
             raise ValueError(u'Unable to create heading, no data provided.')
 
+        if lazy:
+            return cls.parse_heading_from_lines(
+                data, 0, len(data), allowed_todo_states, document=document,
+                orig_start=orig_start)
+
         # create new heaing
         new_heading = cls()
-        new_heading.level, new_heading.todo, new_heading.title, new_heading.tags = parse_title(data[0])
+        new_heading.level, new_heading.todo, new_heading.title, new_heading.tags = \
+                cls._parse_heading_line(data[0], allowed_todo_states)
         new_heading.body = data[1:]
         if orig_start is not None:
             new_heading._dirty_heading = False
@@ -453,28 +512,87 @@ class Heading(DomObj):
             new_heading._document = document
 
         # try to find active dates
-        tmp_orgdate = get_orgdate(data)
-        if tmp_orgdate and tmp_orgdate.active \
-            and not isinstance(tmp_orgdate, OrgTimeRange):
-            new_heading.active_date = tmp_orgdate
-        else:
-            new_heading.active_date = None
+        new_heading.active_date = cls._find_active_date(data)
+
+        return new_heading
+
+    @classmethod
+    def parse_heading_from_lines(
+        cls, lines, start, end, allowed_todo_states, document=None,
+        orig_start=None):
+        u""" Construct a new lazy heading from the lines start to end
+        (exclusive). Just the level is determined right away. Title, todo
+        state, tags and the active date are parsed when they are accessed for
+        the first time. The body isn't copied before it's accessed, the lines
+        must not be modified afterwards.
+
+        :lines:            List of lines, e.g. the content of a document
+        :start:            Position of the heading line in lines
+        :end:            End of the heading's body in lines (exclusive)
+        :allowed_todo_states: TODO???
+        :document:        The document object this heading belongs to
+        :orig_start:    The original start of the heading in case it was read
+                        from a document. If orig_start is provided, the
+                        resulting heading will not be marked dirty.
+
+        :returns:    The newly created heading
+        """
+        if start >= end:
+            raise ValueError(u'Unable to create heading, no data provided.')
+        level = cls.identify_heading(lines[start])
+        if level is None:
+            raise ValueError(u'Data doesn\'t start with a heading definition.')
+
+        new_heading = cls()
+        new_heading.level = level
+        new_heading._unparsed_heading = allowed_todo_states
+        new_heading._unparsed_date = True
+        new_heading._source = (lines, start, end)
+        new_heading._dirty_body = True
+        if orig_start is not None:
+            new_heading._dirty_heading = False
+            new_heading._dirty_body = False
+            new_heading._orig_start = orig_start
+            new_heading._orig_len = len(new_heading)
+        if document:
+            new_heading._document = document
 
         return new_heading
 
+    def _parse_heading(self):
+        u""" Parse todo state, title and tags of a lazily created heading. The
+        heading and the document don't become dirty by this.
+        """
+        if self._unparsed_heading is None:
+            return
+        allowed_todo_states = self._unparsed_heading
+        lines, start, _ = self._source
+        self._unparsed_heading = None
+
+        # detach the heading temporarily to keep the document clean
+        document, self._document = self._document, None
+        dirty_heading = self._dirty_heading
+        try:
+            _, self.todo, self.title, tags = \
+                    self._parse_heading_line(lines[start], allowed_todo_states)
+            if tags:
+                self.tags = tags
+        finally:
+            self._document = document
+            self._dirty_heading = dirty_heading
+        self._release_source()
+
+    def _release_source(self):
+        if self._body is not None and self._unparsed_heading is None and \
+                not self._unparsed_date:
+            self._source = None
+
     def update_subtasks(self, total=0, on=0):
         u""" Update subtask information for current heading
         :total:    total # of top level checkboxes
         :on:    # of top level checkboxes which are on
         """
-        if total != 0:
-            percent = (on * 100) / total
-        else:
-            percent = 0
-
-        count = "%d/%d" % (on, total)
-        self.title = REGEX_SUBTASK.sub("[%s]" % (count), self.title)
-        self.title = REGEX_SUBTASK_PERCENT.sub("[%d%%]" % (percent), self.title)
+        self.title = update_subtasks_cookies(self.title, total, on)
         self.document.write_heading(self, including_children=False)
 
     @staticmethod
@@ -539,7 +657,9 @@ class Heading(DomObj):
         saving the document """
         self._dirty_heading = True
         self._dirty_body = True
+        self.invalidate_checkboxes()
         if self._document:
+            self._document.update_agenda_index(self)
             self._document.set_dirty_document()
 
     def set_dirty_heading(self):
@@ -547,8 +667,17 @@ class Heading(DomObj):
         document """
         self._dirty_heading = True
         if self._document:
+            self._document.update_agenda_index(self)
             self._document.set_dirty_document()
 
+    def set_dirty_body(self):
+        u""" Mark the heading's body dirty and keep track of its length """
+        super(Heading, self).set_dirty_body()
+        self.invalidate_checkboxes()
+        if self._document:
+            self._document.update_heading_length(self)
+            self._document.update_agenda_index(self)
+
     @property
     def previous_heading(self):
         u""" Serialized access to the previous heading """
@@ -567,7 +696,11 @@ class Heading(DomObj):
 
         meta_len = len(self.document.meta_information) if \
                 self.document.meta_information else 0
-        return super(Heading, self).start + meta_len
+        offset = self.document.heading_offset(self)
+        if offset is None:
+            # the heading is not part of the document's tree
+            offset = super(Heading, self).start
+        return offset + meta_len
 
     @DomObj.level.setter
     def level(self, value):
@@ -579,10 +712,12 @@ class Heading(DomObj):
     def todo(self):
         u""" Todo state of current heading. When todo state is set"""
         # extract todo state from heading
+        self._parse_heading()
         return self._todo
 
     @todo.setter
     def todo(self, value):
+        self._parse_heading()
         # update todo state
         if type(value) not in (unicode, str, type(None)):
             raise ValueError(u'Todo state must be a string or None.')
@@ -609,19 +744,36 @@ class Heading(DomObj):
         active dates are used in the agenda view. they can be part of the
         heading and/or the body.
         """
+        if self._unparsed_date:
+            lines, start, end = self._source
+            self._unparsed_date = False
+            self._active_date = self._find_active_date(lines[start:end])
+            self._release_source()
         return self._active_date
 
     @active_date.setter
     def active_date(self, value):
+        if self._unparsed_date:
+            self._unparsed_date = False
+            self._release_source()
         self._active_date = value
+        if self._document:
+            self._document.update_agenda_index(self)
 
     @active_date.deleter
     def active_date(self):
-        self._active_date = None
+        self.active_date = None
+
+    @property
+    def title(self):
+        u""" Title of the heading without todo state and tags """
+        self._parse_heading()
+        return self._title.strip()
 
-    @DomObj.title.setter
+    @title.setter
     def title(self, value):
         u""" Set the title and mark the document and the heading dirty """
+        self._parse_heading()
         # TODO these setter should be rewritten to also reuse code from DOM OBJ
         if type(value) not in (unicode, str):
             raise ValueError(u'Title must be a string.')
@@ -631,13 +783,22 @@ class Heading(DomObj):
         self._title = v.strip()
         self.set_dirty_heading()
 
+    @title.deleter
+    def title(self):
+        self._parse_heading()
+        self._title = u''
+
     @property
     def tags(self):
         u""" Tags of the current heading """
+        self._parse_heading()
+        if self._tags is None:
+            self._tags = MultiPurposeList(on_change=self.set_dirty_heading)
         return self._tags
 
     @tags.setter
     def tags(self, value):
+        self._parse_heading()
         v = value
         if type(v) in (unicode, str):
             v = list(unicode(v))
@@ -655,7 +816,7 @@ class Heading(DomObj):
                 i_tmp = u_decode(i)
             v_decoded.append(i_tmp)
 
-        self._tags[:] = v_decoded
+        self.tags[:] = v_decoded
 
     @tags.deleter
     def tags(self):
@@ -664,11 +825,13 @@ class Heading(DomObj):
     @property
     def checkboxes(self):
         u""" All checkboxes in current heading """
+        if self._checkboxes is None:
+            self._checkboxes = CheckboxList(obj=self)
         return self._checkboxes
 
     @checkboxes.setter
     def checkboxes(self, value):
-        self._checkboxes[:] = value
+        self.checkboxes[:] = value
 
     @checkboxes.deleter
     def checkboxes(self):
@@ -704,6 +867,15 @@ class HeadingList(DomObjList):
             return self._obj._document
         return self._obj
 
+    def _changed(self):
+        u""" The structure of the document changed, the positions of its
+        headings have to be computed afresh """
+        d = self._get_document()
+        if d is not None:
+            d.invalidate_heading_positions()
+            d.invalidate_agenda_index()
+        DomObjList._changed(self)
+
     def _add_to_deleted_headings(self, item):
         u"""
         Serialize headings so that all subheadings are also marked for deletion
@@ -19,11 +19,15 @@ u"""
       * <2011-09-07 Wed 10:00-13:00>
 
     All OrgTime oblects can be active or inactive.
+
+    Parsed dates are cached by their text and shared, don't change them.
 """
 
 import datetime
 import re
 
+from orgmode.liborgmode.base import LRUCache
+
 from orgmode.py3compat.encode_compatibility import *
 
 # <2011-09-12 Mon>
@@ -55,6 +59,138 @@ _DATETIMERANGE_SAME_DAY_REGEX = re.compile(
     r"<(\d\d\d\d)-(\d\d)-(\d\d) [A-Z]\w\w (\d\d):(\d\d)-(\d\d):(\d\d)>", re.UNICODE)
 
 
+def _same_day_range(syear, smonth, sday, shour, smin, ehour, emin):
+    start = datetime.datetime(syear, smonth, sday, shour, smin)
+    end = datetime.datetime(syear, smonth, sday, ehour, emin)
+    return OrgTimeRange(True, start, end)
+
+
+def _datetime_range(syear, smonth, sday, shour, smin, eyear, emonth, eday,
+                    ehour, emin):
+    start = datetime.datetime(syear, smonth, sday, shour, smin)
+    end = datetime.datetime(eyear, emonth, eday, ehour, emin)
+    return OrgTimeRange(True, start, end)
+
+
+def _date_range(syear, smonth, sday, eyear, emonth, eday):
+    start = datetime.date(syear, smonth, sday)
+    end = datetime.date(eyear, emonth, eday)
+    return OrgTimeRange(True, start, end)
+
+
+# All kinds of timestamps, ordered by precedence: if a string contains
+# timestamps of different kinds, the first one of the kind that comes first
+# in this list is the date of the string.
+_TIMESTAMP_KINDS = (
+    (_DATETIMERANGE_SAME_DAY_REGEX, _same_day_range),
+    (_DATETIMERANGE_REGEX, _datetime_range),
+    (_DATERANGE_REGEX, _date_range),
+    (_DATETIME_REGEX, lambda *values: OrgDateTime(True, *values)),
+    (_DATETIME_PASSIVE_REGEX, lambda *values: OrgDateTime(False, *values)),
+    (_DATE_PASSIVE_REGEX, lambda *values: OrgDate(False, *values)),
+    (_DATE_REGEX, lambda *values: OrgDate(True, *values)))
+
+# Single pass scanner for all kinds of timestamps. It matches the common
+# shape of all of them, _scan() decides which kind a match is.
+_TIMESTAMP_REGEX = re.compile(
+    # <2011-09-12 Mon
+    r"([<\[])(\d\d\d\d)-(\d\d)-(\d\d) [A-Z]\w\w"
+    # 10:00 and -12:00 of a range on the same day
+    r"(?: (\d{1,2}):(\d\d)(?:-(\d\d):(\d\d))?)?"
+    r"([>\]])"
+    # --<2011-09-13 Tue 11:00> of a range
+    r"(?:--<(\d\d\d\d)-(\d\d)-(\d\d) [A-Z]\w\w(?: (\d\d):(\d\d))?>)?",
+    re.UNICODE)
+
+
+# timestamp text -> parsed date or None if the values are invalid. The same
+# timestamps are repeated many times, e.g. in logbooks, so the parsed dates
+# are shared. They must not be changed for that reason.
+_orgdates = LRUCache(8192)
+
+
+def stats():
+    u"""
+    Return the statistics of the cache of parsed dates: a dict with the
+    number of hits, misses and cached dates.
+    """
+    return _orgdates.stats()
+
+
+def reset_stats():
+    u"""
+    Reset the statistics of the cache of parsed dates.
+    """
+    _orgdates.reset_stats()
+
+
+def _scan(string):
+    u"""
+    Find all timestamps in string.
+
+    Returns a list of (precedence, start, end, match) in the order of their
+    position. The values are not validated yet.
+    """
+    # most lines don't contain a timestamp at all
+    if u'<' not in string and u'[' not in string:
+        return []
+    res = []
+    search = _TIMESTAMP_REGEX.search
+    m = search(string)
+    while m:
+        opening, _, _, _, hour, _, ehour, _, closing, eyear, _, _, rhour, _ = \
+            m.groups()
+        active = opening == u'<'
+        # the end of the match unless it's a range
+        end = m.end(9)
+        if active != (closing == u'>'):
+            precedence = None
+        elif ehour is not None:
+            precedence = 0 if active and len(hour) == 2 else None
+        elif eyear is not None and active and hour is None and rhour is None:
+            precedence = 2
+            end = m.end()
+        elif eyear is not None and active and hour is not None and \
+                len(hour) == 2 and rhour is not None:
+            precedence = 1
+            end = m.end()
+        elif hour is not None:
+            precedence = 3 if active else 4
+        else:
+            precedence = 6 if active else 5
+
+        if precedence is not None:
+            res.append((precedence, m.start(), end, m))
+        # the end of a range that isn't valid may be a timestamp of its own
+        m = search(string, end)
+    return res
+
+
+def _make_orgdate(precedence, start, end, m):
+    u"""
+    Return the date of a match of _scan() or None if its values are invalid.
+    """
+    text = m.string[start:end]
+    orgdate = _orgdates.get(text, _orgdates)
+    if orgdate is not _orgdates:
+        return orgdate
+
+    groups = m.groups()
+    if precedence == 0:
+        values = groups[1:8]
+    elif precedence < 3:
+        values = groups[1:6] + groups[9:]
+    else:
+        values = groups[1:6]
+    try:
+        orgdate = _TIMESTAMP_KINDS[precedence][1](
+            *[int(v) for v in values if v is not None])
+    except BaseException:
+        orgdate = None
+    _orgdates.put(text, orgdate)
+    return orgdate
+
+
 def get_orgdate(data):
     u"""
     Parse the given data (can be a string or list). Return an OrgDate if data
@@ -64,7 +200,7 @@ def get_orgdate(data):
     """
     # TODO maybe it should be checked just for iterable? Does it affect here if
     # in base __getitem__(slice(i,j)) doesn't return a list but userlist...
-    if isinstance(data, list):
+    if isinstance(data, (list, tuple)):
         return _findfirst(_text2orgdate, data)
     else:
         return _text2orgdate(data)
@@ -72,6 +208,27 @@ def get_orgdate(data):
     return None
 
 
+def get_orgdates(data):
+    u"""
+    Find all timestamps in the given data (can be a string or list) with
+    their positions. Every line is scanned just once. Timestamps with invalid
+    values, e.g. a 13th month, are left out.
+
+    Returns a list of (line, start column, end column, OrgDate/OrgDateTime/
+    OrgTimeRange) in the order of their position. The line is the index of
+    the string in data and always 0 if data is a string.
+    """
+    if not isinstance(data, (list, tuple)):
+        data = [data]
+    res = []
+    for line, string in enumerate(data):
+        for match in _scan(string):
+            orgdate = _make_orgdate(*match)
+            if orgdate is not None:
+                res.append((line, match[1], match[2], orgdate))
+    return res
+
+
 def _findfirst(f, seq):
     u"""
     Return first item in sequence seq where f(item) == True.
@@ -79,8 +236,10 @@ def _findfirst(f, seq):
     TODO: this is a general help function and it should be moved somewhere
     else; preferably into the standard lib :)
     """
-    for found in (f(item) for item in seq if f(item)):
-        return found
+    for item in seq:
+        found = f(item)
+        if found:
+            return found
 
 
 def _text2orgdate(string):
@@ -89,77 +248,15 @@ def _text2orgdate(string):
     Return an OrgDate if data contains a string representation of an OrgDate;
     otherwise return None.
     """
-    # handle active datetime with same day
-    result = _DATETIMERANGE_SAME_DAY_REGEX.search(string)
-    if result:
-        try:
-            (syear, smonth, sday, shour, smin, ehour, emin) = \
-                [int(m) for m in result.groups()]
-            start = datetime.datetime(syear, smonth, sday, shour, smin)
-            end = datetime.datetime(syear, smonth, sday, ehour, emin)
-            return OrgTimeRange(True, start, end)
-        except BaseException:
-            return None
-
-    # handle active datetime
-    result = _DATETIMERANGE_REGEX.search(string)
-    if result:
-        try:
-            tmp = [int(m) for m in result.groups()]
-            (syear, smonth, sday, shour, smin, eyear, emonth, eday, ehour, emin) = tmp
-            start = datetime.datetime(syear, smonth, sday, shour, smin)
-            end = datetime.datetime(eyear, emonth, eday, ehour, emin)
-            return OrgTimeRange(True, start, end)
-        except BaseException:
-            return None
-
-    # handle active datetime
-    result = _DATERANGE_REGEX.search(string)
-    if result:
-        try:
-            tmp = [int(m) for m in result.groups()]
-            syear, smonth, sday, eyear, emonth, ehour = tmp
-            start = datetime.date(syear, smonth, sday)
-            end = datetime.date(eyear, emonth, ehour)
-            return OrgTimeRange(True, start, end)
-        except BaseException:
-            return None
-
-    # handle active datetime
-    result = _DATETIME_REGEX.search(string)
-    if result:
-        try:
-            year, month, day, hour, minutes = [int(m) for m in result.groups()]
-            return OrgDateTime(True, year, month, day, hour, minutes)
-        except BaseException:
-            return None
-
-    # handle passive datetime
-    result = _DATETIME_PASSIVE_REGEX.search(string)
-    if result:
-        try:
-            year, month, day, hour, minutes = [int(m) for m in result.groups()]
-            return OrgDateTime(False, year, month, day, hour, minutes)
-        except BaseException:
-            return None
-
-    # handle passive dates
-    result = _DATE_PASSIVE_REGEX.search(string)
-    if result:
-        try:
-            year, month, day = [int(m) for m in result.groups()]
-            return OrgDate(False, year, month, day)
-        except BaseException:
-            return None
-
-    # handle active dates
-    result = _DATE_REGEX.search(string)
-    if result:
-        try:
-            year, month, day = [int(m) for m in result.groups()]
-            return OrgDate(True, year, month, day)
-        except BaseException:
-            return None
+    best = None
+    for match in _scan(string):
+        if best is None or match[0] < best[0]:
+            best = match
+            if not best[0]:
+                break
+    if best is None:
+        return None
+    return _make_orgdate(*best)
 
 
 class OrgDate(datetime.date):
@@ -170,22 +267,38 @@ class OrgDate(datetime.date):
 
     NOTE: date is immutable. That's why there needs to be __new__().
     See: http://docs.python.org/reference/datamodel.html#object.__new__
+    OrgDates are immutable as well, parsed dates are shared.
     """
+    __slots__ = ('_active', '_text')
+
     def __init__(self, active, year, month, day):
-        self.active = active
         pass
 
     def __new__(cls, active, year, month, day):
-        return datetime.date.__new__(cls, year, month, day)
+        self = datetime.date.__new__(cls, year, month, day)
+        object.__setattr__(self, u'_active', active)
+        object.__setattr__(self, u'_text', None)
+        return self
+
+    def __setattr__(self, name, value):
+        raise AttributeError(u'OrgDate is immutable')
+
+    @property
+    def active(self):
+        return self._active
 
     def __unicode__(self):
         u"""
-        Return a string representation.
+        Return a string representation. It's computed just once, the agenda
+        formats the same dates over and over again.
         """
-        if self.active:
-            return self.strftime(u'<%Y-%m-%d %a>')
-        else:
-            return self.strftime(u'[%Y-%m-%d %a]')
+        if self._text is None:
+            if self.active:
+                text = self.strftime(u'<%Y-%m-%d %a>')
+            else:
+                text = self.strftime(u'[%Y-%m-%d %a]')
+            object.__setattr__(self, u'_text', text)
+        return self._text
 
     def __str__(self):
         return u_encode(self.__unicode__())
@@ -202,22 +315,38 @@ class OrgDateTime(datetime.datetime):
 
     NOTE: date is immutable. That's why there needs to be __new__().
     See: http://docs.python.org/reference/datamodel.html#object.__new__
+    OrgDateTimes are immutable as well, parsed dates are shared.
     """
+    __slots__ = ('_active', '_text')
 
     def __init__(self, active, year, month, day, hour, mins):
-        self.active = active
+        pass
 
     def __new__(cls, active, year, month, day, hour, minute):
-        return datetime.datetime.__new__(cls, year, month, day, hour, minute)
+        self = datetime.datetime.__new__(cls, year, month, day, hour, minute)
+        object.__setattr__(self, u'_active', active)
+        object.__setattr__(self, u'_text', None)
+        return self
+
+    def __setattr__(self, name, value):
+        raise AttributeError(u'OrgDateTime is immutable')
+
+    @property
+    def active(self):
+        return self._active
 
     def __unicode__(self):
         u"""
-        Return a string representation.
+        Return a string representation. It's computed just once, the agenda
+        formats the same dates over and over again.
         """
-        if self.active:
-            return self.strftime(u'<%Y-%m-%d %a %H:%M>')
-        else:
-            return self.strftime(u'[%Y-%m-%d %a %H:%M]')
+        if self._text is None:
+            if self.active:
+                text = self.strftime(u'<%Y-%m-%d %a %H:%M>')
+            else:
+                text = self.strftime(u'[%Y-%m-%d %a %H:%M]')
+            object.__setattr__(self, u'_text', text)
+        return self._text
 
     def __str__(self):
         return u_encode(self.__unicode__())
@@ -235,7 +364,10 @@ class OrgTimeRange(object):
     * <2011-09-07 Wed>--<2011-09-08 Fri>
     * <2011-09-07 Wed 20:00>--<2011-09-08 Fri 10:00>
     * <2011-09-07 Wed 10:00-13:00>
+
+    OrgTimeRanges are immutable, parsed ranges are shared.
     """
+    __slots__ = ('_active', '_start', '_end', '_text')
 
     def __init__(self, active, start, end):
         u"""
@@ -243,14 +375,36 @@ class OrgTimeRange(object):
         same type).
         """
         super(OrgTimeRange, self).__init__()
-        self.start = start
-        self.end = end
-        self.active = active
+        object.__setattr__(self, u'_start', start)
+        object.__setattr__(self, u'_end', end)
+        object.__setattr__(self, u'_active', active)
+        # string representation once it was computed
+        object.__setattr__(self, u'_text', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(u'OrgTimeRange is immutable')
+
+    @property
+    def active(self):
+        return self._active
+
+    @property
+    def start(self):
+        return self._start
+
+    @property
+    def end(self):
+        return self._end
 
     def __unicode__(self):
         u"""
-        Return a string representation.
+        Return a string representation. It's computed just once.
         """
+        if self._text is None:
+            object.__setattr__(self, u'_text', self._format())
+        return self._text
+
+    def _format(self):
         # active
         if self.active:
             # datetime
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+u"""
+    todokeywords
+    ~~~~~~~~~~~~~~~~
+
+    TodoKeywordModel is the compiled form of the todo keywords of a document,
+    i.e. the org_todo_keywords setting. It's created once for every distinct
+    set of keywords and shared by everyone who needs the keywords: the
+    parsing of headings, the Todo plugin and the agenda.
+"""
+
+import re
+
+from orgmode.liborgmode.base import LRUCache
+from orgmode.py3compat.encode_compatibility import *
+from orgmode.py3compat.unicode_compatibility import *
+
+
+def parse_todo_keywords(states, strip_access_key=True):
+    u""" Parse the value of the org_todo_keywords setting
+
+    Args:
+        states (list): list of keywords for a single sequence or list of
+            sequences. The todo and done keywords of a sequence are separated
+            by u'|', without separator the last keyword is the done keyword.
+        strip_access_key (bool): remove access keys, e.g. (t) of TODO(t)
+
+    Returns:
+        list: [([todo states], [done states]), ..]
+    """
+    if type(states) not in (list, tuple):
+        return []
+
+    def parse_states(s, stop=0):
+        res = []
+        if not s:
+            return res
+        if type(s[0]) in (unicode, str):
+            r = []
+            for i in s:
+                _i = i
+                if type(_i) == str:
+                    _i = u_decode(_i)
+                if type(_i) == unicode and _i:
+                    if strip_access_key and u'(' in _i:
+                        _i = _i[:_i.index(u'(')]
+                        if _i:
+                            r.append(_i)
+                    else:
+                        r.append(_i)
+            if not u'|' in r:
+                if not stop:
+                    res.append((r[:-1], [r[-1]]))
+                else:
+                    res = (r[:-1], [r[-1]])
+            else:
+                seperator_pos = r.index(u'|')
+                if not stop:
+                    res.append((r[0:seperator_pos], r[seperator_pos + 1:]))
+                else:
+                    res = (r[0:seperator_pos], r[seperator_pos + 1:])
+        elif type(s) in (list, tuple) and not stop:
+            for i in s:
+                r = parse_states(i, stop=1)
+                if r:
+                    res.append(r)
+        return res
+
+    return parse_states(states)
+
+
+def split_access_key(keyword):
+    u""" Split a keyword into the keyword and its access key
+
+    Returns:
+        tuple: (keyword, access key or None)
+    """
+    idx = keyword.find(u'(')
+    if idx != -1 and keyword[idx + 1:-1]:
+        return keyword[:idx], keyword[idx + 1:-1]
+    return keyword, None
+
+
+def _freeze(value):
+    u""" Turn nested lists into nested tuples so that they can be hashed """
+    if type(value) in (list, tuple):
+        return tuple(_freeze(i) for i in value)
+    if type(value) == str:
+        return u_decode(value)
+    return value
+
+
+class TodoKeywordModel(object):
+    u"""
+    Compiled todo keywords. Instances are shared and must not be changed.
+    """
+
+    # frozen keywords -> model, few distinct keywords are used at a time
+    _models = LRUCache(64)
+
+    def __init__(self, raw_sequences, sequences):
+        u"""
+        Don't call this constructor directly but use from_setting() or
+        from_sequences().
+
+        Args:
+            raw_sequences (list): [([todo states], [done states]), ..] with
+                access keys
+            sequences (list): [([todo states], [done states]), ..] without
+                access keys
+        """
+        object.__init__(self)
+        self.raw_sequences = raw_sequences
+        self.sequences = sequences
+
+        self.active = frozenset(k for todo, _ in sequences for k in todo)
+        self.done = frozenset(k for _, done in sequences for k in done)
+        # all keywords in the order of their definition
+        self.all_states = [k for s in sequences for part in s for k in part]
+        self.keywords = frozenset(self.all_states)
+        # keyword -> index of its sequence, the first one wins
+        self.sequence_of = {}
+        for i, s in enumerate(sequences):
+            for part in s:
+                for k in part:
+                    self.sequence_of.setdefault(k, i)
+
+        # matches a keyword at the beginning of a title
+        if self.keywords:
+            self.regex = re.compile(u'^(%s)(?=\\s|$)' % u'|'.join(
+                re.escape(k) for k in sorted(self.keywords, key=len,
+                                             reverse=True)), re.U)
+        else:
+            self.regex = None
+
+        # the states the Todo plugin cycles through, None removes the keyword
+        self.cycle_sets = [
+            [split_access_key(k)[0] for part in s for k in part]
+            for s in raw_sequences] + [[None]]
+        self.cycle = [k for s in self.cycle_sets for k in s]
+        self.has_duplicates = len(self.cycle) != len(set(self.cycle))
+
+    def __contains__(self, keyword):
+        return keyword in self.keywords
+
+    def __len__(self):
+        return len(self.sequences)
+
+    def match(self, title):
+        u""" Find the keyword a title starts with
+
+        Returns:
+            str: the keyword or None
+        """
+        if self.regex is None:
+            return
+        m = self.regex.match(title)
+        if m:
+            return m.group(1)
+
+    @classmethod
+    def _get(cls, key, create):
+        model = cls._models.get(key)
+        if model is None:
+            model = create()
+            cls._models.put(key, model)
+        return model
+
+    @classmethod
+    def from_setting(cls, value):
+        u""" Get the model of an org_todo_keywords value
+
+        Args:
+            value (list): value of the setting, see parse_todo_keywords()
+
+        Returns:
+            TodoKeywordModel: the shared model for value
+        """
+        return cls._get(
+            (u'setting', _freeze(value)),
+            lambda: cls(parse_todo_keywords(value, strip_access_key=False),
+                        parse_todo_keywords(value)))
+
+    @classmethod
+    def from_sequences(cls, sequences):
+        u""" Get the model of parsed todo keywords
+
+        Args:
+            sequences (list): [([todo states], [done states]), ..] or a list
+                of keywords for a single sequence
+
+        Returns:
+            TodoKeywordModel: the shared model for sequences
+        """
+        def create():
+            if sequences and all(type(i) in (unicode, str) for i in sequences):
+                return cls.from_setting(sequences)
+            raw = [(list(todo), list(done)) for todo, done in sequences]
+            stripped = [([split_access_key(k)[0] for k in todo],
+                         [split_access_key(k)[0] for k in done])
+                        for todo, done in raw]
+            return cls(raw, stripped)
+        return cls._get((u'sequences', _freeze(sequences)), create)
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+
+u"""
+    Plugin loader
+    ~~~~~~~~~~~~~~
+
+    Plugins are imported when they are used for the first time. Until then a
+    LazyPlugin takes their place. It provides the keybindings, commands and
+    menu entries of the plugin as they are described in the manifest, see
+    orgmode.pluginmanifest, so that they can be registered without importing
+    the plugin.
+
+    All mappings and commands of the plugins call the plugins through
+    ORGMODE.plugins, looking up a plugin there imports it.
+
+    The manifest isn't part of the sources, it's generated by "make build".
+    Every entry records the hash of the plugin's source file, plugins that
+    changed since the manifest was generated are loaded right away.
+"""
+
+import hashlib
+import os
+
+from orgmode.keybinding import Command, Keybinding, Plug
+from orgmode.menu import ActionEntry, Separator, Submenu
+from orgmode.py3compat.py_py3_string import VIM_PY_CALL
+
+from orgmode.py3compat.encode_compatibility import *
+from orgmode.py3compat.unicode_compatibility import *
+
+# stands for the python command in the manifest, it depends on the python
+# version that vim uses
+PY_CALL_PLACEHOLDER = u'{VIM_PY_CALL}'
+
+
+def _get_manifest():
+    try:
+        from orgmode.pluginmanifest import PLUGINS
+    except ImportError:
+        return {}
+    return PLUGINS
+
+
+# plugin name -> True if its entry in the manifest matches the plugin's
+# source
+_up_to_date = {}
+
+
+def hash_plugin(plugin):
+    u""" Compute the hash of the source file of a shipped plugin
+
+    :plugin:    name of the plugin
+    :returns:   the hash or None if the plugin's source file can't be read
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        u'plugins', u'%s.py' % plugin)
+    try:
+        with open(path, u'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except (IOError, OSError):
+        return None
+
+
+def get_manifest_entry(plugin):
+    u""" Find a plugin in the manifest
+
+    :plugin:    name of the plugin
+    :returns:   description of the plugin or None if it isn't in the manifest
+                or the plugin changed since the manifest was generated
+    """
+    description = _get_manifest().get(plugin)
+    if description is None:
+        return None
+    if plugin not in _up_to_date:
+        _up_to_date[plugin] = description[u'source'] == hash_plugin(plugin)
+    return description if _up_to_date[plugin] else None
+
+
+def _encode_command(command):
+    return (u'%s' % command).replace(VIM_PY_CALL + u' ',
+                                     PY_CALL_PLACEHOLDER + u' ')
+
+
+def _decode_command(command):
+    return command.replace(PY_CALL_PLACEHOLDER + u' ', VIM_PY_CALL + u' ')
+
+
+def _describe_keybinding(keybinding):
+    action = keybinding._action
+    if isinstance(action, Plug):
+        action = {
+            u'plug': action.name,
+            u'command': _encode_command(action.command),
+            u'mode': action.mode}
+    else:
+        action = _encode_command(action)
+    return {
+        u'key': keybinding.key,
+        u'action': action,
+        u'mode': keybinding.mode,
+        u'options': keybinding.options,
+        u'remap': keybinding.remap,
+        u'buffer_only': keybinding.buffer_only,
+        u'silent': keybinding.silent}
+
+
+def _describe_menu(entry):
+    if isinstance(entry, Submenu):
+        return {
+            u'submenu': entry.name,
+            u'children': [_describe_menu(c) for c in entry.children]}
+    if isinstance(entry, Separator):
+        return {u'separator': True}
+    if isinstance(entry._action, Keybinding):
+        action = _describe_keybinding(entry._action)
+    else:
+        action = _encode_command(entry._action)
+    return {
+        u'entry': entry._lname,
+        u'action': action,
+        u'rname': entry._rname,
+        u'mode': entry._mode}
+
+
+def describe_plugin(plugin, eager=False, settings=None, source=None):
+    u""" Describe the keybindings, commands and menu entries of a registered
+    plugin for the manifest
+
+    :plugin:    the plugin instance
+    :eager:     True if the plugin has to be loaded right away because
+                registering it has other effects as well
+    :settings:  list of [name, default value] of the settings the plugin
+                sets when it's registered
+    :source:    hash of the plugin's source file, see hash_plugin
+    :returns:   dict that contains just strings, numbers, lists and dicts
+    """
+    menu = getattr(plugin, u'menu', None)
+    if menu is None:
+        menu = []
+    elif not isinstance(menu, (list, tuple)):
+        menu = [menu]
+    return {
+        u'eager': eager,
+        u'source': source,
+        u'settings': [list(i) for i in settings or []],
+        u'commands': [{
+            u'name': c.name,
+            u'command': _encode_command(c.command),
+            u'arguments': c.arguments,
+            u'complete': c.complete,
+            u'overwrite': c.overwrite_exisiting}
+            for c in getattr(plugin, u'commands', [])],
+        u'keybindings': [_describe_keybinding(k)
+                         for k in getattr(plugin, u'keybindings', [])],
+        u'menu': [_describe_menu(m) for m in menu]}
+
+
+def _build_keybinding(description):
+    action = description[u'action']
+    if isinstance(action, dict):
+        action = Plug(action[u'plug'], _decode_command(action[u'command']),
+                      mode=action[u'mode'])
+    else:
+        action = _decode_command(action)
+    return Keybinding(
+        description[u'key'], action, mode=description[u'mode'],
+        options=list(description[u'options']), remap=description[u'remap'],
+        buffer_only=description[u'buffer_only'],
+        silent=description[u'silent'])
+
+
+def _build_menu(parent, description):
+    if u'submenu' in description:
+        submenu = parent + Submenu(description[u'submenu'])
+        for c in description[u'children']:
+            _build_menu(submenu, c)
+        return submenu
+    if u'separator' in description:
+        return parent + Separator()
+    action = description[u'action']
+    if isinstance(action, dict):
+        action = _build_keybinding(action)
+    else:
+        action = _decode_command(action)
+    return parent + ActionEntry(description[u'entry'], action,
+                                rname=description[u'rname'],
+                                mode=description[u'mode'])
+
+
+class LazyPlugin(object):
+    u"""
+    Placeholder of a plugin that hasn't been imported yet. It has the
+    keybindings, commands and menu entries of the plugin, built from the
+    manifest.
+    """
+
+    def __init__(self, name, description, orgmenu):
+        u"""
+        :name:          name of the plugin
+        :description:   entry of the plugin in the manifest
+        :orgmenu:       the menu the plugin's menu entries are added to
+        """
+        object.__init__(self)
+        self.name = name
+        self.commands = [
+            Command(c[u'name'], _decode_command(c[u'command']),
+                    arguments=c[u'arguments'], complete=c[u'complete'],
+                    overwrite_exisiting=c[u'overwrite'])
+            for c in description[u'commands']]
+        self.keybindings = [_build_keybinding(k)
+                            for k in description[u'keybindings']]
+        self.menu = [_build_menu(orgmenu, m) for m in description[u'menu']]
+
+
+class PluginDict(dict):
+    u"""
+    The plugins by name. Looking up a LazyPlugin imports the plugin and
+    returns it instead.
+    """
+
+    def __init__(self, plugins, load):
+        u"""
+        :plugins:   dict of all plugins
+        :load:      function that imports a lazy plugin by name and returns
+                    it, it raises KeyError if the plugin can't be loaded
+        """
+        dict.__init__(self, plugins)
+        self._load = load
+
+    def __getitem__(self, name):
+        plugin = dict.__getitem__(self, name)
+        if isinstance(plugin, LazyPlugin):
+            plugin = self._load(name)
+            dict.__setitem__(self, name, plugin)
+        return plugin
+
+    def get(self, name, default=None):
+        if name in self:
+            return self[name]
+        return default
@@ -6,15 +6,284 @@ import glob
 
 import vim
 
-from orgmode._vim import ORGMODE, get_bufnumber, get_bufname, echoe
+from orgmode._vim import ORGMODE, get_bufnumber, get_bufname, echoe, echom
 from orgmode import settings
 from orgmode.keybinding import Keybinding, Plug, Command
 from orgmode.menu import Submenu, ActionEntry, add_cmd_mapping_menu
+from orgmode.liborgmode.agendacache import AgendaCache
+from orgmode.liborgmode.agendaloader import AgendaLoader
+from orgmode.liborgmode.todokeywords import TodoKeywordModel
+from orgmode.vimbuffer import MAX_MERGE_GAP
 
 from orgmode.py3compat.encode_compatibility import *
 from orgmode.py3compat.unicode_compatibility import *
 from orgmode.py3compat.py_py3_string import *
 
+class Line2Doc(object):
+    u"""
+    line2doc of an agenda that is filled in the background. It's a view of the
+    locations of an AsyncAgenda, they are changed together with its lines.
+    """
+
+    def __init__(self, locations):
+        u"""
+        :locations: location of every line of the agenda, None for lines that
+            don't belong to an item
+        """
+        object.__init__(self)
+        self.locations = locations
+
+    def __getitem__(self, row):
+        if 0 < row <= len(self.locations) and \
+                self.locations[row - 1] is not None:
+            return self.locations[row - 1]
+        raise KeyError(row)
+
+    def __setitem__(self, row, location):
+        self.locations[row - 1] = location
+
+    def __contains__(self, row):
+        return 0 < row <= len(self.locations) and \
+            self.locations[row - 1] is not None
+
+
+class AsyncAgenda(object):
+    u"""
+    Agenda that is filled while the agenda files are read in the background.
+    The items of every batch of files are merged into the sorted agenda and
+    just the lines that changed are written to the agenda buffer. The lines
+    and line2doc are always changed together so that they stay consistent.
+    """
+
+    # milliseconds between two updates of the agenda buffer
+    interval = 100
+
+    def __init__(self, plugin, bufnr, agenda_files, documents, load,
+                 batch_size, collect, format_item, empty_message=None):
+        u"""
+        :plugin: Agenda plugin, its line2doc is updated
+        :bufnr: number of the agenda buffer
+        :agenda_files: absolute paths of the agenda files
+        :documents: documents of the agenda files that are loaded already,
+            None for the files that are read in the background
+        :load: function that reads a list of agenda files
+        :batch_size: number of files that are read at once
+        :collect: function that creates the raw agenda from documents
+        :format_item: function that formats an item of the raw agenda, see
+            Agenda._format_week_item
+        :empty_message: message that is shown if the agenda is empty
+        """
+        object.__init__(self)
+        self.plugin = plugin
+        self.bufnr = bufnr
+        self.documents = documents
+        self.collect = collect
+        self.format_item = format_item
+        self.empty_message = empty_message
+        self.finished = False
+        self.timer = None
+        # indices of the documents that are read in the background, results
+        # arrive in this order
+        self._pending = [i for i, d in enumerate(documents) if d is None]
+        self._done = 0
+        self.loader = AgendaLoader(
+            load, [agenda_files[i] for i in self._pending], batch_size)
+
+        # sorted raw agenda, the index of the document of every item and the
+        # number of lines and the jump row (or None) of its formatted text
+        self._items = []
+        self._positions = []
+        self._sizes = []
+        self._jumps = []
+        # lines of the agenda and their locations, see Line2Doc
+        self.lines = []
+        self.locations = []
+        # regions of the lines that changed since the last write:
+        # [[start, end, difference in the number of lines], ..]
+        self._changes = []
+        # number of agenda lines in the buffer, None if the buffer needs to be
+        # replaced completely
+        self._written = None
+
+    def start(self):
+        u""" Start reading the files and the timer """
+        self.loader.start()
+        self.plugin.line2doc = Line2Doc(self.locations)
+        self._add([(i, d) for i, d in enumerate(self.documents)
+                   if d is not None])
+        if self.loader.paths:
+            self._write()
+            self.timer = int(vim.eval(u_encode(
+                u"timer_start(%d, {t -> execute('%s ORGMODE.plugins[u\"Agenda\"].poll_agenda()')}, {'repeat': -1})"
+                % (self.interval, VIM_PY_CALL))))
+        else:
+            self._finish()
+        return self
+
+    def poll(self):
+        u""" Show the files that were read since the last call """
+        if not int(vim.eval(u_encode(u'bufexists(%d)' % self.bufnr))):
+            # the agenda buffer was wiped out
+            self.cancel()
+            return
+        try:
+            results = self.loader.fetch()
+        except Exception as e:
+            results = []
+            echom(u'Unable to collect the agenda: %s' % e)
+        added = []
+        for path, document in results:
+            if document is None:
+                echom(u'Unable to read agenda file %s' % path)
+            else:
+                added.append((self._pending[self._done], document))
+            self.documents[self._pending[self._done]] = document
+            self._done += 1
+        self._add(added)
+        if self.loader.finished:
+            self._finish()
+        elif results:
+            self._write()
+
+    def cancel(self):
+        u""" Stop reading the files and show the agenda collected so far """
+        self.loader.cancel()
+        self._finish()
+
+    def _finish(self):
+        if self.timer is not None:
+            vim.command(u_encode(u'call timer_stop(%d)' % self.timer))
+            self.timer = None
+        self.finished = True
+        if not int(vim.eval(u_encode(u'bufexists(%d)' % self.bufnr))):
+            return
+        self._write()
+        if not self._items and self.empty_message and \
+                not self.loader.cancelled:
+            echom(self.empty_message)
+            return
+        row = self._jump_row()
+        if row is not None and vim.current.buffer.number == self.bufnr:
+            vim.command(u_encode(u'normal! %dgg' % row))
+
+    def _add(self, documents):
+        u"""
+        Merge the items of documents into the agenda. The items end up in the
+        order a complete sort of all documents would give them.
+
+        :documents: [(index of the document, document), ..] ordered by index
+        """
+        items = []
+        for position, document in documents:
+            items.extend((h, position) for h in self.collect([document]))
+        # the sort is stable, items of the same date keep the order of their
+        # documents
+        items.sort(key=lambda item: item[0])
+
+        # the items are sorted, every one is inserted after the previous one
+        index = 0
+        offset = 0
+        for heading, position in items:
+            found = self._find(heading, position, index)
+            offset += sum(self._sizes[index:found])
+            self._insert(found, offset, heading, position)
+            offset += self._sizes[found]
+            index = found + 1
+
+    def _find(self, heading, position, lo):
+        u""" Return the index heading is inserted at, it's not before lo """
+        hi = len(self._items)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            other = self._items[mid]
+            if heading < other or (not other < heading and
+                                   position < self._positions[mid]):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def _format(self, previous, heading):
+        lines, jump = self.format_item(previous, heading)
+        # the last line of an item refers to the heading
+        locations = [None] * (len(lines) - 1)
+        locations.append(
+            self.plugin._get_location(heading.document) + (heading.start, ))
+        return lines, locations, jump
+
+    def _insert(self, index, offset, heading, position):
+        u""" Insert heading at index, its lines start at offset """
+        previous = self._items[index - 1] if index else None
+        lines, locations, jump = self._format(previous, heading)
+        size = len(lines)
+        end = offset
+        if index < len(self._items):
+            # the following item gets a new predecessor, e.g. its date
+            # section might not be needed anymore
+            following, following_locations, following_jump = self._format(
+                heading, self._items[index])
+            if following != self.lines[offset:offset + self._sizes[index]]:
+                end += self._sizes[index]
+                self._sizes[index] = len(following)
+                self._jumps[index] = following_jump
+                lines.extend(following)
+                locations.extend(following_locations)
+        self._items.insert(index, heading)
+        self._positions.insert(index, position)
+        self._sizes.insert(index, size)
+        self._jumps.insert(index, jump)
+        self.lines[offset:end] = lines
+        self.locations[offset:end] = locations
+        self._changed(offset, end, len(lines))
+
+    def _changed(self, start, end, size):
+        u"""
+        Record that the lines from start to end were replaced by size lines.
+        Changes are recorded in ascending order, close ones are merged.
+        """
+        delta = size - (end - start)
+        if self._changes and start - self._changes[-1][1] <= MAX_MERGE_GAP:
+            last = self._changes[-1]
+            if last[1] > start:
+                last[1] = max(last[1] + delta, start + size)
+            else:
+                last[1] = start + size
+            last[2] += delta
+        else:
+            self._changes.append([start, start + size, delta])
+
+    def _write(self):
+        u""" Write the changed lines and the status to the agenda buffer """
+        status = []
+        if not self.finished:
+            # the status is shown below the agenda to keep line2doc valid
+            status.append(u'-- %d/%d agenda files, press <C-c> to cancel --' % (
+                self._done, len(self._pending)))
+        buf = vim.buffers[self.bufnr]
+
+        vim.command(u_encode(u'call setbufvar(%d, "&modifiable", 1)' % self.bufnr))
+        if self._written is None:
+            buf[:] = [u_encode(l) for l in self.lines + status]
+        else:
+            buf[self._written:] = [u_encode(l) for l in status]
+            # regions in front are written first, the ones that follow are
+            # at their new position then
+            for start, end, delta in self._changes:
+                buf[start:end - delta] = [
+                    u_encode(l) for l in self.lines[start:end]]
+        vim.command(u_encode(u'call setbufvar(%d, "&modifiable", 0)' % self.bufnr))
+        self._written = len(self.lines)
+        self._changes = []
+
+    def _jump_row(self):
+        u""" Return the row to jump to once the agenda is complete """
+        row = 1
+        for size, jump in zip(self._sizes, self._jumps):
+            if jump is not None:
+                return row + jump
+            row += size
+
+
 class Agenda(object):
     u"""
     The Agenda Plugin uses liborgmode.agenda to display the agenda views.
@@ -23,6 +292,12 @@ class Agenda(object):
     Also all the mappings: jump from agenda to todo, etc are realized here.
     """
 
+    # persistent cache of the agenda files, see _get_agenda_cache
+    _agenda_cache = None
+
+    # agenda that is collected in the background, see _list_async
+    _async_agenda = None
+
     def __init__(self):
         u""" Initialize plugin """
         object.__init__(self)
@@ -65,14 +340,11 @@ class Agenda(object):
             vim.command(u_encode(cmd))
 
     @classmethod
-    def _get_agendadocuments(self):
+    def _get_agendafile_patterns(cls):
         u"""
-        Return the org documents of the agenda files; return None if no
-        agenda documents are defined.
-
-        TODO: maybe turn this into an decorator?
+        Return the org_agenda_files patterns; return None if no agenda files
+        are defined.
         """
-        # load org files of agenda
         agenda_files = settings.get(u'org_agenda_files', u',')
         if not agenda_files or agenda_files == ',':
             echoe(
@@ -80,10 +352,28 @@ class Agenda(object):
                 u"g:org_agenda_files=['~/org/index.org'] to add "
                 u"files to the agenda view.")
             return
+        return agenda_files
+
+    @classmethod
+    def _get_agendadocuments(self):
+        u"""
+        Return the org documents of the agenda files; return None if no
+        agenda documents are defined.
+
+        TODO: maybe turn this into an decorator?
+        """
+        # load org files of agenda
+        agenda_files = self._get_agendafile_patterns()
+        if agenda_files is None:
+            return
         return self._load_agendafiles(agenda_files)
 
     @classmethod
-    def _load_agendafiles(self, agenda_files):
+    def _resolve_agendafiles(cls, agenda_files):
+        u"""
+        Return the absolute paths of the files matching the agenda_files
+        patterns.
+        """
         # glob for files in agenda_files
         resolved_files = []
         for f in agenda_files:
@@ -92,17 +382,87 @@ class Agenda(object):
                 os.path.basename(f)))
             resolved_files.extend(f)
 
-        agenda_files = [os.path.realpath(f) for f in resolved_files]
+        return [os.path.realpath(f) for f in resolved_files]
 
-        # load the agenda files into buffers
-        for agenda_file in agenda_files:
-            vim.command(u_encode(u'badd %s' % agenda_file.replace(" ", "\\ ")))
+    @classmethod
+    def _get_loaded_documents(cls, agenda_files):
+        u"""
+        Return the documents of the agenda files that are loaded in a buffer
+        and None for all other files. Loaded buffers might contain unsaved
+        changes, their DOM is used instead of the file.
+        """
+        # determine the buffer nr of the agenda files that are loaded already
+        buffers = dict((b.name, b.number) for b in vim.buffers if b.name)
 
-        # determine the buffer nr of the agenda files
-        agenda_nums = [get_bufnumber(fn) for fn in agenda_files]
+        bufnrs = [buffers.get(agenda_file) for agenda_file in agenda_files]
+        candidates = [bufnr for bufnr in bufnrs if bufnr is not None]
+        if not candidates:
+            return [None] * len(agenda_files)
+        loaded = vim.eval(u_encode(u'[%s]' % u', '.join(
+            u'bufloaded(%d)' % bufnr for bufnr in candidates)))
+        loaded = [bufnr for bufnr, l in zip(candidates, loaded) if int(l)]
 
-        # collect all documents of the agenda files and create the agenda
-        return [ORGMODE.get_document(i) for i in agenda_nums if i is not None]
+        documents = dict(zip(loaded, ORGMODE.get_documents(loaded)))
+        return [documents.get(bufnr) for bufnr in bufnrs]
+
+    @classmethod
+    def _get_file_loader(cls):
+        u"""
+        Return a function that reads agenda files from disk without adding
+        them to the buffer list, and the number of files it should be called
+        with at once.
+        """
+        cache = cls._get_agenda_cache()
+        # the files aren't read in a buffer, the global todo keywords apply
+        # to them and not those of the current buffer
+        model = TodoKeywordModel.from_setting(settings.get(
+            u'org_todo_keywords', [], scope=settings.SCOPE_GLOBAL))
+        todo_states = [(list(todo), list(done))
+                       for todo, done in model.sequences]
+        processes = int(settings.get(u'org_agenda_processes', 0) or 0)
+
+        def load(paths):
+            return cache.load_all(paths, todo_states, processes=processes)
+        return load, max(1, processes)
+
+    @classmethod
+    def _load_agendafiles(self, agenda_files):
+        agenda_files = self._resolve_agendafiles(agenda_files)
+
+        # collect all documents of the agenda files and create the agenda,
+        # files that are not loaded are read from disk
+        documents = self._get_loaded_documents(agenda_files)
+        unloaded = [i for i, d in enumerate(documents) if d is None]
+        load, _ = self._get_file_loader()
+        loaded = load([agenda_files[i] for i in unloaded])
+        for i, document in zip(unloaded, loaded):
+            if document is None:
+                echoe(u'Unable to read agenda file %s' % agenda_files[i])
+            documents[i] = document
+        return [d for d in documents if d is not None]
+
+    @classmethod
+    def _get_location(cls, document):
+        u"""
+        Return the file name and the buffer number of an agenda document. The
+        buffer number is None if the file isn't loaded into a buffer.
+        """
+        if document.bufnr is None:
+            return document.path, None
+        return get_bufname(document.bufnr), document.bufnr
+
+    @classmethod
+    def _get_agenda_cache(cls):
+        u"""
+        Return the cache of agenda files. If it's disabled the cache doesn't
+        store anything.
+        """
+        directory = settings.get(u'org_agenda_cache_dir', u'')
+        directory = os.path.expanduser(directory) if directory else None
+        if cls._agenda_cache is None or \
+                cls._agenda_cache.directory != directory:
+            cls._agenda_cache = AgendaCache(directory)
+        return cls._agenda_cache
 
     @classmethod
     def opendoc(cls, split=False, switch=False):
@@ -120,14 +480,11 @@ class Agenda(object):
         except:
             return
 
-        # reload source file if it is not loaded
-        if get_bufname(bufnr) is None:
-            vim.command(u_encode(u'badd %s' % bufname))
+        # load the source file into a buffer if it isn't loaded yet
+        if bufnr is None or get_bufname(bufnr) is None:
+            vim.command(u_encode(u'badd %s' % bufname.replace(" ", "\\ ")))
             bufnr = get_bufnumber(bufname)
-            tmp = cls.line2doc[row]
-            cls.line2doc[bufnr] = tmp
-            # delete old endry
-            del cls.line2doc[row]
+            cls.line2doc[row] = (bufname, bufnr, destrow)
 
         if split:
             vim.command(u_encode(u"sbuffer %s" % bufnr))
@@ -140,6 +497,16 @@ class Agenda(object):
 
     @classmethod
     def list_next_week(cls):
+        if cls._is_async():
+            agenda_files = cls._get_agendafile_patterns()
+            if agenda_files is None:
+                return
+            cls._list_async(
+                cls._resolve_agendafiles(agenda_files),
+                ORGMODE.agenda_manager.get_next_week_and_active_todo,
+                cls._format_week_item,
+                u'All caught-up. No agenda or active todo next week.')
+            return
         agenda_documents = cls._get_agendadocuments()
         if not agenda_documents:
             return
@@ -166,40 +533,8 @@ class Agenda(object):
         cmd = [u'setlocal filetype=orgagenda', ]
         cls._switch_to(u'AGENDA', cmd)
 
-        # line2doc is a dic with the mapping:
-        #     line in agenda buffer --> source document
-        # It's easy to jump to the right document this way
-        cls.line2doc = {}
-        # format text for agenda
-        last_date = raw_agenda[0].active_date
-        final_agenda = [u'Week Agenda:', unicode(last_date)]
-        for i, h in enumerate(raw_agenda):
-            # insert date information for every new date (not datetime)
-            if unicode(h.active_date)[1:11] != unicode(last_date)[1:11]:
-                today = date.today()
-                # insert additional "TODAY" string
-                if h.active_date.year == today.year and \
-                    h.active_date.month == today.month and \
-                    h.active_date.day == today.day:
-                    section = unicode(h.active_date) + u" TODAY"
-                    today_row = len(final_agenda) + 1
-                else:
-                    section = unicode(h.active_date)
-                final_agenda.append(section)
-
-                # update last_date
-                last_date = h.active_date
-
-            bufname = os.path.basename(vim.buffers[h.document.bufnr].name)
-            bufname = bufname[:-4] if bufname.endswith(u'.org') else bufname
-            formatted = u"  %(bufname)s (%(bufnr)d)  %(todo)s  %(title)s" % {
-                'bufname': bufname,
-                'bufnr': h.document.bufnr,
-                'todo': h.todo,
-                'title': h.title
-            }
-            final_agenda.append(formatted)
-            cls.line2doc[len(final_agenda)] = (get_bufname(h.document.bufnr), h.document.bufnr, h.start)
+        final_agenda, cls.line2doc, today_row = cls._format_next_week(
+            raw_agenda)
 
         # show agenda
         vim.current.buffer[:] = [u_encode(i) for i in final_agenda]
@@ -210,6 +545,78 @@ class Agenda(object):
         except:
             pass
 
+    @classmethod
+    def _format_agenda(cls, raw_agenda, format_item):
+        u"""
+        Format an agenda item by item.
+
+        :format_item: function that formats an item, see _format_week_item
+        :returns: (lines of the agenda, line2doc, row to jump to or None)
+        """
+        # line2doc is a dic with the mapping:
+        #     line in agenda buffer --> source document
+        # It's easy to jump to the right document this way
+        line2doc = {}
+        row = None
+        final_agenda = []
+        previous = None
+        for h in raw_agenda:
+            lines, jump = format_item(previous, h)
+            if jump is not None:
+                row = len(final_agenda) + jump + 1
+            final_agenda.extend(lines)
+            line2doc[len(final_agenda)] = cls._get_location(h.document) + (h.start, )
+            previous = h
+        return final_agenda, line2doc, row
+
+    @classmethod
+    def _format_next_week(cls, raw_agenda):
+        u"""
+        Format the week agenda.
+
+        :returns: (lines of the agenda, line2doc, row of today or None)
+        """
+        return cls._format_agenda(raw_agenda, cls._format_week_item)
+
+    @classmethod
+    def _format_week_item(cls, previous, h):
+        u"""
+        Format an item of the week agenda. The last line is the item itself,
+        it's preceded by the date section if the date differs from the date
+        of the previous item.
+
+        :previous: the previous item of the agenda or None
+        :returns: (lines, index of the line to jump to or None)
+        """
+        jump = None
+        if previous is None:
+            lines = [u'Week Agenda:', unicode(h.active_date)]
+        # insert date information for every new date (not datetime)
+        elif unicode(h.active_date)[1:11] != unicode(previous.active_date)[1:11]:
+            today = date.today()
+            # insert additional "TODAY" string
+            if h.active_date.year == today.year and \
+                h.active_date.month == today.month and \
+                h.active_date.day == today.day:
+                lines = [unicode(h.active_date) + u" TODAY"]
+                jump = 0
+            else:
+                lines = [unicode(h.active_date)]
+        else:
+            lines = []
+
+        path, bufnr = cls._get_location(h.document)
+        bufname = os.path.basename(path)
+        bufname = bufname[:-4] if bufname.endswith(u'.org') else bufname
+        if bufnr is not None:
+            bufname = u"%s (%d)" % (bufname, bufnr)
+        lines.append(u"  %(bufname)s  %(todo)s  %(title)s" % {
+            'bufname': bufname,
+            'todo': h.todo,
+            'title': h.title
+        })
+        return lines, jump
+
     @classmethod
     def list_all_todos(cls, current_buffer=False):
         u""" List all todos in one buffer.
@@ -222,28 +629,108 @@ class Agenda(object):
         if current_buffer:
             agenda_documents = vim.current.buffer.name
             loaded_agendafiles = cls._load_agendafiles([agenda_documents])
+        elif cls._is_async():
+            agenda_files = cls._get_agendafile_patterns()
+            if agenda_files is None:
+                return
+            cls._list_async(cls._resolve_agendafiles(agenda_files),
+                            ORGMODE.agenda_manager.get_todo,
+                            cls._format_todo_item)
+            return
         else:
             loaded_agendafiles = cls._get_agendadocuments()
         if not loaded_agendafiles:
             return
         raw_agenda = ORGMODE.agenda_manager.get_todo(loaded_agendafiles)
 
-        cls.line2doc = {}
         # create buffer at bottom
         cmd = [u'setlocal filetype=orgagenda']
         cls._switch_to(u'AGENDA', cmd)
 
-        # format text of agenda
-        final_agenda = []
-        for i, h in enumerate(raw_agenda):
-            tmp = u"%s %s" % (h.todo, h.title)
-            final_agenda.append(tmp)
-            cls.line2doc[len(final_agenda)] = (get_bufname(h.document.bufnr), h.document.bufnr, h.start)
+        final_agenda, cls.line2doc, _ = cls._format_todos(raw_agenda)
 
         # show agenda
         vim.current.buffer[:] = [u_encode(i) for i in final_agenda]
         vim.command(u_encode(u'setlocal nomodifiable  conceallevel=2 concealcursor=nc'))
 
+    @classmethod
+    def _format_todos(cls, raw_agenda):
+        u"""
+        Format the todo agenda.
+
+        :returns: (lines of the agenda, line2doc, None)
+        """
+        return cls._format_agenda(raw_agenda, cls._format_todo_item)
+
+    @classmethod
+    def _format_todo_item(cls, previous, h):
+        u"""
+        Format an item of the todo agenda, see _format_week_item.
+        """
+        return [u"%s %s" % (h.todo, h.title)], None
+
+    @classmethod
+    def _is_async(cls):
+        u"""
+        Return True if agenda files should be collected in the background.
+        """
+        return bool(int(settings.get(u'org_agenda_async', 0) or 0)) and \
+            bool(int(vim.eval(u_encode(u'has("timers")'))))
+
+    @classmethod
+    def _list_async(cls, agenda_files, collect, format_item,
+                    empty_message=None):
+        u"""
+        Open the agenda buffer right away and fill it while the agenda files
+        are read in the background.
+
+        :agenda_files: absolute paths of the agenda files
+        :collect: function that creates the raw agenda from a list of documents
+        :format_item: function that formats an item of the raw agenda, see
+            _format_week_item
+        :empty_message: message that is shown if the agenda is empty
+        """
+        cls.cancel_agenda(quiet=True)
+
+        documents = cls._get_loaded_documents(agenda_files)
+        load, batch_size = cls._get_file_loader()
+
+        cmd = [
+            u'setlocal filetype=orgagenda conceallevel=2 concealcursor=nc',
+            u'nnoremap <silent> <buffer> <C-c> :exec "%s ORGMODE.plugins[u\'Agenda\'].cancel_agenda()"<CR>' % VIM_PY_CALL]
+        cls._switch_to(u'AGENDA', cmd)
+        cls.line2doc = {}
+
+        cls._async_agenda = AsyncAgenda(
+            cls, vim.current.buffer.number, agenda_files, documents, load,
+            batch_size, collect, format_item, empty_message).start()
+
+    @classmethod
+    def poll_agenda(cls):
+        u"""
+        Show the agenda files that were read in the background since the last
+        call. It's called by a timer while the agenda is collected.
+        """
+        if cls._async_agenda is None:
+            return
+        cls._async_agenda.poll()
+        if cls._async_agenda.finished:
+            cls._async_agenda = None
+
+    @classmethod
+    def cancel_agenda(cls, quiet=False):
+        u"""
+        Stop collecting the agenda, the agenda files read so far are kept.
+
+        :quiet: if True, don't show a message
+        """
+        if cls._async_agenda is None:
+            return
+        cls._async_agenda.cancel()
+        cls._async_agenda = None
+        if not quiet:
+            echom(u'Agenda collection cancelled')
+
     @classmethod
     def list_timeline(cls):
         """
@@ -275,6 +762,12 @@ class Agenda(object):
 
         Key bindings and other initialization should be done here.
         """
+        # the cache stores the headings of the agenda files on disk, users
+        # have to choose a directory for it
+        settings.set(u'org_agenda_cache_dir', u'')
+        settings.set(u'org_agenda_processes', 0)
+        settings.set(u'org_agenda_async', 0)
+
         add_cmd_mapping_menu(
             self,
             name=u"OrgAgendaTodo",
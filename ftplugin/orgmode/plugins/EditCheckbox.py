@@ -5,7 +5,7 @@ from orgmode._vim import echo, echom, echoe, ORGMODE, apply_count, repeat, inser
 from orgmode import settings
 from orgmode.menu import Submenu, Separator, ActionEntry, add_cmd_mapping_menu
 from orgmode.keybinding import Keybinding, Plug, Command
-from orgmode.liborgmode.checkboxes import Checkbox
+from orgmode.liborgmode.checkboxes import Checkbox, propagate_status
 from orgmode.liborgmode.dom_obj import OrderListType
 
 from orgmode.py3compat.encode_compatibility import *
@@ -47,7 +47,7 @@ class EditCheckbox(object):
             return
         # init checkboxes for current heading
         h.init_checkboxes()
-        c = h.current_checkbox()
+        c = h.current_checkbox(vim.current.window.cursor[0] - 1)
 
         nc = Checkbox()
         nc._heading = h
@@ -154,10 +154,11 @@ class EditCheckbox(object):
 
         if checkbox is None:
             # get current_checkbox
-            c = current_heading.current_checkbox()
+            c = current_heading.current_checkbox(
+                vim.current.window.cursor[0] - 1)
             # no checkbox found
             if c is None:
-                cls.update_checkboxes_status()
+                cls.update_checkboxes_status(current_heading)
                 return
         else:
             c = checkbox
@@ -166,113 +167,37 @@ class EditCheckbox(object):
             # set checkbox status on if all children are on
             if c.all_children_status()[0] == 0 or c.are_children_all(Checkbox.STATUS_ON):
                 c.toggle()
-                d.write_checkbox(c)
             elif c.status is None:
                 c.status = Checkbox.STATUS_OFF
-                d.write_checkbox(c)
 
         elif c.status == Checkbox.STATUS_ON:
             if c.all_children_status()[0] == 0 or c.is_child_one(Checkbox.STATUS_OFF):
                 c.toggle()
-                d.write_checkbox(c)
 
         elif c.status == Checkbox.STATUS_INT:
             # can't toggle intermediate state directly according to emacs orgmode
             pass
-        # update checkboxes status
-        cls.update_checkboxes_status()
-
-    @classmethod
-    def _update_subtasks(cls):
-        d = ORGMODE.get_document()
-        h = d.current_heading()
-        # init checkboxes for current heading
-        h.init_checkboxes()
-        # update heading subtask info
-        c = h.first_checkbox
-        if c is None:
-            return
-        total, on = c.all_siblings_status()
-        h.update_subtasks(total, on)
-        # update all checkboxes under current heading
-        cls._update_checkboxes_subtasks(c)
+        # update checkboxes status, the toggled checkbox is written with them
+        cls.update_checkboxes_status(current_heading)
 
     @classmethod
-    def _update_checkboxes_subtasks(cls, checkbox):
-        # update checkboxes
-        for c in checkbox.all_siblings():
-            if c.children:
-                total, on = c.first_child.all_siblings_status()
-                c.update_subtasks(total, on)
-                cls._update_checkboxes_subtasks(c.first_child)
+    def update_checkboxes_status(cls, heading=None):
+        u""" Update the status of all checkboxes of a heading and the subtask
+        cookies of the heading and its checkboxes. The changes are written to
+        the buffer at once.
 
-    @classmethod
-    def update_checkboxes_status(cls):
+        :heading:    The heading, the current heading if None
+        """
         d = ORGMODE.get_document()
-        h = d.current_heading()
+        h = heading
         if h is None:
-            return
-        # init checkboxes for current heading
-        h.init_checkboxes()
-
-        cls._update_checkboxes_status(h.first_checkbox)
-        cls._update_subtasks()
-
-    @classmethod
-    def _update_checkboxes_status(cls, checkbox=None):
-        u""" helper function for update checkboxes status
-            :checkbox: The first checkbox of this indent level
-            :return: The status of the parent checkbox
-        """
-        if checkbox is None:
-            return
-
-        status_off, status_on, status_int, total = 0, 0, 0, 0
-        # update all top level checkboxes' status
-        for c in checkbox.all_siblings():
-            current_status = c.status
-            # if this checkbox is not leaf, its status should determine by all its children
-            if c.all_children_status()[0] > 0:
-                current_status = cls._update_checkboxes_status(c.first_child)
-
-            # don't update status if the checkbox has no status
-            if c.status is None:
-                current_status = None
-            # the checkbox needs to have status
-            else:
-                total += 1
-
-            # count number of status in this checkbox level
-            if current_status == Checkbox.STATUS_OFF:
-                status_off += 1
-            elif current_status == Checkbox.STATUS_ON:
-                status_on += 1
-            elif current_status == Checkbox.STATUS_INT:
-                status_int += 1
-
-            # write status if any update
-            if current_status is not None and c.status != current_status:
-                c.status = current_status
-                d = ORGMODE.get_document()
-                d.write_checkbox(c)
-
-        parent_status = Checkbox.STATUS_INT
-        # all silbing checkboxes are off status
-        if total == 0:
-            pass
-        elif status_off == total:
-            parent_status = Checkbox.STATUS_OFF
-        # all silbing checkboxes are on status
-        elif status_on == total:
-            parent_status = Checkbox.STATUS_ON
-        # one silbing checkbox is on or int status
-        elif status_on != 0 or status_int != 0:
-            parent_status = Checkbox.STATUS_INT
-        # other cases
-        else:
-            parent_status = None
+            h = d.current_heading()
+            if h is None:
+                return
+            # init checkboxes for current heading
+            h.init_checkboxes()
 
-        return parent_status
+        d.write_checkboxes(propagate_status(h))
 
     def register(self):
         u"""
@@ -55,7 +55,8 @@ class EditStructure(object):
 
         # check for plain list(checkbox)
         current_heading.init_checkboxes()
-        c = current_heading.current_checkbox()
+        c = current_heading.current_checkbox(
+            vim.current.window.cursor[0] - 1)
         if c is not None:
             ORGMODE.plugins[u"EditCheckbox"].new_checkbox(below, not c.status)
             return
@@ -3,7 +3,7 @@
 import vim
 
 from orgmode.liborgmode.headings import Heading
-from orgmode._vim import ORGMODE, apply_count
+from orgmode._vim import ORGMODE, apply_count, update_folds_orgmode
 from orgmode import settings
 from orgmode.menu import Submenu, ActionEntry
 from orgmode.keybinding import Keybinding, Plug, MODE_NORMAL
@@ -58,6 +58,7 @@ class ShowHide(object):
 
         :reverse:    If False open folding by one level otherwise close it by one.
         """
+        update_folds_orgmode()
         d = ORGMODE.get_document()
         heading = d.current_heading()
         if not heading:
@@ -127,6 +128,7 @@ class ShowHide(object):
 
         :reverse:    If False open folding by one level otherwise close it by one.
         """
+        update_folds_orgmode()
         d = ORGMODE.get_document()
         if reverse:
             foldlevel = int(vim.eval(u_encode(u'&foldlevel')))
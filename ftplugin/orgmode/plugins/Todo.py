@@ -7,6 +7,7 @@ import itertools as it
 from orgmode._vim import echom, ORGMODE, apply_count, repeat, realign_tags
 from orgmode import settings
 from orgmode.liborgmode.base import Direction
+from orgmode.liborgmode.todokeywords import TodoKeywordModel
 from orgmode.menu import Submenu, ActionEntry
 from orgmode.keybinding import Keybinding, Plug
 from orgmode.exceptions import PluginError
@@ -78,29 +79,6 @@ class Todo(object):
         # bindings should be put in this variable
         self.keybindings = []
 
-    @classmethod
-    def _process_all_states(cls, all_states):
-        u""" verify if states defined by user is valid.
-        Return cleaned_todo and flattened if is. Raise Exception if not.
-        Valid checking:
-            * no two state share a same name
-        """
-        # TODO Write tests. -- Ron89
-        cleaned_todos = [[
-            split_access_key(todo)[0] for todo in it.chain.from_iterable(x)]
-            for x in all_states] + [[None]]
-
-        flattened_todos = list(it.chain.from_iterable(cleaned_todos))
-        if len(flattened_todos) != len(set(flattened_todos)):
-            raise PluginError(u"Duplicate names detected in TODO keyword list. Please examine `g/b:org_todo_keywords`")
-        # TODO This is the case when there are 2 todo states with the same
-        # name. It should be handled by making a simple class to hold TODO
-        # states, which would avoid mixing 2 todo states with the same name
-        # since they would have a different reference (but same content),
-        # albeit this can fail because python optimizes short strings (i.e.
-        # they hold the same ref) so care should be taken in implementation
-        return (cleaned_todos, flattened_todos)
-
     @classmethod
     def _get_next_state(
         cls, current_state, all_states, direction=Direction.FORWARD,
@@ -110,7 +88,8 @@ class Todo(object):
         Args:
             current_state (str): The current todo state
             all_states (list): A list containing all todo states within
-                sublists. The todo states may contain access keys
+                sublists or a TodoKeywordModel. The todo states may contain
+                access keys
             direction: Direction of state or keyword set change (forward or
                 backward)
             next_set: Advance to the next keyword set in defined direction.
@@ -123,7 +102,13 @@ class Todo(object):
             (['REPORT(r)', 'BUG(b)', 'KNOWNCAUSE(k)'], ['FIXED(f)']),
             ([], ['CANCELED(c)'])]
         """
-        cleaned_todos, flattened_todos = cls._process_all_states(all_states)
+        if not isinstance(all_states, TodoKeywordModel):
+            all_states = TodoKeywordModel.from_sequences(all_states)
+        if all_states.has_duplicates:
+            raise PluginError(u"Duplicate names detected in TODO keyword list. Please examine `g/b:org_todo_keywords`")
+        # the cleaned states are computed once for every set of keywords
+        cleaned_todos = all_states.cycle_sets
+        flattened_todos = all_states.cycle
 
         # backward direction should really be -1 not 2
         next_dir = -1 if direction == Direction.BACKWARD else 1
@@ -134,7 +119,7 @@ class Todo(object):
                 if current_state in todo_set[1]), -1)
             ind = (top_set + next_dir) % len(cleaned_todos)
             if ind != len(cleaned_todos) - 1:
-                echom("Using set: %s" % str(all_states[ind]))
+                echom("Using set: %s" % str(all_states.raw_sequences[ind]))
             else:
                 echom("Keyword removed.")
             return cleaned_todos[ind][0]
@@ -163,7 +148,7 @@ class Todo(object):
             vim.eval(u'feedkeys("^", "n")')
             return
 
-        todo_states = d.get_todo_states(strip_access_key=False)
+        todo_states = d.todo_keywords()
         # get todo states
         if not todo_states:
             echom(u'No todo keywords configured.')
@@ -179,7 +164,7 @@ class Todo(object):
                 prompt_pos = u'botright'
 
             # pass todo states to new window
-            ORGTODOSTATES[d.bufnr] = todo_states
+            ORGTODOSTATES[d.bufnr] = d.get_todo_states(strip_access_key=False)
             settings.set(
                 u'org_current_state_%d' % d.bufnr,
                 current_state if current_state is not None else u'', overwrite=True)
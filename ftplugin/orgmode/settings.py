@@ -18,6 +18,105 @@ VARIABLE_LEADER = {SCOPE_GLOBAL: u'g', SCOPE_BUFFER: u'b'}
 
 u""" Evaluate and store settings """
 
+# all org_ variables of the global and the buffer scope in one eval. Internal
+# variables that grow with the buffer, e.g. the cache of fold texts, aren't
+# settings and are left out.
+SNAPSHOT_FILTER = u'v:key =~# "^org_" && v:key !=# "org_foldtext_cache"'
+SNAPSHOT_EXPR = u"[filter(copy(g:), '%s'), filter(copy(b:), '%s')]" % (
+    SNAPSHOT_FILTER, SNAPSHOT_FILTER)
+
+# settings are read from a snapshot of all org_ variables if this is True,
+# see g:org_settings_snapshot. It requires that invalidate() is called
+# whenever variables might have changed, e.g. whenever vim calls into
+# orgmode and by an autocmd after every command line.
+snapshots_enabled = False
+
+# the snapshot is taken again when the generation changes
+_generation = 0
+_snapshot_generation = None
+# org_ variables of the global scope and of the buffer scope by buffer number
+_global_snapshot = None
+_buffer_snapshots = {}
+_snapshot_failed = False
+
+_stats = {u'lookups': 0, u'snapshots': 0, u'evals_saved': 0}
+
+
+def invalidate():
+    u""" Drop the snapshot of the settings, it's taken again with the next
+    lookup. Call this whenever org_ variables might have been changed outside
+    of this module.
+    """
+    global _generation
+    _generation += 1
+
+
+def generation():
+    u""" Return the generation of the settings snapshot. Values derived from
+    settings can be cached as long as the generation doesn't change.
+
+    :returns: the generation or None if snapshots are disabled, derived
+        values must not be cached in that case
+    """
+    if snapshots_enabled:
+        return _generation
+
+
+def stats():
+    u""" Return statistics about the settings snapshot
+
+    :returns: dict with the number of lookups that were served from the
+        snapshot, the number of snapshots that were taken and the number of
+        vim.eval calls that were saved in total
+    """
+    return dict(_stats)
+
+
+def reset_stats():
+    u""" Reset the statistics about the settings snapshot """
+    for k in _stats:
+        _stats[k] = 0
+
+
+def _get_snapshot():
+    u""" Return the org_ variables of the global scope and of the current
+    buffer's scope, take a new snapshot if the variables might have changed.
+
+    :returns: (global variables, buffer variables) or None if snapshots are
+        disabled or failed
+    """
+    global _snapshot_generation, _global_snapshot, _buffer_snapshots, \
+        _snapshot_failed
+    if not snapshots_enabled:
+        return
+    if _snapshot_generation != _generation:
+        _snapshot_generation = _generation
+        _global_snapshot = None
+        _buffer_snapshots = {}
+        _snapshot_failed = False
+
+    bufnr = vim.current.buffer.number
+    buffer_snapshot = _buffer_snapshots.get(bufnr)
+    if buffer_snapshot is not None:
+        return _global_snapshot, buffer_snapshot
+    if _snapshot_failed:
+        return
+
+    try:
+        res = vim.eval(u_encode(SNAPSHOT_EXPR))
+    except Exception:
+        res = None
+    if type(res) not in (list, tuple) or len(res) != 2 or \
+            not all(isinstance(i, dict) for i in res):
+        # fall back to reading every setting, until the next invalidation
+        _snapshot_failed = True
+        return
+    _stats[u'snapshots'] += 1
+    _global_snapshot = dict((u_decode(k), v) for k, v in res[0].items())
+    _buffer_snapshots[bufnr] = dict(
+        (u_decode(k), v) for k, v in res[1].items())
+    return _global_snapshot, _buffer_snapshots[bufnr]
+
 
 def get(setting, default=None, scope=SCOPE_ALL):
     u""" Evaluate setting in scope of the current buffer,
@@ -28,19 +127,40 @@ def get(setting, default=None, scope=SCOPE_ALL):
 
     :setting: name of the variable to evaluate
     :default: default value in case the variable is empty
+    :scope:   SCOPE_ALL, SCOPE_GLOBAL to ignore buffer variables or
+              SCOPE_BUFFER to ignore global variables
 
     :returns: variable value
     """
+    snapshot = _get_snapshot()
+    if snapshot is not None:
+        global_snapshot, buffer_snapshot = snapshot
+        _stats[u'lookups'] += 1
+        if scope != SCOPE_GLOBAL and setting in buffer_snapshot:
+            # exists("b:..") and b:..
+            _stats[u'evals_saved'] += 2
+            res = buffer_snapshot[setting]
+        elif scope != SCOPE_BUFFER and setting in global_snapshot:
+            # exists("b:.."), exists("g:..") and g:..
+            _stats[u'evals_saved'] += 3
+            res = global_snapshot[setting]
+        else:
+            _stats[u'evals_saved'] += 2
+            return default
+        if type(res) in (unicode, str):
+            return u_decode(res)
+        return res
+
     # TODO first read setting from org file which take precedence over vim
     # variable settings
-    if (scope & SCOPE_ALL | SCOPE_BUFFER) and \
+    if (scope & (SCOPE_ALL | SCOPE_BUFFER)) and \
             int(vim.eval(u_encode(u'exists("b:%s")' % setting))):
         res = vim.eval(u_encode(u"b:%s" % setting))
         if type(res) in (unicode, str):
             return u_decode(res)
         return res
 
-    elif (scope & SCOPE_ALL | SCOPE_GLOBAL) and \
+    elif (scope & (SCOPE_ALL | SCOPE_GLOBAL)) and \
             int(vim.eval(u_encode(u'exists("g:%s")' % setting))):
         res = vim.eval(u_encode(u"g:%s" % setting))
         if type(res) in (unicode, str):
@@ -79,6 +199,7 @@ def set(setting, value, scope=SCOPE_GLOBAL, overwrite=False):
 
     cmd = u'let %s:%s = %s' % (VARIABLE_LEADER[scope], setting, v)
     vim.command(u_encode(cmd))
+    invalidate()
     return value
 
 
@@ -92,4 +213,5 @@ def unset(setting, scope=SCOPE_GLOBAL):
     value = get(setting, scope=scope)
     cmd = u'unlet! %s:%s' % (VARIABLE_LEADER[scope], setting)
     vim.command(u_encode(cmd))
+    invalidate()
     return value
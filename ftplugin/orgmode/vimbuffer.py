@@ -23,16 +23,51 @@ try:
 except:
     from UserList import UserList
 
+import sys
+
 import vim
 
 from orgmode import settings
 from orgmode.exceptions import BufferNotFound, BufferNotInSync
+from orgmode.liborgmode.base import get_changed_range
 from orgmode.liborgmode.documents import Document, MultiPurposeList, Direction
 from orgmode.liborgmode.headings import Heading
+from orgmode.liborgmode.todokeywords import TodoKeywordModel
 
 from orgmode.py3compat.encode_compatibility import *
 from orgmode.py3compat.unicode_compatibility import *
 
+# replacements of the buffer that are separated by no more than this number of
+# unchanged lines are merged. Rewriting a few lines is cheaper than another
+# call into vim.
+MAX_MERGE_GAP = 64
+
+
+if sys.version_info < (3, ):
+    def _decode_lines(lines):
+        return [u_decode(line) if type(line) is str else line
+                for line in lines]
+else:
+    def _decode_lines(lines):
+        # vim returns unicode strings in python 3, there's nothing to decode
+        return lines if type(lines) is list else list(lines)
+
+
+def get_changedticks(bufnrs):
+    u""" Read b:changedtick of many buffers with a single call into vim.
+    getbufvar() reads the variable without switching buffers, so no
+    autocommands are triggered.
+
+    :bufnrs:     numbers of the buffers
+    :returns:    list of the changedticks in the order of bufnrs, -1 for
+                buffers that don't exist
+    """
+    if not bufnrs:
+        return []
+    ticks = vim.eval(u_encode(u'[%s]' % u', '.join(
+        u'getbufvar(%d, "changedtick", -1)' % bufnr for bufnr in bufnrs)))
+    return [int(tick) for tick in ticks]
+
 
 class VimBuffer(Document):
     def __init__(self, bufnr=0):
@@ -42,7 +77,18 @@ class VimBuffer(Document):
         Document.__init__(self)
         self._bufnr          = vim.current.buffer.number if bufnr == 0 else bufnr
         self._changedtick    = -1
-        self._cached_heading = None
+        # hashes of all lines at the time the DOM was built, they are used to
+        # find the lines that changed since then
+        self._line_hashes    = None
+        self._write_calls    = 0
+        # fold levels of all lines and the changedtick they were computed for
+        self._fold_levels    = None
+        # compiled todo keywords and the settings generation they were read in
+        self._todo_keywords  = None
+        # lines of the headings that were parsed again since
+        # pop_changed_range() was called, None if they are unknown, e.g.
+        # because the DOM was built or written since then
+        self._changed_range  = None
         if self._bufnr == vim.current.buffer.number:
             self._content = VimBufferContent(vim.current.buffer)
         else:
@@ -73,6 +119,18 @@ class VimBuffer(Document):
             self.update_changedtick()
         return self._changedtick == self._orig_changedtick
 
+    def sync_changedtick(self, changedtick):
+        u""" Like is_insync but with a changedtick that has been read already,
+        see get_changedticks().
+
+        :changedtick:    current b:changedtick of the buffer
+        :returns:        True if the buffer didn't change since the DOM was
+                        built
+        """
+        if self._changedtick == self._orig_changedtick:
+            self._changedtick = changedtick
+        return self._changedtick == self._orig_changedtick
+
     @property
     def bufnr(self):
         u"""
@@ -80,6 +138,11 @@ class VimBuffer(Document):
         """
         return self._bufnr
 
+    @property
+    def write_calls(self):
+        u""" Number of calls into the vim buffer the last write needed """
+        return self._write_calls
+
     @property
     def changedtick(self):
         u""" Number of changes in vimbuffer """
@@ -89,6 +152,20 @@ class VimBuffer(Document):
     def changedtick(self, value):
         self._changedtick = value
 
+    def todo_keywords(self):
+        u""" Get the compiled todo keywords of the buffer. The model is cached
+        as long as the settings don't change.
+
+        :returns:    TodoKeywordModel
+        """
+        generation = settings.generation()
+        if generation is None or self._todo_keywords is None or \
+                self._todo_keywords[0] != generation:
+            model = TodoKeywordModel.from_setting(
+                settings.get(u'org_todo_keywords', []))
+            self._todo_keywords = (generation, model)
+        return self._todo_keywords[1]
+
     def get_todo_states(self, strip_access_key=True):
         u""" Returns a list containing a tuple of two lists of allowed todo
         states split by todo and done states. Multiple todo-done state
@@ -96,69 +173,244 @@ class VimBuffer(Document):
 
         :returns:    [([todo states], [done states]), ..]
         """
-        states = settings.get(u'org_todo_keywords', [])
-        # TODO this function gets called too many times when change of state of
-        # one todo is triggered, check with:
-        # print(states)
-        # this should be changed by saving todo states into some var and only
-        # if new states are set hook should be called to register them again
-        # into a property
-        # TODO move this to documents.py, it is all tangled up like this, no
-        # structure...
-        if type(states) not in (list, tuple):
-            return []
-
-        def parse_states(s, stop=0):
-            res = []
-            if not s:
-                return res
-            if type(s[0]) in (unicode, str):
-                r = []
-                for i in s:
-                    _i = i
-                    if type(_i) == str:
-                        _i = u_decode(_i)
-                    if type(_i) == unicode and _i:
-                        if strip_access_key and u'(' in _i:
-                            _i = _i[:_i.index(u'(')]
-                            if _i:
-                                r.append(_i)
-                        else:
-                            r.append(_i)
-                if not u'|' in r:
-                    if not stop:
-                        res.append((r[:-1], [r[-1]]))
-                    else:
-                        res = (r[:-1], [r[-1]])
-                else:
-                    seperator_pos = r.index(u'|')
-                    if not stop:
-                        res.append((r[0:seperator_pos], r[seperator_pos + 1:]))
-                    else:
-                        res = (r[0:seperator_pos], r[seperator_pos + 1:])
-            elif type(s) in (list, tuple) and not stop:
-                for i in s:
-                    r = parse_states(i, stop=1)
-                    if r:
-                        res.append(r)
-            return res
-
-        return parse_states(states)
+        model = self.todo_keywords()
+        sequences = model.sequences if strip_access_key else \
+            model.raw_sequences
+        # the model is shared by all buffers, callers get their own copy
+        return [(list(todo), list(done)) for todo, done in sequences]
+
+    def _read_content(self):
+        content = self.lines()
+        self._line_hashes = [hash(line) for line in content]
+        return content
+
+    def _fetch_lines(self):
+        return self._content.snapshot()
+
+    def update_dom(self, first=None, old_last=None, new_last=None, heading=Heading):
+        u""" Bring the DOM in sync with the vim buffer by reparsing just the
+        headings that are touched by the changes made since the DOM was built.
+
+        The changed range is either provided by the caller, e.g. from a
+        listener callback, or it's determined by comparing the buffer with the
+        line hashes that were recorded when the DOM was built.
+
+        :first:        First changed line
+        :old_last:    End of the changed range before the change (exclusive)
+        :new_last:    End of the changed range after the change (exclusive)
+        :heading:    The base class for newly created headings
+
+        :returns:    True if the DOM is in sync with the buffer again, False if
+                    it must be rebuilt
+        """
+        if self._line_hashes is None or self.is_dirty:
+            return False
+        if self._bufnr == vim.current.buffer.number and \
+                self._content.data is not vim.current.buffer:
+            # the document isn't attached to the buffer anymore
+            return False
+
+        content = None
+        if first is None:
+            old_hashes = self._line_hashes
+            # the buffer is known to have changed, read it again even if the
+            # snapshot's key didn't change
+            self.invalidate_line_index()
+            content = self._read_content()
+            changed = get_changed_range(old_hashes, self._line_hashes)
+        else:
+            self._line_hashes[first:old_last] = [
+                hash(line) for line in self._content[first:new_last]]
+            changed = (first, old_last, new_last)
+
+        if changed is None:
+            if not self._has_valid_positions(len(self._line_hashes)):
+                return False
+        elif not Document.update_dom(
+                self, *changed, heading=heading, content=content):
+            return False
+
+        self.update_changedtick()
+        self._orig_changedtick = self._changedtick
+        return True
+
+    def _dom_updated(self, start, old_end, new_end):
+        if self._changed_range is None:
+            return
+        first, end = self._changed_range
+        if first == end:
+            self._changed_range = (start, new_end)
+            return
+        # move the recorded range along with the change and merge them
+        delta = new_end - old_end
+        if first >= old_end:
+            first += delta
+        elif first > start:
+            first = start
+        if end >= old_end:
+            end += delta
+        elif end > start:
+            end = new_end
+        self._changed_range = (min(first, start), max(end, new_end))
+
+    def pop_changed_range(self):
+        u""" Return the lines of the headings that were parsed again by
+        update_dom() since the last call. The range always covers complete
+        top level headings.
+
+        :returns:    (first line, end of the range (exclusive)) or None if
+                    the changed lines are unknown
+        """
+        res = self._changed_range
+        self._changed_range = (0, 0)
+        return res
+
+    def _line_index_key(self):
+        # vim increments b:changedtick with every change of the buffer, the
+        # number of lines is a cheap additional safeguard
+        self.update_changedtick()
+        return (self._changedtick, len(self._content))
 
     def update_changedtick(self):
         if self.bufnr == vim.current.buffer.number:
             self._changedtick = int(vim.eval(u_encode(u'b:changedtick')))
         else:
-            vim.command(u_encode(u'unlet! g:org_changedtick | let g:org_lz = &lz | let g:org_hidden = &hidden | set lz hidden'))
-            # TODO is this likely to fail? maybe some error hangling should be added
-            vim.command(u_encode(u'keepalt buffer %d | let g:org_changedtick = b:changedtick | buffer %d' % \
-                    (self.bufnr, vim.current.buffer.number)))
-            vim.command(u_encode(u'let &lz = g:org_lz | let &hidden = g:org_hidden | unlet! g:org_lz g:org_hidden | redraw'))
-            self._changedtick = int(vim.eval(u_encode(u'g:org_changedtick')))
+            self._changedtick = get_changedticks([self.bufnr])[0]
+
+    def fold_levels(self):
+        u""" Compute the fold levels of all lines of the buffer in one pass.
+        The result is cached until the buffer or the DOM changes.
+
+        :returns:    List with the fold level of every line: ">level" for
+                    heading lines, level for the other lines of a heading and
+                    -1 for the meta information
+        """
+        if not self.is_dirty and self._fold_levels is not None and \
+                self._fold_levels[0] == self._orig_changedtick:
+            return self._fold_levels[1]
+
+        levels = [-1] * len(self.meta_information)
+        for h in self.all_headings():
+            levels.append(u'>%d' % h.level)
+            levels.extend([h.level] * (len(h) - 1))
+        if not self.is_dirty:
+            self._fold_levels = (self._orig_changedtick, levels)
+        return levels
+
+    def _get_replacements(self):
+        u""" Turn all pending changes into an ordered list of contiguous
+        replacements of the vim buffer. Lines that didn't change are kept in
+        place, replacements that are close to each other are merged.
+
+        :returns:    List of (start, end, lines) tuples, the buffer lines
+                    start to end (exclusive) are replaced by lines
+        """
+        # collect the document in serialized order: ranges of the buffer that
+        # can be kept are stored as (start, end, None), everything else as
+        # (None, None, lines)
+        segments = []
+
+        def keep(start, end):
+            if start >= end:
+                return
+            if segments and segments[-1][2] is None and segments[-1][1] == start:
+                segments[-1] = (segments[-1][0], end, None)
+            else:
+                segments.append((start, end, None))
+
+        def insert(lines):
+            if lines:
+                segments.append((None, None, list(lines)))
+
+        if self.is_dirty_meta_information:
+            insert(self.meta_information)
+        elif self._orig_meta_information_len:
+            keep(0, self._orig_meta_information_len)
+
+        for h in self.all_headings():
+            if h._orig_start is None:
+                # this is a new heading
+                insert([unicode(h)] + h.body)
+                continue
+            if h.is_dirty_heading:
+                insert([unicode(h)])
+            else:
+                keep(h._orig_start, h._orig_start + 1)
+            if h.is_dirty_body:
+                insert(h.body)
+            else:
+                keep(h._orig_start + 1, h._orig_start + h._orig_len)
+
+        # everything between the kept ranges is replaced, this includes deleted
+        # headings
+        old_len = len(self._content)
+        replacements = []
+        position = 0
+        lines = []
+        for start, end, new_lines in segments:
+            if new_lines is not None:
+                lines.extend(new_lines)
+            elif start >= position:
+                if lines or start > position:
+                    replacements.append((position, start, lines))
+                position = end
+                lines = []
+            else:
+                # lines that moved towards the top can't be kept in place
+                lines.extend(self._content[start:end])
+                self._write_calls += 1
+        if lines or position < old_len:
+            replacements.append((position, old_len, lines))
+
+        # drop the lines that didn't change from the replacements. Lines are
+        # compared as (hash, line) pairs: differing hashes rule out equal
+        # lines quickly, the lines themselves are compared if the hashes
+        # match since hashes can collide
+        if self._line_hashes is not None and len(self._line_hashes) == old_len:
+            old_lines = self.lines()
+            trimmed = []
+            for start, end, lines in replacements:
+                changed = get_changed_range(
+                    list(zip(self._line_hashes[start:end],
+                             old_lines[start:end])),
+                    [(hash(l), l) for l in lines])
+                if changed:
+                    first, old_last, new_last = changed
+                    trimmed.append(
+                        (start + first, start + old_last, lines[first:new_last]))
+            replacements = trimmed
+
+        # merge replacements that are close to each other
+        groups = []
+        for r in replacements:
+            if groups and r[0] - groups[-1][-1][1] <= MAX_MERGE_GAP:
+                groups[-1].append(r)
+            else:
+                groups.append([r])
+        replacements = []
+        for group in groups:
+            if len(group) == 1:
+                replacements.append(group[0])
+                continue
+            first = group[0][0]
+            old = self._content[first:group[-1][1]]
+            self._write_calls += 1
+            lines = []
+            position = first
+            for start, end, new_lines in group:
+                lines.extend(old[position - first:start - first])
+                lines.extend(new_lines)
+                position = end
+            replacements.append((first, group[-1][1], lines))
+        return replacements
 
     def write(self):
         u""" write the changes to the vim buffer
 
+        All changes are turned into a minimal set of contiguous replacements
+        that are applied from the bottom to the top of the buffer. The number
+        of calls into the vim buffer is available as write_calls afterwards.
+
         :returns:    True if something was written, otherwise False
         """
         if not self.is_dirty:
@@ -168,46 +420,33 @@ class VimBuffer(Document):
         if not self.is_insync:
             raise BufferNotInSync(u'Buffer is not in sync with vim!')
 
-        # write meta information
-        if self.is_dirty_meta_information:
-            meta_end = 0 if self._orig_meta_information_len is None else self._orig_meta_information_len
-            self._content[:meta_end] = self.meta_information
-            self._orig_meta_information_len = len(self.meta_information)
-
-        # remove deleted headings
-        already_deleted = []
-        for h in sorted(self._deleted_headings, key=lambda x: x._orig_start, reverse=True):
-            if h._orig_start is not None and h._orig_start not in already_deleted:
-                # this is a heading that actually exists on the buffer and it
-                # needs to be removed
-                del self._content[h._orig_start:h._orig_start + h._orig_len]
-                already_deleted.append(h._orig_start)
-        del self._deleted_headings[:]
-        del already_deleted
-
-        # update changed headings and add new headings
+        self._write_calls = 0
+        replacements = self._get_replacements()
+        if replacements:
+            vim.current.buffer.append("") # workaround for neovim bug
+            for start, end, lines in reversed(replacements):
+                self._content[start:end] = lines
+                if self._line_hashes is not None:
+                    self._line_hashes[start:end] = [hash(l) for l in lines]
+            del vim.current.buffer[-1] # restore workaround for neovim bug
+            self._write_calls += len(replacements) + 2
+            self.invalidate_line_index()
+            self._changed_range = None
+
+        # for all headings the length and start offset needs to be updated
+        position = len(self.meta_information)
         for h in self.all_headings():
-            if h.is_dirty:
-                vim.current.buffer.append("") # workaround for neovim bug
-                if h._orig_start is not None:
-                    # this is a heading that existed before and was changed. It
-                    # needs to be replaced
-                    if h.is_dirty_heading:
-                        self._content[h.start:h.start + 1] = [unicode(h)]
-                    if h.is_dirty_body:
-                        self._content[h.start + 1:h.start + h._orig_len] = h.body
-                else:
-                    # this is a new heading. It needs to be inserted
-                    self._content[h.start:h.start] = [unicode(h)] + h.body
-                del vim.current.buffer[-1] # restore workaround for neovim bug
-                h._dirty_heading = False
-                h._dirty_body = False
-            # for all headings the length and start offset needs to be updated
-            h._orig_start = h.start
+            h._dirty_heading = False
+            h._dirty_body = False
+            h._orig_start = position
             h._orig_len = len(h)
+            position += h._orig_len
 
+        self._orig_meta_information_len = len(self.meta_information)
+        del self._deleted_headings[:]
         self._dirty_meta_information = False
         self._dirty_document = False
+        self.invalidate_heading_positions()
 
         self.update_changedtick()
         self._orig_changedtick = self._changedtick
@@ -255,6 +494,10 @@ class VimBuffer(Document):
                 raise ValueError('Heading must contain the attribute _orig_start! %s' % heading)
             heading._dirty_heading = False
             heading._dirty_body = False
+            # the DOM can't be updated incrementally anymore since the
+            # offsets of the other headings are not maintained
+            self._line_hashes = None
+            self.invalidate_line_index()
         # for all headings the length offset needs to be updated
         heading._orig_len = len(heading)
 
@@ -280,13 +523,80 @@ class VimBuffer(Document):
                 raise ValueError('Checkbox must contain the attribute _orig_start! %s' % checkbox)
             checkbox._dirty_checkbox = False
             checkbox._dirty_body = False
+            self._line_hashes = None
+            self.invalidate_line_index()
         # for all headings the length offset needs to be updated
         checkbox._orig_len = len(checkbox)
 
         return checkbox
 
     def write_checkboxes(self, checkboxes):
-        pass
+        u""" Write many checkboxes to the vim buffer at once. Like
+        write_checkbox() this function relies on the offsets of the
+        checkboxes (Checkbox._orig_start, Checkbox._orig_len) and does no
+        sanity checks.
+
+        Only the lines that differ from the buffer are written. Changes that
+        are close to each other are merged into one replacement, see
+        MAX_MERGE_GAP. The number of calls into the vim buffer is available
+        as write_calls afterwards.
+
+        :checkboxes:    The checkboxes to write, their children aren't
+                        included. Headings can be passed as well to write
+                        their title line, the body of a heading isn't written
+                        since it contains the checkboxes.
+
+        :returns:        True if something was written, otherwise False
+        """
+        changes = []
+        for c in checkboxes:
+            if not c.is_dirty:
+                continue
+            if c._orig_start is None:
+                raise ValueError('Checkbox must contain the attribute _orig_start! %s' % c)
+            start = c._orig_start
+            if isinstance(c, Heading):
+                if c.is_dirty_heading:
+                    changes.append((start, start + 1, [unicode(c)]))
+                c._dirty_heading = False
+                continue
+            if c.is_dirty_checkbox:
+                changes.append((start, start + 1, [unicode(c)]))
+            if c.is_dirty_body:
+                changes.append((start + 1, start + c._orig_len, list(c.body)))
+            c._dirty_checkbox = False
+            c._dirty_body = False
+            c._orig_len = len(c)
+
+        # drop the lines that didn't change
+        old = self.lines()
+        replacements = []
+        for start, end, lines in sorted(changes, key=lambda r: r[0]):
+            changed = get_changed_range(old[start:end], lines)
+            if changed:
+                first, old_last, new_last = changed
+                replacements.append(
+                    (start + first, start + old_last, lines[first:new_last]))
+
+        # merge replacements that are close to each other
+        merged = []
+        for start, end, lines in replacements:
+            if merged and start - merged[-1][1] <= MAX_MERGE_GAP:
+                previous = merged[-1]
+                previous[2].extend(old[previous[1]:start])
+                previous[2].extend(lines)
+                previous[1] = end
+            else:
+                merged.append([start, end, lines])
+
+        self._write_calls = len(merged)
+        if not merged:
+            return False
+        for start, end, lines in reversed(merged):
+            self._content[start:end] = lines
+        self._line_hashes = None
+        self.invalidate_line_index()
+        return True
 
     def previous_heading(self, position=None):
         u""" Find the next heading (search forward) and return the related object
@@ -302,50 +612,7 @@ class VimBuffer(Document):
         """
         if position is None:
             position = vim.current.window.cursor[0] - 1
-
-        if not self.headings:
-            return
-
-        def binaryFindInDocument():
-            hi = len(self.headings)
-            lo = 0
-            while lo < hi:
-                mid = (lo+hi)//2
-                h = self.headings[mid]
-                if h.end_of_last_child < position:
-                    lo = mid + 1
-                elif h.start > position:
-                    hi = mid
-                else:
-                    return binaryFindHeading(h)
-
-        def binaryFindHeading(heading):
-            if not heading.children or heading.end >= position:
-                return heading
-
-            hi = len(heading.children)
-            lo = 0
-            while lo < hi:
-                mid = (lo+hi)//2
-                h = heading.children[mid]
-                if h.end_of_last_child < position:
-                    lo = mid + 1
-                elif h.start > position:
-                    hi = mid
-                else:
-                    return binaryFindHeading(h)
-
-        # look at the cache to find the heading
-        h_tmp = self._cached_heading
-        if h_tmp is not None:
-            if h_tmp.end_of_last_child > position and \
-                    h_tmp.start < position:
-                if h_tmp.end < position:
-                    self._cached_heading = binaryFindHeading(h_tmp)
-                return self._cached_heading
-
-        self._cached_heading = binaryFindInDocument()
-        return self._cached_heading
+        return self.heading_at(position)
 
     def next_heading(self, position=None):
         u""" Find the next heading (search forward) and return the related object
@@ -398,6 +665,9 @@ class VimBufferContent(MultiPurposeList):
 
     def __getitem__(self, i):
         if isinstance(i, slice):
+            if i.step is None:
+                # vim buffers return a list of lines
+                return _decode_lines(self.data[i])
             return [u_decode(item) if type(item) is str else item \
                     for item in MultiPurposeList.__getitem__(self, i)]
         else:
@@ -406,6 +676,13 @@ class VimBufferContent(MultiPurposeList):
                 return u_decode(item)
             return item
 
+    def snapshot(self):
+        u""" Read all lines of the buffer with a single call into vim
+
+        :returns:    tuple of the decoded lines
+        """
+        return tuple(_decode_lines(self.data[:]))
+
     def __setitem__(self, i, item):
         if isinstance(i, slice):
             o = []
@@ -3,11 +3,29 @@ if !exists("g:org_indent")
   let g:org_indent = 0
 endif
 
+" Folds are computed by GetOrgFolding() ('expr') or created manually from the
+" document structure ('manual')
+if !exists("g:org_fold_method")
+  let g:org_fold_method = 'expr'
+endif
+
 setlocal foldtext=GetOrgFoldtext()
 setlocal fillchars-=fold:-
 setlocal fillchars+=fold:\ 
-setlocal foldexpr=GetOrgFolding()
-setlocal foldmethod=expr
+if g:org_fold_method ==# 'manual'
+	setlocal foldmethod=manual
+	augroup orgmode_folds
+		au! * <buffer>
+		au BufWinEnter,BufWritePost <buffer> call OrgApplyFolds(1)
+		au InsertLeave <buffer> call OrgApplyFolds(0)
+		if exists('##TextChanged')
+			au TextChanged <buffer> call OrgApplyFolds(0)
+		endif
+	augroup END
+else
+	setlocal foldexpr=GetOrgFolding()
+	setlocal foldmethod=expr
+endif
 setlocal indentexpr=GetOrgIndent()
 setlocal nolisp
 setlocal nosmartindent
@@ -39,58 +57,30 @@ EOF
 endfunction
 
 function! GetOrgFolding()
-	let l:mode = mode()
-	if l:mode == 'i'
-		" the cache size is limited to 3, because vim queries the current and
-		" both surrounding lines when the user is typing in insert mode. The
-		" cache is shared between GetOrgFolding and GetOrgFoldtext
-		if ! exists('b:org_folding_cache')
-			let b:org_folding_cache = {}
-		endif
-
-		if has_key(b:org_folding_cache, v:lnum)
-			if match(b:org_folding_cache[v:lnum], '^>') == 0 &&
-						\ match(getline(v:lnum), '^\*\+\s') != 0
-				" when the user pastes text or presses enter, it happens that
-				" the cache starts to confuse vim's folding abilities
-				" these entries can safely be removed
-				unlet b:org_folding_cache[v:lnum]
-
-				" the fold text cache is probably also damaged, delete it as
-				" well
-				unlet! b:org_foldtext_cache
-			else
-				return b:org_folding_cache[v:lnum]
-			endif
-		endif
+	" the fold levels of all lines are computed at once and cached until the
+	" buffer changes
+	if ! exists('b:orgmode_fold_levels_tick') || b:orgmode_fold_levels_tick != b:changedtick
+		" the fold text cache is probably also outdated, delete it as well
+		unlet! b:org_foldtext_cache
 
 		exe s:py_env
-from orgmode._vim import fold_orgmode
-fold_orgmode(allow_dirty=True)
+from orgmode._vim import fold_levels_orgmode
+fold_levels_orgmode()
 EOF
-	else
+	endif
+
+	return get(get(b:, 'orgmode_fold_levels', []), v:lnum - 1, -1)
+endfunction
 
+function! OrgApplyFolds(force)
+	" folds are only created again when the buffer changed, just the folds of
+	" the changed headings unless all folds are forced to be recreated
+	if a:force || get(b:, 'orgmode_folds_tick', -1) != b:changedtick
 		exe s:py_env
-from orgmode._vim import fold_orgmode
-fold_orgmode()
+from orgmode._vim import apply_folds_orgmode
+apply_folds_orgmode(incremental=not int(vim.eval('a:force')))
 EOF
 	endif
-
-	if exists('b:fold_expr')
-		let l:tmp = b:fold_expr
-		unlet b:fold_expr
-		if l:mode == 'i'
-			if ! has_key(b:org_folding_cache, v:lnum)
-				if len(b:org_folding_cache) > 3
-					let b:org_folding_cache = {}
-				endif
-				let b:org_folding_cache[v:lnum] = l:tmp
-			endif
-		endif
-		return l:tmp
-	else
-		return -1
-	endif
 endfunction
 
 function! SetOrgFoldtext(text)
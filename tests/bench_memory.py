@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+u"""
+Measure the memory that's needed to hold the DOM of a big document.
+
+The document is examples/mylife.org repeated until it has at least the
+requested number of lines. The memory is measured right after the DOM was
+built, after all headings were parsed and after all bodies were accessed.
+
+Usage: python bench_memory.py [lines]
+"""
+
+import gc
+import io
+import os
+import sys
+sys.path.append(u'../ftplugin')
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import vim
+
+from orgmode.vimbuffer import VimBuffer
+
+from orgmode.py3compat.encode_compatibility import *
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       u'..', u'examples', u'mylife.org')
+
+
+def setup_buffer(lines):
+    vim.EVALRESULTS = {
+            u_encode(u'exists("b:org_todo_keywords")'): u_encode(u'0'),
+            u_encode(u'exists("g:org_todo_keywords")'): u_encode(u'1'),
+            u_encode(u'g:org_todo_keywords'): [u_encode(u'TODO'),
+                                               u_encode(u'DONE'), u_encode(u'|')],
+            u_encode(u'exists("g:org_debug")'): u_encode(u'0'),
+            u_encode(u'b:changedtick'): u_encode(u'1'),
+            u_encode(u'&ts'): u_encode(u'8'),
+            u_encode(u'exists("g:org_tag_column")'): u_encode(u'0'),
+            u_encode(u'exists("b:org_tag_column")'): u_encode(u'0')}
+    with io.open(EXAMPLE, encoding=u'utf-8') as f:
+        example = [u_encode(l) for l in f.read().splitlines()]
+    content = []
+    while len(content) < lines:
+        content.extend(example)
+    vim.current.buffer[:] = content
+    return len(content)
+
+
+def measure(f):
+    u""" Run f and return its result and the memory it allocated """
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    result = f()
+    gc.collect()
+    return result, tracemalloc.get_traced_memory()[0] - before
+
+
+def main():
+    if tracemalloc is None:
+        sys.stderr.write(u'tracemalloc is required to measure the memory\n')
+        return 1
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    lines = setup_buffer(lines)
+
+    tracemalloc.start()
+    document, built = measure(lambda: VimBuffer().init_dom())
+    headings = list(document.all_headings())
+    _, parsed = measure(lambda: [h.title for h in headings])
+    _, bodies = measure(lambda: [h.body for h in headings])
+    tracemalloc.stop()
+
+    print(u'%d lines, %d headings' % (lines, len(headings)))
+    print(u'%-24s %10.1f KiB' % (u'DOM built', built / 1024.0))
+    print(u'%-24s %10.1f KiB' % (u'+ headings parsed', parsed / 1024.0))
+    print(u'%-24s %10.1f KiB' % (u'+ bodies accessed', bodies / 1024.0))
+    print(u'%-24s %10.1f B' % (u'per heading', (built + parsed + bodies) /
+                               float(len(headings))))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
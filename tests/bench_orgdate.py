@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+u"""
+Measure how long it takes to find the dates of all headings of a big document.
+
+The document is examples/mylife.org repeated until it has at least the
+requested number of lines. The single pass scanner of get_orgdate() is
+compared to trying the regex of every kind of date one after another, which
+is how dates were parsed before. Parsed dates are cached by their text, the
+statistics of the cache are printed at the end.
+
+Usage: python bench_orgdate.py [lines]
+"""
+
+import io
+import os
+import sys
+import timeit
+sys.path.append(u'../ftplugin')
+
+from orgmode.liborgmode import orgdate
+from orgmode.liborgmode.orgdate import get_orgdate, get_orgdates, \
+    _TIMESTAMP_KINDS
+
+from orgmode.py3compat.unicode_compatibility import *
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       u'..', u'examples', u'mylife.org')
+
+
+def cascade_text2orgdate(string):
+    u""" Find the date of string by trying one regex after another """
+    for regex, factory in _TIMESTAMP_KINDS:
+        result = regex.search(string)
+        if result:
+            try:
+                return factory(*[int(m) for m in result.groups()])
+            except BaseException:
+                return None
+
+
+def cascade_get_orgdate(data):
+    u""" Find the first date in data, the matching line is parsed twice """
+    for found in (cascade_text2orgdate(item) for item in data
+                  if cascade_text2orgdate(item)):
+        return found
+
+
+def format_uncached(orgdate):
+    u""" Format a date without its cached string representation """
+    orgdate._text = None
+    return unicode(orgdate)
+
+
+def split_headings(lines):
+    headings = []
+    for line in lines:
+        if line.startswith(u'*') or not headings:
+            headings.append([])
+        headings[-1].append(line)
+    return headings
+
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with io.open(EXAMPLE, encoding=u'utf-8') as f:
+        example = f.read().splitlines()
+    content = []
+    while len(content) < lines:
+        content.extend(example)
+    headings = split_headings(content)
+
+    cascade = [cascade_get_orgdate(h) for h in headings]
+    single = [get_orgdate(h) for h in headings]
+    assert [unicode(d) if d else None for d in cascade] == \
+        [unicode(d) if d else None for d in single]
+
+    timings = (
+        (u'regex cascade', lambda: [cascade_get_orgdate(h) for h in headings]),
+        (u'single pass', lambda: [get_orgdate(h) for h in headings]),
+        (u'all dates', lambda: [get_orgdates(h) for h in headings]),
+        (u'format dates', lambda: [unicode(d) for d in single if d]),
+        (u'format dates, uncached', lambda: [format_uncached(d)
+                                             for d in single if d]))
+    orgdate.reset_stats()
+    print(u'%d lines, %d headings' % (len(content), len(headings)))
+    for name, f in timings:
+        best = min(timeit.repeat(f, number=1, repeat=5))
+        print(u'%-24s %10.1f ms' % (name, best * 1000))
+    print(u'cache: %(hits)d hits, %(misses)d misses, %(size)d dates' %
+          orgdate.stats())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+u"""
+Measure how long it takes to start orgmode with all default plugins, once
+with every plugin loaded right away and once with the plugins loaded lazily.
+
+Every start runs in a new python process so that no module has been imported
+before. The time includes importing orgmode and registering the plugins. Like
+in vim the modules are loaded from their byte code, a first start that isn't
+measured compiles them. The plugins are just loaded lazily if the manifest
+has been generated with "make build".
+
+Usage: python bench_startup.py [runs]
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+PLUGINS = [u'ShowHide', u'|', u'Navigator', u'EditStructure', u'EditCheckbox',
+           u'|', u'Hyperlinks', u'|', u'Todo', u'TagsProperties', u'Date',
+           u'Agenda', u'Misc', u'|', u'Export']
+
+
+class EvalResults(dict):
+    u""" Answers of vim.eval, settings that aren't set don't exist """
+
+    def get(self, cmd, default=None):
+        if cmd in self:
+            return self[cmd]
+        if cmd.startswith(u'exists('):
+            return u'0'
+        if cmd.startswith(u'&'):
+            return u'0'
+        return default
+
+
+def start(lazy):
+    u""" Start orgmode and return the time it took in seconds """
+    sys.path.append(u'../ftplugin')
+    import vim
+    vim.EVALRESULTS = EvalResults({
+        u'exists("g:org_plugins")': u'1',
+        u'g:org_plugins': PLUGINS,
+        u'exists("g:org_lazy_plugins")': u'1',
+        u'g:org_lazy_plugins': u'1' if lazy else u'0',
+        u'b:changedtick': u'0'})
+
+    begin = time.time()
+    from orgmode._vim import ORGMODE
+    ORGMODE.start()
+    return time.time() - begin
+
+
+def measure(lazy, runs):
+    u""" Start orgmode in new processes and return the fastest start """
+    env = dict(os.environ)
+    env.pop(u'PYTHONDONTWRITEBYTECODE', None)
+    command = [sys.executable, __file__, u'--start',
+               u'lazy' if lazy else u'eager']
+    subprocess.check_output(command, env=env)
+    times = []
+    for _ in range(runs):
+        output = subprocess.check_output(command, env=env)
+        times.append(float(output.decode(u'utf-8').split()[-1]))
+    return min(times)
+
+
+def main():
+    if sys.argv[1:2] == [u'--start']:
+        print(u'%f' % start(sys.argv[2] == u'lazy'))
+        return 0
+
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    eager = measure(False, runs)
+    lazy = measure(True, runs)
+    print(u'%-24s %10.1f ms' % (u'eager', eager * 1000))
+    print(u'%-24s %10.1f ms' % (u'lazy', lazy * 1000))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
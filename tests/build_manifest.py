@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+u"""
+Generate ftplugin/orgmode/pluginmanifest.py, the manifest of the keybindings,
+commands and menu entries of all plugins that is used to load plugins lazily.
+It isn't part of the sources, "make build" generates it.
+
+Every plugin is imported and registered with the vim replacement of the
+tests. The default settings a plugin sets are stored in the manifest as well,
+except for defaults that depend on the environment, e.g. on $XDG_CACHE_HOME.
+The plugin sets them when it's loaded. Plugins that do more than that when
+they are registered, e.g. define autocommands or choose their keybindings
+depending on vim, are marked eager. They are always loaded right away.
+
+The manifest is the same whether it's generated with python 2 or 3. It
+records the hash of every plugin's source file, plugins that changed since
+the manifest was generated are loaded right away.
+
+Usage: python build_manifest.py
+"""
+
+import imp
+import io
+import json
+import os
+import sys
+sys.path.append(u'../ftplugin')
+
+import vim
+
+import orgmode.plugins
+import orgmode.settings
+from orgmode.pluginloader import describe_plugin, hash_plugin
+
+from orgmode.py3compat.encode_compatibility import *
+from orgmode.py3compat.unicode_compatibility import *
+
+MANIFEST = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        u'..', u'ftplugin', u'orgmode', u'pluginmanifest.py')
+
+HEADER = u'''# -*- coding: utf-8 -*-
+
+u"""
+    Plugin manifest
+    ~~~~~~~~~~~~~~~~
+
+    Keybindings, commands and menu entries of all plugins, see
+    orgmode.pluginloader. Don't edit this file, it's generated by
+    tests/build_manifest.py.
+"""
+
+from __future__ import unicode_literals
+
+'''
+
+# environment variables the default settings of plugins are derived from.
+# Settings whose default changes with them are left out of the manifest.
+ENVIRONMENT = (u'HOME', u'XDG_CACHE_HOME', u'XDG_CONFIG_HOME',
+               u'XDG_DATA_HOME')
+
+
+def setup_vim():
+    vim.EVALRESULTS = {
+            u_encode(u'exists("g:org_debug")'): 0,
+            u_encode(u'exists("b:org_debug")'): 0,
+            u_encode(u'exists("*repeat#set()")'): 0,
+            u_encode(u'b:changedtick'): 0,
+            u_encode(u'&textwidth'): u_encode(u'77'),
+            u_encode(u'&ignorecase'): u_encode(u'0')}
+
+
+def find_plugins():
+    u""" Return the names of all plugins in alphabetical order """
+    directory = orgmode.plugins.__path__[0]
+    return sorted(f[:-3] for f in os.listdir(directory)
+                  if f.endswith(u'.py') and not f.startswith(u'_'))
+
+
+def register(plugin_class):
+    u""" Register a new instance of a plugin and record the default settings
+    it sets
+
+    :returns:   (plugin, settings), settings contains None for every setting
+                that isn't set as a plain default
+    """
+    settings = []
+
+    def set_setting(setting, value, *args, **kwargs):
+        if args or kwargs:
+            # not a plain default setting
+            settings.append(None)
+        settings.append([setting, value])
+        return value
+
+    original_set = orgmode.settings.set
+    orgmode.settings.set = set_setting
+    try:
+        plugin = plugin_class()
+        plugin.register()
+    finally:
+        orgmode.settings.set = original_set
+    return plugin, settings
+
+
+def register_in_other_environment(plugin_class):
+    u""" Like register() but with different values of the variables in
+    ENVIRONMENT
+
+    :returns:   the settings the plugin sets
+    """
+    saved = dict((name, os.environ.get(name)) for name in ENVIRONMENT)
+    try:
+        for name in ENVIRONMENT:
+            os.environ[name] = u'/build_manifest/%s' % name.lower()
+        return register(plugin_class)[1]
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                del os.environ[name]
+            else:
+                os.environ[name] = value
+
+
+def describe(name):
+    u""" Register a plugin and describe it
+
+    :returns:   the description or None if the plugin can't be registered
+    """
+    module = imp.load_module(name, *imp.find_module(
+        name, orgmode.plugins.__path__))
+    if not hasattr(module, name):
+        return
+
+    commands = len(vim.CMDHISTORY)
+    evals = len(vim.EVALHISTORY)
+    plugin, settings = register(getattr(module, name))
+    eager = None in settings or len(vim.CMDHISTORY) != commands or \
+        len(vim.EVALHISTORY) != evals
+    if eager:
+        settings = []
+    elif settings:
+        # the plugin sets defaults that depend on the environment when it's
+        # loaded
+        other = register_in_other_environment(getattr(module, name))
+        settings = [s for s in settings if s in other]
+    return describe_plugin(plugin, eager=eager, settings=settings,
+                           source=hash_plugin(name))
+
+
+def build_manifest():
+    u""" Describe all plugins
+
+    :returns:   the manifest, a dict of plugin name and description
+    """
+    setup_vim()
+    manifest = {}
+    for name in find_plugins():
+        description = describe(name)
+        if description is not None:
+            manifest[name] = description
+    return manifest
+
+
+def format_value(value, indent=0):
+    u""" Format a value of the manifest as python source. Unlike pprint the
+    result is the same for python 2 and 3.
+
+    :value:     dict, list, string, number, bool or None
+    :indent:    indentation of the line the value starts in
+    :returns:   the source code
+    """
+    if isinstance(value, dict):
+        items = [u'%s: %s' % (format_value(k), format_value(value[k], indent + 4))
+                 for k in sorted(value)]
+        brackets = u'{}'
+    elif isinstance(value, (list, tuple)):
+        items = [format_value(v, indent + 4) for v in value]
+        brackets = u'[]'
+    elif isinstance(value, (str, unicode)):
+        # the escapes of JSON are valid in python string literals as well
+        return u_decode(json.dumps(u_decode(value)))
+    else:
+        return u_decode(repr(value))
+
+    if not items:
+        return brackets
+    prefix = u' ' * (indent + 4)
+    return u'%s\n%s%s%s' % (
+        brackets[0], u''.join(u'%s%s,\n' % (prefix, i) for i in items),
+        u' ' * indent, brackets[1])
+
+
+def format_manifest(manifest):
+    return HEADER + u'PLUGINS = %s\n' % format_value(manifest)
+
+
+def main():
+    content = format_manifest(build_manifest())
+    with io.open(MANIFEST, u'w', encoding=u'utf-8') as f:
+        f.write(content)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,17 +4,24 @@
 import unittest
 
 import test_vimbuffer
+import test_settings
 
 import test_libagendafilter
+import test_libagendacache
+import test_libagendaindex
+import test_libagendaloader
 import test_libcheckbox
 import test_libbase
+import test_libfiledocument
 import test_libheading
 import test_liborgdate
 import test_liborgdate_utf8
 import test_liborgdate_parsing
 import test_liborgdatetime
 import test_liborgtimerange
+import test_libtodokeywords
 
+import test_plugin_agenda
 import test_plugin_date
 import test_plugin_edit_structure
 import test_plugin_edit_checkbox
@@ -24,24 +31,32 @@ import test_plugin_show_hide
 import test_plugin_tags_properties
 import test_plugin_todo
 import test_plugin_mappings
+import test_plugin_manifest
 
 if __name__ == '__main__':
     tests = unittest.TestSuite()
 
     tests.addTests(test_vimbuffer.suite())
+    tests.addTests(test_settings.suite())
 
     # lib
     tests.addTests(test_libbase.suite())
+    tests.addTests(test_libfiledocument.suite())
     tests.addTests(test_libcheckbox.suite())
     tests.addTests(test_libagendafilter.suite())
+    tests.addTests(test_libagendacache.suite())
+    tests.addTests(test_libagendaindex.suite())
+    tests.addTests(test_libagendaloader.suite())
     tests.addTests(test_libheading.suite())
     tests.addTests(test_liborgdate.suite())
     tests.addTests(test_liborgdate_utf8.suite())
     tests.addTests(test_liborgdate_parsing.suite())
     tests.addTests(test_liborgdatetime.suite())
     tests.addTests(test_liborgtimerange.suite())
+    tests.addTests(test_libtodokeywords.suite())
 
     # plugins
+    tests.addTests(test_plugin_agenda.suite())
     tests.addTests(test_plugin_date.suite())
     tests.addTests(test_plugin_edit_structure.suite())
     tests.addTests(test_plugin_edit_checkbox.suite())
@@ -51,6 +66,7 @@ if __name__ == '__main__':
     tests.addTests(test_plugin_tags_properties.suite())
     tests.addTests(test_plugin_todo.suite())
     tests.addTests(test_plugin_mappings.suite())
+    tests.addTests(test_plugin_manifest.suite())
 
     runner = unittest.TextTestRunner()
     runner.run(tests)
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+sys.path.append(u'../ftplugin')
+
+from orgmode.liborgmode import agendacache
+from orgmode.liborgmode.agendacache import AgendaCache, AgendaFile
+from orgmode.liborgmode.agendacache import parallel_map, scan_file
+from orgmode.liborgmode.agendaloader import AgendaLoader
+from orgmode.liborgmode.agendafilter import contains_active_date
+from orgmode.liborgmode.agendafilter import filter_items
+
+from orgmode.py3compat.unicode_compatibility import *
+
+
+def getpid(item):
+    return os.getpid()
+
+
+class AgendaCacheTestCase(unittest.TestCase):
+    u"""Tests the persistent cache of agenda files."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = AgendaCache(os.path.join(self.directory, u'cache'))
+        self.todo_states = [([u'TODO'], [u'DONE'])]
+        self.path = os.path.join(self.directory, u'agenda.org')
+        self.write(u"""#+TITLE: agenda
+* TODO Überschrift 1 :tag:
+  <2011-08-24 Wed>
+* Plain heading
+** DONE Done heading
+** Meeting <2011-08-25 Thu 10:20>
+""")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, content):
+        with io.open(self.path, u'w', encoding=u'utf-8') as f:
+            f.write(content)
+
+    def test_load(self):
+        d = self.cache.load(self.path, self.todo_states, bufnr=3)
+        self.assertTrue(isinstance(d, AgendaFile))
+        self.assertEqual(d.bufnr, 3)
+        self.assertEqual(d.is_dirty, False)
+        headings = list(d.all_headings())
+        self.assertEqual([h.start for h in headings], [1, 4, 5])
+        self.assertEqual([h.todo for h in headings], [u'TODO', u'DONE', None])
+        self.assertEqual(headings[0].title, u'Überschrift 1')
+        self.assertEqual(list(headings[0].tags), [u'tag'])
+        self.assertEqual(headings[1].level, 2)
+        self.assertEqual(headings[0].document, d)
+        self.assertEqual(
+            [unicode(h.active_date) for h in
+             filter_items(headings, [contains_active_date])],
+            [u'<2011-08-24 Wed>', u'<2011-08-25 Thu 10:20>'])
+        self.assertEqual(sorted(headings)[0], headings[0])
+
+    def test_unchanged_file_is_not_read(self):
+        first = self.cache.load(self.path, self.todo_states)
+        # the file isn't parsed again as long as mtime and size match
+        extract_headings = agendacache.extract_headings
+        agendacache.extract_headings = None
+        try:
+            second = self.cache.load(self.path, self.todo_states)
+            # unchanged documents are reused with their agenda index
+            self.assertTrue(second is first)
+            self.assertEqual(
+                [(h.start, h.title) for h in first.all_headings()],
+                [(h.start, h.title) for h in second.all_headings()])
+
+            # a touched file is identified by its hash
+            stat = os.stat(self.path)
+            os.utime(self.path, (stat.st_atime, stat.st_mtime + 10))
+            self.cache.load(self.path, self.todo_states)
+        finally:
+            agendacache.extract_headings = extract_headings
+
+    def test_changed_file(self):
+        self.cache.load(self.path, self.todo_states)
+        self.write(u'* TODO New heading\n')
+        stat = os.stat(self.path)
+        os.utime(self.path, (stat.st_atime, stat.st_mtime + 10))
+        d = self.cache.load(self.path, self.todo_states)
+        self.assertEqual([h.title for h in d.all_headings()], [u'New heading'])
+
+        # changed todo states invalidate the entry
+        d = self.cache.load(self.path, [([u'NEXT'], [u'DONE'])])
+        self.assertEqual([h.todo for h in d.all_headings()], [])
+
+    def test_broken_entry(self):
+        self.cache.load(self.path, self.todo_states)
+        with io.open(self.cache._entry_path(self.path), u'w') as f:
+            f.write(u'{broken')
+        d = self.cache.load(self.path, self.todo_states)
+        self.assertEqual(len(list(d.all_headings())), 3)
+
+    def test_load_all(self):
+        paths = [self.path, os.path.join(self.directory, u'missing.org')]
+        for i in range(3):
+            path = os.path.join(self.directory, u'%d.org' % i)
+            with io.open(path, u'w', encoding=u'utf-8') as f:
+                f.write(u'* TODO Heading %d\n* DONE Done %d\n' % (i, i))
+            paths.append(path)
+
+        for cache in (self.cache, AgendaCache(None)):
+            for processes in (0, 2):
+                documents = cache.load_all(paths, self.todo_states,
+                                           processes=processes)
+                self.assertEqual(len(documents), 5)
+                self.assertEqual(documents[1], None)
+                self.assertEqual(
+                    [h.title for h in documents[0].all_headings()],
+                    [u'Überschrift 1', u'Done heading',
+                     u'Meeting <2011-08-25 Thu 10:20>'])
+                for i, d in enumerate(documents[2:]):
+                    self.assertEqual(d.path, paths[i + 2])
+                    self.assertEqual(
+                        [(h.start, h.todo, h.title) for h in d.all_headings()],
+                        [(0, u'TODO', u'Heading %d' % i),
+                         (1, u'DONE', u'Done %d' % i)])
+        # without a directory nothing is stored
+        self.assertEqual(AgendaCache(None)._read_entry(self.path), None)
+
+    def test_scan_file(self):
+        digest, headings = scan_file((self.path, self.todo_states, None))
+        self.assertEqual([h[0] for h in headings], [1, 4, 5])
+        self.assertEqual(headings[0][3:], [u'Überschrift 1', [u'tag'],
+                                           u'<2011-08-24 Wed>'])
+        # known hashes aren't parsed again
+        self.assertEqual(scan_file((self.path, self.todo_states, digest)),
+                         (digest, None))
+        self.assertEqual(scan_file((os.path.join(self.directory, u'missing'),
+                                    self.todo_states, None)), (None, None))
+
+    def test_parallel_map(self):
+        items = list(range(20))
+        self.assertEqual(parallel_map(abs, [-i for i in items], 0), items)
+        self.assertEqual(parallel_map(abs, [-i for i in items], 3), items)
+        self.assertEqual(parallel_map(abs, [], 3), [])
+
+    def test_parallel_map_in_thread(self):
+        # vim isn't forked from threads other than the main thread
+        res = []
+        thread = threading.Thread(
+            target=lambda: res.extend(parallel_map(getpid, range(4), 3)))
+        thread.start()
+        thread.join(10)
+        self.assertEqual(res, [os.getpid()] * 4)
+
+    def test_parallel_map_with_loader(self):
+        # vim isn't forked while an agenda loader thread is running
+        started = threading.Event()
+        release = threading.Event()
+
+        def load(paths):
+            started.set()
+            release.wait(10)
+            return [None] * len(paths)
+
+        loader = AgendaLoader(load, [u'a.org']).start()
+        try:
+            started.wait(10)
+            self.assertEqual(parallel_map(getpid, range(4), 3),
+                             [os.getpid()] * 4)
+        finally:
+            release.set()
+        self.assertEqual(loader.fetch(10), [(u'a.org', None)])
+        loader.join(10)
+        self.assertEqual(parallel_map(abs, [-1, -2, -3], 3), [1, 2, 3])
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(AgendaCacheTestCase)
@@ -6,6 +6,7 @@ sys.path.append(u'../ftplugin')
 
 import unittest
 from datetime import date
+from datetime import datetime
 from datetime import timedelta
 
 from orgmode.liborgmode.headings import Heading
@@ -16,6 +17,9 @@ from orgmode.liborgmode.orgdate import OrgDateTime
 from orgmode.liborgmode.agendafilter import is_within_week
 from orgmode.liborgmode.agendafilter import is_within_week_and_active_todo
 from orgmode.liborgmode.agendafilter import filter_items
+from orgmode.liborgmode.agendafilter import active_todo
+from orgmode.liborgmode.agendafilter import within_week
+from orgmode.liborgmode.documents import Document
 
 import vim
 
@@ -163,6 +167,33 @@ class AgendaFilterTestCase(unittest.TestCase):
         self.assertEqual(len(filtered), 3)
         self.assertEqual(filtered, [headings[0], headings[2], headings[4]])
 
+    def test_compiled_filters(self):
+        document = Document()
+        document.todo_states = [([u'NEXT'], [u'DONE'])]
+        headings = [Heading(title=u'Next', todo=u'NEXT'),
+                    Heading(title=u'Todo', todo=u'TODO',
+                            active_date=OrgDate(True, 2011, 8, 29)),
+                    Heading(title=u'Done', todo=u'DONE',
+                            active_date=OrgDate(True, 2011, 8, 30))]
+        document.headings.extend(headings)
+
+        # the todo states of the heading's document are used
+        self.assertTrue(contains_active_todo(headings[0]))
+        self.assertFalse(contains_active_todo(headings[1]))
+
+        # compiled filters don't call vim for every heading
+        is_active = active_todo(document)
+        is_due = within_week(datetime(2011, 8, 23, 12, 0))
+        vim.EVALHISTORY = []
+        self.assertEqual(list(filter_items(headings, [is_active])),
+                         headings[:1])
+        self.assertEqual(list(filter_items(headings, [is_due])),
+                         headings[1:2])
+        self.assertEqual(vim.EVALHISTORY, [])
+
+        # without a document the todo states of the current buffer are used
+        self.assertTrue(active_todo()(Heading(todo=u'TODO')))
+
 
 def suite():
     return unittest.TestLoader().loadTestsFromTestCase(AgendaFilterTestCase)
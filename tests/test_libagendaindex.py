@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+import sys
+sys.path.append(u'../ftplugin')
+
+import unittest
+from datetime import datetime
+
+import vim
+
+from orgmode.liborgmode.agenda import AgendaManager
+from orgmode.liborgmode.agendafilter import contains_active_date
+from orgmode.liborgmode.agendafilter import contains_active_todo
+from orgmode.liborgmode.agendafilter import filter_items
+from orgmode.liborgmode.agendafilter import is_within_week_and_active_todo
+from orgmode.liborgmode.headings import Heading
+from orgmode.liborgmode.orgdate import OrgDate
+from orgmode.vimbuffer import VimBuffer
+
+from orgmode.py3compat.encode_compatibility import *
+
+counter = 0
+
+
+class AgendaIndexTestCase(unittest.TestCase):
+    u"""Tests the agenda index of documents."""
+
+    def setUp(self):
+        global counter
+        counter += 1
+
+        vim.EVALHISTORY = []
+        vim.EVALRESULTS = {
+                u_encode(u'exists("b:org_todo_keywords")'): u_encode('0'),
+                u_encode(u'exists("g:org_todo_keywords")'): u_encode('1'),
+                u_encode(u'g:org_todo_keywords'): [u_encode(u'TODO'), u_encode(u'NEXT'), u_encode(u'|'), u_encode(u'DONE')],
+                u_encode(u'exists("g:org_debug")'): u_encode(u'0'),
+                u_encode(u'exists("b:org_debug")'): u_encode(u'0'),
+                u_encode(u'exists("*repeat#set()")'): u_encode(u'0'),
+                u_encode(u'b:changedtick'): u_encode(u'%d' % counter),
+                u_encode(u'&ts'): u_encode(u'8'),
+                u_encode(u'exists("g:org_tag_column")'): u_encode(u'0'),
+                u_encode(u'exists("b:org_tag_column")'): u_encode(u'0'),
+                u_encode(u"v:count"): u_encode(u'0')
+                }
+        vim.current.buffer[:] = [u_encode(i) for i in u"""
+* TODO Heading 1 :work:
+  <2011-08-25 Thu 10:20>
+* Heading 2 :home:work:
+** NEXT Heading 2.1
+   <2011-08-24 Wed>
+** DONE Heading 2.2
+   <2011-08-25 Thu>
+* TODO Heading 3
+  <2011-08-25 Thu 10:20>
+* NEXT Heading 4
+""".split(u'\n')]
+        self.document = VimBuffer().init_dom()
+        self.headings = list(self.document.all_headings())
+
+    def titles(self, headings):
+        return [h.title for h in headings]
+
+    def test_lookup(self):
+        index = self.document.agenda_index()
+        self.assertEqual(len(index), 6)
+        self.assertEqual(self.titles(index.todos([u'TODO', u'NEXT'])),
+                         [u'Heading 1', u'Heading 2.1', u'Heading 3',
+                          u'Heading 4'])
+        self.assertEqual(self.titles(index.todos([u'DONE'])),
+                         [u'Heading 2.2'])
+        self.assertEqual(self.titles(index.tagged(u'work')),
+                         [u'Heading 1', u'Heading 2'])
+        self.assertEqual(self.titles(index.dated()),
+                         [u'Heading 1', u'Heading 2.1', u'Heading 2.2',
+                          u'Heading 3'])
+
+        # dates are compared by the day, datetimes by the minute
+        self.assertEqual(
+            self.titles(index.dated_before(datetime(2011, 8, 25, 10, 20))),
+            [u'Heading 2.1'])
+        self.assertEqual(
+            self.titles(index.dated_before(datetime(2011, 8, 25, 10, 20, 1))),
+            [u'Heading 1', u'Heading 2.1', u'Heading 3'])
+        self.assertEqual(
+            self.titles(index.dated_before(datetime(2011, 8, 26))),
+            [u'Heading 1', u'Heading 2.1', u'Heading 2.2', u'Heading 3'])
+        # the same headings are found by comparing all dates
+        for moment in (datetime(2011, 8, 25), datetime(2011, 8, 25, 10, 20),
+                       datetime(2011, 8, 25, 10, 20, 1)):
+            self.assertEqual(
+                index.dated_before(moment),
+                [h for h in self.headings if h.active_date is not None and
+                 h.active_date < moment])
+
+        # the index is kept until the document changes
+        self.assertTrue(self.document.agenda_index() is index)
+
+    def test_changed_headings(self):
+        index = self.document.agenda_index()
+        self.headings[0].todo = u'DONE'
+        self.headings[1].tags.append(u'new')
+        self.headings[2].active_date = OrgDate(True, 2011, 8, 1)
+        self.headings[3].title = u'Changed'
+
+        self.assertTrue(self.document.agenda_index() is index)
+        self.assertEqual(self.titles(index.todos([u'DONE'])),
+                         [u'Heading 1', u'Changed'])
+        self.assertEqual(self.titles(index.tagged(u'new')), [u'Heading 2'])
+        self.assertEqual(self.titles(index.dated()),
+                         [u'Heading 1', u'Heading 2.1', u'Changed',
+                          u'Heading 3'])
+        self.assertEqual(
+            self.titles(index.dated_before(datetime(2011, 8, 20))),
+            [u'Heading 2.1'])
+
+        # structural changes drop the index
+        self.document.headings.append(Heading(title=u'New', todo=u'TODO'))
+        index = self.document.agenda_index()
+        self.assertEqual(self.titles(index.todos([u'TODO'])),
+                         [u'Heading 3', u'New'])
+        del self.document.headings[0]
+        self.assertEqual(
+            self.titles(self.document.agenda_index().todos([u'DONE'])),
+            [u'Changed'])
+
+    def test_agenda_manager(self):
+        manager = AgendaManager()
+        self.assertEqual(
+            manager.get_todo([self.document]),
+            sorted(filter_items(self.headings, [contains_active_todo])))
+        self.assertEqual(
+            manager.get_timestamped_items([self.document]),
+            sorted(filter_items(self.headings, [contains_active_date])))
+        self.assertEqual(
+            manager.get_next_week_and_active_todo([self.document]),
+            sorted(filter_items(self.headings,
+                                [is_within_week_and_active_todo])))
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(AgendaIndexTestCase)
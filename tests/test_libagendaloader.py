@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+sys.path.append(u'../ftplugin')
+
+from orgmode.liborgmode.agendacache import AgendaCache
+from orgmode.liborgmode.agendaloader import AgendaLoader
+from orgmode.liborgmode.orgdate import get_orgdate
+
+
+class AgendaLoaderTestCase(unittest.TestCase):
+    u"""Tests loading agenda files in a background thread."""
+
+    def fetch_all(self, loader):
+        res = []
+        while not loader.finished:
+            res.extend(loader.fetch(timeout=5))
+        return res
+
+    def test_load(self):
+        calls = []
+
+        def load(paths):
+            calls.append(paths)
+            return [p.upper() if p != u'missing' else None for p in paths]
+
+        loader = AgendaLoader(load, [u'a', u'missing', u'b'], batch_size=2)
+        self.assertEqual(loader.finished, False)
+        loader.start()
+        self.assertEqual(self.fetch_all(loader),
+                         [(u'a', u'A'), (u'missing', None), (u'b', u'B')])
+        self.assertEqual(calls, [[u'a', u'missing'], [u'b']])
+        self.assertEqual(loader.finished, True)
+        self.assertEqual(loader.fetch(), [])
+        self.assertEqual(loader.cancelled, False)
+
+        # fetching doesn't block without a timeout
+        loader = AgendaLoader(load, [])
+        self.assertEqual(loader.fetch(), [])
+        loader.start()
+        self.assertEqual(self.fetch_all(loader), [])
+
+    def test_cancel(self):
+        started = threading.Event()
+        proceed = threading.Event()
+
+        def load(paths):
+            started.set()
+            proceed.wait(5)
+            return paths
+
+        loader = AgendaLoader(load, [u'a', u'b', u'c']).start()
+        started.wait(5)
+        loader.cancel()
+        proceed.set()
+        loader.join(5)
+        # the batch that was loaded while cancelling is dropped
+        self.assertEqual(self.fetch_all(loader), [])
+        self.assertEqual(loader.cancelled, True)
+
+    def test_error(self):
+        def load(paths):
+            raise ValueError(u'broken')
+
+        loader = AgendaLoader(load, [u'a']).start()
+        loader.join(5)
+        self.assertRaises(ValueError, loader.fetch)
+        self.assertEqual(loader.finished, True)
+
+    def test_parse_concurrently(self):
+        # the background thread and the main thread share the caches of
+        # parsed dates and todo keywords
+        directory = tempfile.mkdtemp()
+        try:
+            paths = []
+            for year in range(1950, 1960):
+                paths.append(os.path.join(directory, u'%d.org' % year))
+                with io.open(paths[-1], u'w', encoding=u'utf-8') as f:
+                    for month in range(1, 13):
+                        for day in range(1, 29):
+                            f.write(u'* TODO task <%d-%02d-%02d Mon>\n' % (
+                                year, month, day))
+            cache = AgendaCache(None)
+
+            def load(paths):
+                return cache.load_all(paths, [([u'TODO'], [u'DONE'])])
+
+            loader = AgendaLoader(load, paths).start()
+            # more dates than the cache holds
+            for year in range(2000, 2030):
+                for month in range(1, 13):
+                    for day in range(1, 29):
+                        d = get_orgdate(u'<%d-%02d-%02d Mon>' % (
+                            year, month, day))
+                        self.assertEqual((d.year, d.month, d.day),
+                                         (year, month, day))
+            results = self.fetch_all(loader)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual([path for path, _ in results], paths)
+        for year, (_, document) in zip(range(1950, 1960), results):
+            self.assertEqual(
+                [(h.todo, h.active_date.year, h.active_date.month,
+                  h.active_date.day) for h in document.all_headings()],
+                [(u'TODO', year, month, day) for month in range(1, 13)
+                 for day in range(1, 29)])
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(AgendaLoaderTestCase)
@@ -4,8 +4,11 @@ import unittest
 import sys
 sys.path.append(u'../ftplugin')
 
-from orgmode.liborgmode.base import Direction, get_domobj_range
+from orgmode.liborgmode.base import Direction, get_domobj_range, \
+        get_changed_range, FenwickTree, LRUCache
 from orgmode.liborgmode.headings import Heading
+from orgmode.liborgmode.checkboxes import Checkbox
+from orgmode.liborgmode.dom_obj import LineIndex
 
 
 class LibBaseTestCase(unittest.TestCase):
@@ -27,6 +30,102 @@ class LibBaseTestCase(unittest.TestCase):
                                         identify_fun=Heading.identify_heading)
         self.assertEqual((start, end), (1, 3))
 
+    def test_get_changed_range(self):
+        self.assertEqual(get_changed_range([1, 2, 3], [1, 2, 3]), None)
+        self.assertEqual(get_changed_range([1, 2, 3], [1, 4, 3]), (1, 2, 2))
+        self.assertEqual(get_changed_range([1, 2, 3], [1, 2, 4, 3]), (2, 2, 3))
+        self.assertEqual(get_changed_range([1, 1, 1], [1, 1]), (2, 3, 2))
+        self.assertEqual(get_changed_range([], [1]), (0, 0, 1))
+
+    def test_fenwick_tree(self):
+        values = [3, 1, 4, 1, 5, 9, 2, 6]
+        tree = FenwickTree(values)
+        self.assertEqual(len(tree), len(values))
+        for i in range(len(values) + 1):
+            self.assertEqual(tree.prefix_sum(i), sum(values[:i]))
+
+        tree.add(2, -3)
+        values[2] -= 3
+        tree.add(7, 10)
+        values[7] += 10
+        for i in range(len(values) + 1):
+            self.assertEqual(tree.prefix_sum(i), sum(values[:i]))
+
+        self.assertEqual(FenwickTree().prefix_sum(0), 0)
+
+    def test_fenwick_tree_search(self):
+        values = [3, 1, 4, 1, 5, 9, 2, 6]
+        tree = FenwickTree(values)
+        for value in range(sum(values) + 2):
+            expected = 0
+            while expected < len(values) and \
+                    sum(values[:expected + 1]) <= value:
+                expected += 1
+            self.assertEqual(tree.search(value), expected)
+
+        tree.add(5, -8)
+        self.assertEqual(tree.search(14), 5)
+        self.assertEqual(tree.search(15), 6)
+        self.assertEqual(FenwickTree().search(3), 0)
+
+    def test_lru_cache(self):
+        cache = LRUCache(2)
+        self.assertEqual(cache.get(u'a'), None)
+        cache.put(u'a', 1)
+        cache.put(u'b', 2)
+        self.assertEqual(cache.get(u'a'), 1)
+        # b is the least recently used item
+        cache.put(u'c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertFalse(u'b' in cache)
+        self.assertEqual(cache.get(u'b', 0), 0)
+        self.assertEqual(cache.get(u'c'), 3)
+        self.assertEqual(cache.stats(), dict(hits=2, misses=2, size=2))
+
+        cache.reset_stats()
+        cache.clear()
+        self.assertEqual(cache.stats(), dict(hits=0, misses=0, size=0))
+
+    def test_line_index(self):
+        lines = [u'', u'*', u'**', u'* ', u'*\t', u'*foo', u'*** abc',
+                 u'  - [ ] x', u'a) b', u'1. c', u'+ d', u' * e', u'text',
+                 u'** :tag:', u'\t- f', u'10) g', u'aa) h']
+        index = LineIndex(lines)
+        self.assertEqual(index.line_count, len(lines))
+        self.assertEqual(
+            list(zip(index.heading_lines, index.heading_levels)),
+            [(i, Heading.identify_heading(l)) for i, l in enumerate(lines)
+             if Heading.identify_heading(l) is not None])
+        self.assertEqual(
+            list(zip(index.checkbox_lines, index.checkbox_levels)),
+            [(i, Checkbox.identify_checkbox(l)) for i, l in enumerate(lines)
+             if Checkbox.identify_checkbox(l) is not None])
+
+        # the ranges are the same as the ones of get_domobj_range
+        for direction in (Direction.FORWARD, Direction.BACKWARD):
+            for position in range(-1, len(self.case1) + 2):
+                self.assertEqual(
+                    LineIndex(self.case1).heading_range(position, direction),
+                    get_domobj_range(content=self.case1, position=position,
+                                     direction=direction,
+                                     identify_fun=Heading.identify_heading))
+                self.assertEqual(
+                    LineIndex(lines).checkbox_range(position, direction),
+                    get_domobj_range(content=lines, position=position,
+                                     direction=direction,
+                                     identify_fun=Checkbox.identify_checkbox))
+
+        # lines containing newlines are classified one by one
+        index = LineIndex([u'* a\n* b', u'- c'])
+        self.assertEqual(index.heading_lines, [0])
+        self.assertEqual(index.checkbox_lines, [1])
+
+        index = LineIndex(self.case1).slice(2, 6)
+        self.assertEqual(index.line_count, 4)
+        self.assertEqual(index.heading_lines, [2, 3])
+        self.assertEqual(index.heading_levels, [1, 2])
+
+
 def suite():
     return unittest.TestLoader() \
                    .loadTestsFromTestCase(
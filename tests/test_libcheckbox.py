@@ -5,7 +5,7 @@ import sys
 sys.path.append(u'../ftplugin')
 
 import vim
-from orgmode.liborgmode.checkboxes import Checkbox
+from orgmode.liborgmode.checkboxes import Checkbox, propagate_status
 from orgmode._vim import ORGMODE
 
 from orgmode.py3compat.encode_compatibility import *
@@ -125,6 +125,55 @@ class CheckboxTestCase(unittest.TestCase):
         c.update_subtasks(total=total, on=on)
         self.assertEqual(str(c), "  - [-] checkbox1 [50%]")
 
+    def test_init_checkboxes_cached(self):
+        bufnr = 4
+        set_vim_buffer(buf=self.c2, bufnr=bufnr)
+        h = ORGMODE.get_document(bufnr=bufnr).current_heading()
+        h.init_checkboxes()
+        checkboxes = list(h.all_checkboxes())
+        self.assertEqual(len(checkboxes), 6)
+
+        # the checkboxes are built just once and not added again
+        h.init_checkboxes()
+        self.assertEqual(len(h.checkboxes), 2)
+        self.assertEqual(list(h.all_checkboxes()), checkboxes)
+
+        # changing the body builds them afresh
+        h.body.append(u'  - [ ] checkbox7')
+        h.init_checkboxes()
+        self.assertNotEqual(h.checkboxes[0], checkboxes[0])
+        self.assertEqual(len(h.checkboxes), 2)
+
+    def test_current_checkbox(self):
+        bufnr = 5
+        set_vim_buffer(buf=self.c2, bufnr=bufnr)
+        h = ORGMODE.get_document(bufnr=bufnr).current_heading()
+        h.init_checkboxes()
+        self.assertEqual(h.current_checkbox(position=1), None)
+        for position in range(2, 8):
+            self.assertEqual(str(h.current_checkbox(position=position)),
+                             self.c2[position])
+        # the empty last line belongs to the last checkbox
+        self.assertEqual(str(h.current_checkbox(position=8)), self.c2[7])
+        self.assertEqual(h.current_checkbox(position=9), None)
+
+
+    def test_propagate_status(self):
+        bufnr = 6
+        set_vim_buffer(buf=self.c1, bufnr=bufnr)
+        h = ORGMODE.get_document(bufnr=bufnr).current_heading()
+        h.init_checkboxes()
+        c = h.current_checkbox(position=4)
+        c.toggle()
+
+        dirty = propagate_status(h)
+        self.assertEqual([str(d) for d in dirty], [
+            "        - [X] checkbox3",
+            "  - [X] checkbox1 [100%]",
+            "* heading1 [2/2]"])
+        # nothing was written to the buffer
+        self.assertEqual(vim.current.buffer[2], "  - [-] checkbox1 [%]")
+
 
 def suite():
     return unittest.TestLoader().loadTestsFromTestCase(CheckboxTestCase)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+sys.path.append(u'../ftplugin')
+
+from orgmode.liborgmode.filedocument import FileDocument, read_lines
+
+from orgmode.py3compat.unicode_compatibility import *
+
+
+class FileDocumentTestCase(unittest.TestCase):
+    u"""Tests documents that are read straight from files."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, u'file.org')
+        with io.open(self.path, u'wb') as f:
+            f.write(u"""#+TITLE: file
+* TODO Überschrift 1\r
+  <2011-08-24 Wed>
+** Überschrift 1.1
+\x0c and \x1c are no line breaks
+* DONE Überschrift 2""".encode(u'utf-8') + b'\n* Invalid \xff\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_read_lines(self):
+        lines = list(read_lines(self.path))
+        self.assertEqual(len(lines), 7)
+        self.assertEqual(lines[1], u'* TODO Überschrift 1')
+        self.assertEqual(lines[4], u'\x0c and \x1c are no line breaks')
+        self.assertEqual(lines[6], u'* Invalid �')
+
+    def test_init_dom(self):
+        d = FileDocument(self.path, [([u'TODO'], [u'DONE'])]).init_dom()
+        self.assertEqual(d.bufnr, None)
+        self.assertEqual(list(d.meta_information), [u'#+TITLE: file'])
+        headings = list(d.all_headings())
+        self.assertEqual([h.start for h in headings], [1, 3, 5, 6])
+        self.assertEqual([h.todo for h in headings],
+                         [u'TODO', None, u'DONE', None])
+        self.assertEqual(headings[0].children[0].title, u'Überschrift 1.1')
+        self.assertEqual(unicode(headings[0].active_date), u'<2011-08-24 Wed>')
+        self.assertEqual(d.find_heading(4).title, u'Überschrift 2')
+
+        # the lines are read once, the content can't change
+        lines = d.lines()
+        self.assertEqual(headings[0].find_checkbox(), None)
+        self.assertIs(d.lines(), lines)
+
+        # files are read only
+        self.assertEqual(d.write(), False)
+        headings[0].title = u'changed'
+        self.assertRaises(ValueError, d.write)
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(FileDocumentTestCase)
@@ -92,6 +92,24 @@ class TestHeadingRecognizeDatesInHeading(unittest.TestCase):
         odate = OrgDate(True, 2011, 8, 24)
         self.assertEqual(odate, h.active_date)
 
+    def test_get_timestamps(self):
+        text = ["* TODO This is a test <2011-08-25 Thu 10:10>",
+                "some body text [2011-08-24 Wed]",
+                "no date"]
+        expected = [(0, 22, 44, OrgDateTime(True, 2011, 8, 25, 10, 10)),
+                    (1, 15, 31, OrgDate(False, 2011, 8, 24))]
+        h = Heading.parse_heading_from_data(text, self.allowed_todo_states)
+        self.assertEqual(h.get_timestamps(), expected)
+
+        h = Heading.parse_heading_from_data(text, self.allowed_todo_states,
+                                            lazy=True)
+        self.assertEqual(h.get_timestamps(), expected)
+
+        # changes are taken into account
+        h.body = ["<2011-08-26 Fri>"]
+        self.assertEqual(h.get_timestamps(),
+                         [expected[0], (1, 0, 16, OrgDate(True, 2011, 8, 26))])
+
     def test_less_than_for_dates_in_heading(self):
         self.assertTrue(self.h1 < self.h2)
         self.assertTrue(self.h1 < self.h3)
@@ -6,6 +6,8 @@ import unittest
 
 sys.path.append(u'../ftplugin')
 from orgmode.liborgmode.orgdate import get_orgdate
+from orgmode.liborgmode.orgdate import get_orgdates
+from orgmode.liborgmode import orgdate
 from orgmode.liborgmode.orgdate import OrgDate
 from orgmode.liborgmode.orgdate import OrgDateTime
 from orgmode.liborgmode.orgdate import OrgTimeRange
@@ -196,6 +198,78 @@ class OrgDateParsingTestCase(unittest.TestCase):
         datestr = u"<2012-03-40 Tue 24:70>"
         self.assertEqual(get_orgdate(datestr), None)
 
+    def test_get_orgdate_parsing_precedence(self):
+        u"""
+        If a text contains different kinds of dates, the first one of the most
+        specific kind is returned, independent of its position
+        """
+        result = get_orgdate(u"[2011-09-12 Mon] <2011-09-13 Tue 10:20>")
+        self.assertTrue(isinstance(result, OrgDateTime))
+        self.assertTrue(result.active)
+
+        result = get_orgdate(
+            u"<2011-09-12 Mon 10:20> <2011-09-13 Tue>--<2011-09-14 Wed>")
+        self.assertTrue(isinstance(result, OrgTimeRange))
+        self.assertEqual(result.start, OrgDate(True, 2011, 9, 13))
+
+        # the first date of the most specific kind is invalid
+        self.assertEqual(
+            get_orgdate(u"<2011-14-12 Mon 10:20> <2011-09-13 Tue 10:20>"),
+            None)
+
+    def test_get_orgdates(self):
+        u"""
+        get_orgdates should find all dates with their positions
+        """
+        self.assertEqual(get_orgdates(u"NONSENSE"), [])
+        self.assertEqual(get_orgdates([]), [])
+
+        text = [u"* TODO heading <2011-09-12 Mon 10:00-12:00>",
+                u"no date",
+                u"[2011-09-12 Mon] <2011-14-12 Mon> <2011-09-13 Tue>--<2011-09-14 Wed>"]
+        result = get_orgdates(text)
+        self.assertEqual([r[:3] for r in result],
+                         [(0, 15, 43), (2, 0, 16), (2, 34, 68)])
+        self.assertTrue(isinstance(result[0][3], OrgTimeRange))
+        self.assertEqual(unicode(result[0][3]), u"<2011-09-12 Mon 10:00-12:00>")
+        self.assertEqual(result[1][3], OrgDate(False, 2011, 9, 12))
+        self.assertFalse(result[1][3].active)
+        self.assertEqual(unicode(result[2][3]),
+                         u"<2011-09-13 Tue>--<2011-09-14 Wed>")
+
+        result = get_orgdates(u"x <2011-09-12 Mon 10:20>")
+        self.assertEqual(result, [(0, 2, 24, OrgDateTime(True, 2011, 9, 12, 10, 20))])
+
+    def test_get_orgdate_cached(self):
+        u"""
+        Dates with the same text are parsed just once and shared
+        """
+        orgdate._orgdates.clear()
+        orgdate.reset_stats()
+        result = get_orgdate(u"<2011-09-12 Mon 10:00>--<2011-09-13 Tue 11:00>")
+        self.assertTrue(get_orgdate(
+            [u"x", u"y <2011-09-12 Mon 10:00>--<2011-09-13 Tue 11:00>"])
+            is result)
+        self.assertEqual(get_orgdate(u"<2011-14-12 Mon>"), None)
+        self.assertEqual(get_orgdate(u"<2011-14-12 Mon>"), None)
+        stats = orgdate.stats()
+        self.assertEqual((stats[u'hits'], stats[u'misses']), (2, 2))
+
+        # the string representation is computed once
+        self.assertEqual(unicode(result),
+                         u"<2011-09-12 Mon 10:00>--<2011-09-13 Tue 11:00>")
+        self.assertTrue(unicode(result) is unicode(result))
+
+        # shared dates can't be changed
+        self.assertRaises(AttributeError, setattr, result, u'active', False)
+        self.assertRaises(AttributeError, setattr, result, u'start', None)
+        self.assertRaises(AttributeError, setattr, result.start, u'active',
+                          False)
+        date = get_orgdate(u"<2011-09-12 Mon>")
+        self.assertRaises(AttributeError, setattr, date, u'active', False)
+        self.assertRaises(AttributeError, setattr, date, u'_text', None)
+        self.assertEqual(unicode(date), u"<2011-09-12 Mon>")
+
     def test_get_orgdate_parsing_with_utf8(self):
         u"""
         get_orgdate should recognize all orgdates within a given utf-8 text
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import unittest
+sys.path.append(u'../ftplugin')
+
+from orgmode.liborgmode.todokeywords import TodoKeywordModel, \
+    parse_todo_keywords, split_access_key
+
+
+class TodoKeywordModelTestCase(unittest.TestCase):
+    u"""Tests the compiled todo keywords."""
+
+    def test_parse_todo_keywords(self):
+        self.assertEqual(parse_todo_keywords(u'TODO'), [])
+        self.assertEqual(parse_todo_keywords([u'TODO', u'DONE']),
+                         [([u'TODO'], [u'DONE'])])
+        self.assertEqual(
+            parse_todo_keywords([[u'TODO(t)', u'|', u'DONE(d)'],
+                                 [u'REPORT', u'BUG', u'|', u'FIXED']]),
+            [([u'TODO'], [u'DONE']), ([u'REPORT', u'BUG'], [u'FIXED'])])
+        self.assertEqual(
+            parse_todo_keywords([u'TODO(t)', u'|', u'DONE(d)'],
+                                strip_access_key=False),
+            [([u'TODO(t)'], [u'DONE(d)'])])
+
+    def test_split_access_key(self):
+        self.assertEqual(split_access_key(u'TODO(t)'), (u'TODO', u't'))
+        self.assertEqual(split_access_key(u'TODO'), (u'TODO', None))
+        self.assertEqual(split_access_key(u'TODO()'), (u'TODO()', None))
+
+    def test_model(self):
+        model = TodoKeywordModel.from_setting(
+            [[u'TODO(t)', u'NEXT', u'|', u'DONE(d)'], [u'BUG', u'FIXED']])
+        self.assertEqual(model.sequences,
+                         [([u'TODO', u'NEXT'], [u'DONE']),
+                          ([u'BUG'], [u'FIXED'])])
+        self.assertEqual(model.raw_sequences,
+                         [([u'TODO(t)', u'NEXT'], [u'DONE(d)']),
+                          ([u'BUG'], [u'FIXED'])])
+        self.assertEqual(model.active, frozenset([u'TODO', u'NEXT', u'BUG']))
+        self.assertEqual(model.done, frozenset([u'DONE', u'FIXED']))
+        self.assertEqual(model.all_states,
+                         [u'TODO', u'NEXT', u'DONE', u'BUG', u'FIXED'])
+        self.assertEqual(model.sequence_of[u'FIXED'], 1)
+        self.assertEqual(len(model), 2)
+        self.assertTrue(u'NEXT' in model)
+        self.assertFalse(u'TODO(t)' in model)
+        self.assertEqual(model.cycle_sets,
+                         [[u'TODO', u'NEXT', u'DONE'], [u'BUG', u'FIXED'],
+                          [None]])
+        self.assertFalse(model.has_duplicates)
+
+        self.assertTrue(TodoKeywordModel.from_setting(
+            [[u'TODO', u'DONE'], [u'TODO', u'FIXED']]).has_duplicates)
+
+    def test_match(self):
+        model = TodoKeywordModel.from_setting([u'TODO', u'TODONE', u'|',
+                                               u'DONE'])
+        self.assertEqual(model.match(u'TODO buy milk'), u'TODO')
+        self.assertEqual(model.match(u'TODONE buy milk'), u'TODONE')
+        self.assertEqual(model.match(u'DONE'), u'DONE')
+        self.assertEqual(model.match(u'TODOS buy milk'), None)
+        self.assertEqual(model.match(u'buy milk'), None)
+        self.assertEqual(TodoKeywordModel.from_setting([]).match(u'TODO'), None)
+
+    def test_memoized(self):
+        value = [u'TODO', u'|', u'DONE']
+        model = TodoKeywordModel.from_setting(value)
+        self.assertTrue(TodoKeywordModel.from_setting(list(value)) is model)
+        self.assertFalse(TodoKeywordModel.from_setting([u'TODO', u'|',
+                                                        u'FIXED']) is model)
+
+        sequences = [([u'TODO(t)'], [u'DONE'])]
+        model = TodoKeywordModel.from_sequences(sequences)
+        self.assertTrue(TodoKeywordModel.from_sequences(
+            [[[u'TODO(t)'], [u'DONE']]]) is model)
+        self.assertEqual(model.sequences, [([u'TODO'], [u'DONE'])])
+        self.assertEqual(model.raw_sequences, sequences)
+
+        # a flat list of keywords is a single sequence
+        self.assertTrue(TodoKeywordModel.from_sequences(value) is
+                        TodoKeywordModel.from_setting(value))
+
+    def test_memo_bounded(self):
+        model = TodoKeywordModel.from_setting([u'TODO', u'|', u'DONE'])
+        for i in range(TodoKeywordModel._models.maxsize):
+            TodoKeywordModel.from_setting([u'TODO%d' % i, u'|', u'DONE'])
+        self.assertEqual(len(TodoKeywordModel._models),
+                         TodoKeywordModel._models.maxsize)
+        # the least recently used model was dropped
+        self.assertFalse(TodoKeywordModel.from_setting(
+            [u'TODO', u'|', u'DONE']) is model)
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TodoKeywordModelTestCase)
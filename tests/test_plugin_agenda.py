@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+sys.path.append(u'../ftplugin')
+
+import unittest
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import vim
+
+from orgmode._vim import ORGMODE
+from orgmode.plugins.Agenda import Agenda, AsyncAgenda
+
+from orgmode.py3compat.encode_compatibility import *
+from orgmode.py3compat.py_py3_string import *
+
+bufnr = 5
+
+
+class AgendaBuffer(vim.VimBuffer):
+    u""" Buffer that records the replaced lines """
+
+    def __init__(self):
+        vim.VimBuffer.__init__(self)
+        self.writes = []
+
+    def __setitem__(self, key, value):
+        if isinstance(key, slice):
+            self.writes.append((key.start, key.stop, len(value)))
+        vim.VimBuffer.__setitem__(self, key, value)
+
+    def __setslice__(self, i, j, value):
+        # python 2 only
+        self.writes.append((i, j, len(value)))
+        vim.VimBuffer.__setslice__(self, i, j, value)
+
+
+class AgendaTestCase(unittest.TestCase):
+    u"""Tests the Agenda plugin."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        vim.EVALHISTORY = []
+        vim.CMDHISTORY = []
+        vim.EVALRESULTS = {
+                # the current buffer has keywords of its own
+                u_encode(u'exists("b:org_todo_keywords")'): u_encode(u'1'),
+                u_encode(u'b:org_todo_keywords'): [u_encode(u'BUG'), u_encode(u'|'), u_encode(u'FIXED')],
+                u_encode(u'exists("g:org_todo_keywords")'): u_encode(u'1'),
+                u_encode(u'g:org_todo_keywords'): [u_encode(u'TODO'), u_encode(u'|'), u_encode(u'DONE')],
+                u_encode(u'exists("b:org_agenda_cache_dir")'): u_encode(u'0'),
+                u_encode(u'exists("g:org_agenda_cache_dir")'): u_encode(u'0'),
+                u_encode(u'exists("b:org_agenda_processes")'): u_encode(u'0'),
+                u_encode(u'exists("g:org_agenda_processes")'): u_encode(u'0'),
+                u_encode(u'exists("g:org_debug")'): u_encode(u'0'),
+                u_encode(u'exists("b:org_debug")'): u_encode(u'0'),
+                u_encode(u'b:changedtick'): u_encode(u'0'),
+                u_encode(u'bufexists(%d)' % bufnr): u_encode(u'1'),
+                u_encode(u"timer_start(%d, {t -> execute('%s ORGMODE.plugins[u\"Agenda\"].poll_agenda()')}, {'repeat': -1})"
+                         % (AsyncAgenda.interval, VIM_PY_CALL)): u_encode(u'7'),
+                }
+        self.buffer = AgendaBuffer()
+        vim.buffers = {bufnr: self.buffer}
+        vim.current.buffer.number = bufnr
+        # every call of load waits for an item in gate
+        self.gate = queue.Queue()
+        self.file_loader, _ = Agenda._get_file_loader()
+
+    def tearDown(self):
+        del vim.buffers
+        shutil.rmtree(self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with io.open(path, u'w', encoding=u'utf-8') as f:
+            f.write(content)
+        return path
+
+    def test_file_loader_todo_states(self):
+        # files that are read from disk use the global todo keywords, not
+        # those of the current buffer
+        path = self.write(u'agenda.org', u'* TODO task\n* BUG bug\n')
+        load, batch_size = Agenda._get_file_loader()
+        self.assertEqual(batch_size, 1)
+        document = load([path])[0]
+        self.assertEqual([(h.todo, h.title) for h in document.all_headings()],
+                         [(u'TODO', u'task')])
+
+    def load(self, paths):
+        self.gate.get(True, 5)
+        return self.file_loader(paths)
+
+    def start(self, documents, paths):
+        return AsyncAgenda(
+            Agenda, bufnr, paths, documents, self.load, 1,
+            ORGMODE.agenda_manager.get_next_week_and_active_todo,
+            Agenda._format_week_item, u'empty').start()
+
+    def poll(self, agenda, count):
+        u""" Poll until count documents were read """
+        for i in range(500):
+            if len([d for d in agenda.documents if d is not None]) >= count:
+                return
+            time.sleep(0.01)
+            agenda.poll()
+        self.fail(u'agenda files not read')
+
+    def assertConsistent(self, agenda, done):
+        # the buffer and line2doc match a complete rebuild of the agenda
+        lines, line2doc, _ = Agenda._format_next_week(
+            ORGMODE.agenda_manager.get_next_week_and_active_todo(
+                [d for d in agenda.documents if d is not None]))
+        if not agenda.finished:
+            self.assertEqual(self.buffer[-1], u_encode(
+                u'-- %d/3 agenda files, press <C-c> to cancel --' % done))
+            self.assertEqual(self.buffer[:-1], [u_encode(l) for l in lines])
+        else:
+            self.assertEqual(self.buffer[:], [u_encode(l) for l in lines])
+        self.assertEqual(
+            dict((row, Agenda.line2doc[row]) for row in range(1, len(lines) + 2)
+                 if row in Agenda.line2doc), line2doc)
+
+    def test_async_agenda(self):
+        today = date.today().strftime(u'%Y-%m-%d %a')
+        paths = [
+            self.write(u'a.org', u'* TODO a1 <2020-01-03 Fri>\n'
+                       u'* TODO a2 <2020-01-01 Wed>\n'),
+            self.write(u'b.org', u'* TODO b1 <2020-01-02 Thu>\n'
+                       u'* TODO b2 <%s>\n' % today),
+            self.write(u'c.org', u'* TODO c1 <2020-01-01 Wed>\n'),
+            self.write(u'd.org', u'* TODO d1 <2020-01-02 Thu>\n')]
+        # d.org is loaded in a buffer already
+        documents = [None, None, None, self.file_loader([paths[3]])[0]]
+        agenda = self.start(documents, paths)
+        self.assertEqual(agenda.timer, 7)
+        self.assertEqual(self.buffer[:], [
+            u_encode(u'Week Agenda:'), u_encode(u'<2020-01-02 Thu>'),
+            u_encode(u'  d  TODO  d1 <2020-01-02 Thu>'),
+            u_encode(u'-- 0/3 agenda files, press <C-c> to cancel --')])
+        self.assertEqual(Agenda.line2doc[3], (paths[3], None, 0))
+        self.assertRaises(KeyError, lambda: Agenda.line2doc[2])
+
+        self.gate.put(None)
+        self.poll(agenda, 2)
+        self.assertConsistent(agenda, 1)
+        self.assertEqual(self.buffer[:4], [
+            u_encode(u'Week Agenda:'), u_encode(u'<2020-01-01 Wed>'),
+            u_encode(u'  a  TODO  a2 <2020-01-01 Wed>'), u_encode(u'<2020-01-02 Thu>')])
+
+        self.gate.put(None)
+        self.poll(agenda, 3)
+        self.assertConsistent(agenda, 2)
+
+        # c1 is inserted between a2 and the following date, just the
+        # status and the new item are written
+        del self.buffer.writes[:]
+        self.gate.put(None)
+        self.poll(agenda, 4)
+        self.assertEqual(agenda.finished, True)
+        self.assertConsistent(agenda, 3)
+        self.assertEqual(self.buffer[2:4], [
+            u_encode(u'  a  TODO  a2 <2020-01-01 Wed>'), u_encode(u'  c  TODO  c1 <2020-01-01 Wed>')])
+        self.assertEqual(sum(n for _, _, n in self.buffer.writes), 1)
+        self.assertEqual(len(self.buffer.writes), 2)
+        self.assertIn(u_encode(u'call timer_stop(7)'), vim.CMDHISTORY)
+        # the cursor is moved to today
+        self.assertEqual(self.buffer[9], u_encode(u'<%s> TODAY' % today))
+        self.assertEqual(vim.CMDHISTORY[-1], u_encode(u'normal! 10gg'))
+
+    def test_async_agenda_cancel(self):
+        paths = [
+            self.write(u'a.org', u'* TODO a1 <2020-01-03 Fri>\n'),
+            self.write(u'b.org', u'* TODO b1 <2020-01-02 Thu>\n')]
+        agenda = self.start([None, None], paths)
+        self.gate.put(None)
+        self.poll(agenda, 1)
+        agenda.cancel()
+        # the batch that is read right now is dropped
+        self.gate.put(None)
+        agenda.loader.join(5)
+        self.assertEqual(agenda.finished, True)
+        self.assertEqual(agenda.loader.cancelled, True)
+        self.assertIn(u_encode(u'call timer_stop(7)'), vim.CMDHISTORY)
+        self.assertEqual(self.buffer[:], [
+            u_encode(u'Week Agenda:'), u_encode(u'<2020-01-03 Fri>'),
+            u_encode(u'  a  TODO  a1 <2020-01-03 Fri>')])
+        self.assertEqual(Agenda.line2doc[3], (paths[0], None, 0))
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(AgendaTestCase)
@@ -124,6 +124,24 @@ class EditCheckboxTestCase(unittest.TestCase):
         self.assertEqual(vim.current.buffer[9], u'              - [ ] ')
         self.editcheckbox.update_checkboxes_status()
 
+    def test_toggle_writes_once(self):
+        global bufnr
+        bufnr += 1
+        set_vim_buffer(buf=self.c1, cursor=(9, 0), bufnr=bufnr)
+        self.editcheckbox.toggle()
+        # the toggled checkbox, its parents and the cookies are written with
+        # a single replacement
+        self.assertEqual(ORGMODE.get_document().write_calls, 1)
+        self.assertEqual(vim.current.buffer[1], u"* heading1 [0%]")
+        self.assertEqual(vim.current.buffer[2], u"  - [ ] checkbox1 [0/2]")
+        self.assertEqual(vim.current.buffer[6], u"  - [-] checkbox5")
+        self.assertEqual(vim.current.buffer[7], u"        - [-] checkbox6")
+        self.assertEqual(vim.current.buffer[8], u"              - [X] checkbox7")
+
+        # nothing changes when the status is up to date
+        self.editcheckbox.update_checkboxes_status()
+        self.assertEqual(ORGMODE.get_document().write_calls, 0)
+
     def test_no_status_checkbox(self):
         global bufnr
         bufnr += 1
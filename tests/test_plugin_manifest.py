@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+import os
+import subprocess
+import sys
+sys.path.append(u'../ftplugin')
+
+import unittest
+
+import vim
+
+from orgmode._vim import ORGMODE, OrgMode
+from orgmode import pluginloader
+from orgmode.pluginloader import LazyPlugin, get_manifest_entry
+from orgmode.py3compat.py_py3_string import VIM_PY_CALL
+
+from orgmode.py3compat.encode_compatibility import *
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+
+
+def describe_keybindings(plugin):
+    return [(k.key, k.action, k.mode, k.options, k.remap)
+            for k in plugin.keybindings]
+
+
+class PluginManifestTestCase(unittest.TestCase):
+    u"""Tests the manifest of the plugins and loading plugins lazily."""
+
+    @classmethod
+    def setUpClass(cls):
+        # the manifest is generated like "make build" does, in a separate
+        # process to keep the plugins of the other tests untouched
+        subprocess.check_call([sys.executable, u'build_manifest.py'],
+                              cwd=TESTS)
+
+    def setUp(self):
+        vim.EVALRESULTS = {
+                u'exists("g:org_debug")': 0,
+                u'exists("b:org_debug")': 0,
+                u'exists("*repeat#set()")': 0,
+                u'b:changedtick': 0,
+                u_encode(u'exists("b:org_plugins")'): 0,
+                u_encode(u'exists("g:org_plugins")'): 1,
+                u_encode(u'g:org_plugins'): [u_encode(u'Navigator'),
+                                             u_encode(u'|'),
+                                             u_encode(u'Export')],
+                u_encode(u'exists("b:org_lazy_plugins")'): 0,
+                u_encode(u'exists("g:org_lazy_plugins")'): 0,
+                u_encode(u'exists("g:org_export_emacs")'): 0,
+                u_encode(u'exists("g:org_export_verbose")'): 0,
+                u_encode(u'exists("g:org_export_init_script")'): 0,
+                }
+        vim.CMDHISTORY = []
+
+    def test_changed_plugin(self):
+        # plugins that changed since the manifest was generated are loaded
+        # right away
+        self.assertEqual(get_manifest_entry(u'Navigator')[u'source'],
+                         pluginloader.hash_plugin(u'Navigator'))
+        vim.EVALRESULTS[u_encode(u'exists("g:org_lazy_plugins")')] = 1
+        vim.EVALRESULTS[u_encode(u'g:org_lazy_plugins')] = u_encode(u'1')
+        hash_plugin = pluginloader.hash_plugin
+        pluginloader.hash_plugin = lambda plugin: u'changed' \
+            if plugin == u'Navigator' else hash_plugin(plugin)
+        pluginloader._up_to_date.clear()
+        try:
+            self.assertEqual(get_manifest_entry(u'Navigator'), None)
+            orgmode = OrgMode()
+            orgmode.start()
+            self.assertEqual(orgmode._plugins[u'Navigator'].__class__.__name__,
+                             u'Navigator')
+            self.assertTrue(isinstance(orgmode._plugins[u'Export'],
+                                       LazyPlugin))
+        finally:
+            pluginloader.hash_plugin = hash_plugin
+            pluginloader._up_to_date.clear()
+
+    def test_eager_plugins(self):
+        # registering these plugins defines autocommands or depends on vim
+        for plugin in (u'Todo', u'TagsProperties', u'Date'):
+            self.assertTrue(get_manifest_entry(plugin)[u'eager'])
+        self.assertFalse(get_manifest_entry(u'Navigator')[u'eager'])
+        self.assertEqual(get_manifest_entry(u'Unknown'), None)
+
+    def test_defer_plugin(self):
+        orgmode = OrgMode()
+        self.assertEqual(orgmode.defer_plugin(u'Unknown'), None)
+        self.assertFalse(u'Unknown' in orgmode.plugins)
+
+        lazy = orgmode.defer_plugin(u'Navigator')
+        self.assertTrue(isinstance(lazy, LazyPlugin))
+        self.assertTrue(u'Navigator' in orgmode.plugins)
+        self.assertEqual(len(orgmode.orgmenu.children), 1)
+        # the mappings of the plugin have been created
+        self.assertTrue(u_encode(
+            u':nnoremap <Plug>OrgJumpToNextNormal %s '
+            u'ORGMODE.plugins[u"Navigator"].next(mode=u"normal")<CR>' %
+            VIM_PY_CALL) in vim.CMDHISTORY)
+
+        # the plugin is loaded when it's looked up
+        plugin = orgmode.plugins[u'Navigator']
+        self.assertEqual(plugin.__class__.__name__, u'Navigator')
+        self.assertTrue(orgmode.plugins[u'Navigator'] is plugin)
+        self.assertEqual(describe_keybindings(plugin),
+                         describe_keybindings(lazy))
+        # the menu of the plugin isn't added twice
+        self.assertEqual(len(orgmode.orgmenu.children), 1)
+        self.assertTrue(orgmode.orgmenu.children[0] is lazy.menu[0])
+
+    def test_agenda_defaults(self):
+        # the persistent agenda cache is disabled unless the user chooses a
+        # directory
+        for setting in (u'org_agenda_cache_dir', u'org_agenda_processes',
+                        u'org_agenda_async'):
+            vim.EVALRESULTS[u_encode(u'exists("g:%s")' % setting)] = 0
+        orgmode = OrgMode()
+        orgmode.defer_plugin(u'Agenda')
+        self.assertTrue(u_encode(u"let g:org_agenda_cache_dir = ''") in
+                        vim.CMDHISTORY)
+
+    def test_start_lazy(self):
+        # plugins are loaded right away by default
+        orgmode = OrgMode()
+        orgmode.start()
+        self.assertEqual(orgmode._plugins[u'Navigator'].__class__.__name__,
+                         u'Navigator')
+
+        vim.EVALRESULTS[u_encode(u'exists("g:org_lazy_plugins")')] = 1
+        vim.EVALRESULTS[u_encode(u'g:org_lazy_plugins')] = u_encode(u'1')
+        vim.CMDHISTORY = []
+        orgmode = OrgMode()
+        orgmode.start()
+        self.assertTrue(isinstance(orgmode._plugins[u'Navigator'], LazyPlugin))
+        self.assertTrue(isinstance(orgmode._plugins[u'Export'], LazyPlugin))
+        self.assertEqual(len(orgmode.orgmenu.children), 3)
+        # the default settings of deferred plugins are set
+        self.assertTrue(u_encode(u'let g:org_export_verbose = 0') in
+                        vim.CMDHISTORY)
+
+        vim.EVALRESULTS[u_encode(u'exists("g:org_lazy_plugins")')] = 1
+        vim.EVALRESULTS[u_encode(u'g:org_lazy_plugins')] = u_encode(u'0')
+        orgmode = OrgMode()
+        orgmode.start()
+        self.assertEqual(orgmode._plugins[u'Navigator'].__class__.__name__,
+                         u'Navigator')
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(PluginManifestTestCase)
@@ -7,7 +7,8 @@ sys.path.append(u'../ftplugin')
 
 import vim
 
-from orgmode._vim import indent_orgmode, fold_orgmode, ORGMODE
+from orgmode._vim import indent_orgmode, fold_levels_orgmode, \
+        apply_folds_orgmode, update_folds_orgmode, ORGMODE
 
 from orgmode.py3compat.encode_compatibility import *
 
@@ -95,70 +96,155 @@ Bla Bla bla bla
         self.assertEqual(len(vim.CMDHISTORY), 1)
         self.assertEqual(vim.CMDHISTORY[-1], u_encode(u'let b:indent_level = 2'))
 
+    def _fold_level(self):
+        u""" Return the fold level of line v:lnum from b:orgmode_fold_levels """
+        fold_levels_orgmode()
+        self.assertEqual(len(vim.CMDHISTORY), 1)
+        levels = u_decode(vim.CMDHISTORY[-1]).split(u'[', 1)[1].split(u']', 1)[0]
+        return levels.split(u',')[int(vim.EVALRESULTS[u_encode(u'v:lnum')]) - 1]
+
     def test_fold_heading_start(self):
         # test first heading
         vim.current.window.cursor = (2, 0)
         vim.EVALRESULTS[u_encode(u'v:lnum')] = u_encode(u'2')
-        fold_orgmode()
-        self.assertEqual(len(vim.CMDHISTORY), 1)
-        self.assertEqual(vim.CMDHISTORY[-1], u_encode(u'let b:fold_expr = ">1"'))
+        self.assertEqual(self._fold_level(), u'">1"')
 
     def test_fold_heading_middle(self):
         # test first heading
         vim.current.window.cursor = (3, 0)
         vim.EVALRESULTS[u_encode(u'v:lnum')] = u_encode(u'3')
-        fold_orgmode()
-        self.assertEqual(len(vim.CMDHISTORY), 1)
-        self.assertEqual(vim.CMDHISTORY[-1], u_encode(u'let b:fold_expr = 1'))
+        self.assertEqual(self._fold_level(), u'1')
 
     def test_fold_heading_end(self):
         # test first heading
         vim.current.window.cursor = (5, 0)
         vim.EVALRESULTS[u_encode(u'v:lnum')] = u_encode(u'5')
-        fold_orgmode()
-        self.assertEqual(len(vim.CMDHISTORY), 1)
-        self.assertEqual(vim.CMDHISTORY[-1], u_encode(u'let b:fold_expr = 1'))
+        self.assertEqual(self._fold_level(), u'1')
 
     def test_fold_heading_end_of_last_child(self):
         # test first heading
         vim.current.window.cursor = (16, 0)
         vim.EVALRESULTS[u_encode(u'v:lnum')] = u_encode(u'16')
-        fold_orgmode()
-        self.assertEqual(len(vim.CMDHISTORY), 1)
         # which is also end of the parent heading <1
-        self.assertEqual(vim.CMDHISTORY[-1], u_encode(u'let b:fold_expr = ">3"'))
+        self.assertEqual(self._fold_level(), u'">3"')
 
     def test_fold_heading_end_of_last_child_next_heading(self):
         # test first heading
         vim.current.window.cursor = (17, 0)
         vim.EVALRESULTS[u_encode(u'v:lnum')] = u_encode(u'17')
-        fold_orgmode()
-        self.assertEqual(len(vim.CMDHISTORY), 1)
-        self.assertEqual(vim.CMDHISTORY[-1], u_encode(u'let b:fold_expr = ">1"'))
+        self.assertEqual(self._fold_level(), u'">1"')
 
     def test_fold_middle_subheading(self):
         # test first heading
         vim.current.window.cursor = (13, 0)
         vim.EVALRESULTS[u_encode(u'v:lnum')] = u_encode(u'13')
-        fold_orgmode()
-        self.assertEqual(len(vim.CMDHISTORY), 1)
-        self.assertEqual(vim.CMDHISTORY[-1], u_encode(u'let b:fold_expr = ">4"'))
+        self.assertEqual(self._fold_level(), u'">4"')
 
     def test_fold_middle_subheading2(self):
         # test first heading
         vim.current.window.cursor = (14, 0)
         vim.EVALRESULTS[u_encode(u'v:lnum')] = u_encode(u'14')
-        fold_orgmode()
-        self.assertEqual(len(vim.CMDHISTORY), 1)
-        self.assertEqual(vim.CMDHISTORY[-1], u_encode(u'let b:fold_expr = 4'))
+        self.assertEqual(self._fold_level(), u'4')
 
     def test_fold_middle_subheading3(self):
         # test first heading
         vim.current.window.cursor = (15, 0)
         vim.EVALRESULTS[u_encode(u'v:lnum')] = u_encode(u'15')
-        fold_orgmode()
+        self.assertEqual(self._fold_level(), u'4')
+
+    def test_fold_levels(self):
+        fold_levels_orgmode()
+        self.assertEqual(len(vim.CMDHISTORY), 1)
+        self.assertEqual(vim.CMDHISTORY[-1], u_encode(
+            u'let b:orgmode_fold_levels = [-1,">1",1,1,1,">2",2,2,2,">2",2,2,'
+            u'">4",4,4,">3",">1",">1",1,1] | let b:orgmode_fold_levels_tick = %d'
+            % counter))
+
+    def test_fold_levels_cached(self):
+        d = ORGMODE.get_document()
+        levels = d.fold_levels()
+        self.assertIs(d.fold_levels(), levels)
+
+        # the cache is dropped when the DOM changes
+        d.headings[0].level = 2
+        self.assertEqual(d.fold_levels()[1], u'>2')
+        self.assertEqual(d.fold_levels()[2], 2)
+
+    def test_fold_manual_apply(self):
+        # folds are created for the first time
+        vim.EVALRESULTS[u_encode(u'get(b:, "orgmode_folds_tick", -1)')] = u_encode(u'-1')
+        apply_folds_orgmode()
+        self.assertEqual(len(vim.CMDHISTORY), 1)
+        self.assertEqual(vim.CMDHISTORY[-1], u_encode(
+            u'exe "normal! zE" | 18,20fold | 17,17fold | 16,16fold | '
+            u'13,15fold | 10,16fold | 6,9fold | 2,16fold | '
+            u'let &l:foldlevel = &l:foldlevel | '
+            u'let b:orgmode_folds_tick = %d' % counter))
+
+        # closed folds stay closed
+        vim.EVALRESULTS[u_encode(u'get(b:, "orgmode_folds_tick", -1)')] = u_encode(u'%d' % counter)
+        vim.EVALRESULTS[u_encode(
+            u"filter([2,6,10,13,16,17,18], 'foldclosed(v:val) == v:val')")] = \
+                [u_encode(u'2'), u_encode(u'13')]
+        apply_folds_orgmode()
+        self.assertEqual(len(vim.CMDHISTORY), 2)
+        self.assertEqual(vim.CMDHISTORY[-1], u_encode(
+            u'exe "normal! zE" | 18,20fold | 17,17fold | 16,16fold | '
+            u'13,15fold | 10,16fold | 6,9fold | 2,16fold | %%foldopen! | '
+            u'13foldclose | 2foldclose | '
+            u'let b:orgmode_folds_tick = %d' % counter))
+
+    def test_fold_manual_incremental(self):
+        vim.EVALRESULTS[u_encode(u'get(b:, "orgmode_folds_tick", -1)')] = u_encode(u'-1')
+        apply_folds_orgmode(incremental=True)
+        self.assertTrue(vim.CMDHISTORY[-1].startswith(
+            u_encode(u'exe "normal! zE" | ')))
+
+        # a subheading is added to the last heading, only its folds are
+        # created again
+        vim.current.buffer[18] = u_encode(u'** Überschrift 3.1')
+        vim.EVALRESULTS[u_encode(u'b:changedtick')] = u_encode(u'%d' % (counter + 1000))
+        vim.EVALRESULTS[u_encode(u'get(b:, "orgmode_folds_tick", -1)')] = u_encode(u'%d' % counter)
+        vim.EVALRESULTS[u_encode(
+            u"filter([18,19], 'foldclosed(v:val) == v:val')")] = [u_encode(u'18')]
+        apply_folds_orgmode(incremental=True)
+        self.assertEqual(len(vim.CMDHISTORY), 2)
+        self.assertEqual(vim.CMDHISTORY[-1], u_encode(
+            u'let g:orgmode_fold_view = [winsaveview(), getpos("\'<"), getpos("\'>")] | '
+            u'silent! exe "keepjumps normal! 18GV20GzD" | 19,20fold | 18,20fold | '
+            u'18,20foldopen! | 18foldclose | '
+            u'call setpos("\'<", g:orgmode_fold_view[1]) | '
+            u'call setpos("\'>", g:orgmode_fold_view[2]) | '
+            u'call winrestview(g:orgmode_fold_view[0]) | unlet g:orgmode_fold_view | '
+            u'let b:orgmode_folds_tick = %d' % (counter + 1000)))
+
+        # nothing changed since the folds were applied
+        vim.EVALRESULTS[u_encode(u'get(b:, "orgmode_folds_tick", -1)')] = u_encode(u'%d' % (counter + 1000))
+        apply_folds_orgmode(incremental=True)
+        self.assertEqual(vim.CMDHISTORY[-1], u_encode(
+            u'let b:orgmode_folds_tick = %d' % (counter + 1000)))
+
+        # all folds are created again unless incremental
+        apply_folds_orgmode()
+        self.assertTrue(vim.CMDHISTORY[-1].startswith(
+            u_encode(u'exe "normal! zE" | 19,20fold | 18,20fold | ')))
+
+    def test_fold_manual_update(self):
+        # folds are not managed manually
+        update_folds_orgmode()
+        self.assertEqual(len(vim.CMDHISTORY), 0)
+
+        # the folds are up to date
+        vim.EVALRESULTS[u_encode(u'get(b:, "orgmode_folds_tick", -1)')] = u_encode(u'%d' % counter)
+        update_folds_orgmode()
+        self.assertEqual(len(vim.CMDHISTORY), 0)
+
+        # the buffer changed
+        vim.EVALRESULTS[u_encode(u'get(b:, "orgmode_folds_tick", -1)')] = u_encode(u'%d' % (counter - 1))
+        update_folds_orgmode()
         self.assertEqual(len(vim.CMDHISTORY), 1)
-        self.assertEqual(vim.CMDHISTORY[-1], u_encode(u'let b:fold_expr = 4'))
+        self.assertTrue(vim.CMDHISTORY[-1].endswith(
+            u_encode(u'| let b:orgmode_folds_tick = %d' % counter)))
 
 def suite():
     return unittest.TestLoader().loadTestsFromTestCase(MiscTestCase)
@@ -7,7 +7,7 @@ sys.path.append(u'../ftplugin')
 
 import vim
 
-from orgmode._vim import indent_orgmode, fold_orgmode, ORGMODE
+from orgmode._vim import indent_orgmode, ORGMODE
 
 from orgmode.py3compat.encode_compatibility import *
 
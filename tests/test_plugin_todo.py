@@ -153,6 +153,14 @@ class TodoTestCase(unittest.TestCase):
         self.assertEqual(vim.current.buffer[5], u'** Text 1')
         self.assertEqual(vim.current.window.cursor, (7, 0))
 
+    def test_get_states_copy(self):
+        u"""The todo states are shared by all buffers, changing the returned
+        states must not change them"""
+        vim.EVALRESULTS[u_encode(u'g:org_todo_keywords')] = [u_encode(u'TODO'), u_encode(u'DONE')]
+        states_todo, states_done = VimBuffer().get_todo_states()[0]
+        states_todo.append(u'NEXT')
+        self.assertEqual(VimBuffer().get_todo_states(), [([u'TODO'], [u'DONE'])])
+
     # get_states
     def test_get_states_without_seperator(self):
         u"""The last element in the todostates shouold be used as DONE-state when no sperator is given"""
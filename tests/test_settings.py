@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+import sys
+sys.path.append(u'../ftplugin')
+
+import unittest
+
+import vim
+
+from orgmode import settings
+from orgmode._vim import ORGMODE, entry_point
+
+from orgmode.py3compat.encode_compatibility import *
+
+
+class SettingsTestCase(unittest.TestCase):
+    u"""Tests reading settings from a snapshot of all org_ variables."""
+
+    def setUp(self):
+        vim.EVALHISTORY = []
+        vim.EVALRESULTS = {
+                u_encode(settings.SNAPSHOT_EXPR): [
+                    {u_encode(u'org_global'): u_encode(u'g'),
+                     u_encode(u'org_both'): u_encode(u'g')},
+                    {u_encode(u'org_both'): u_encode(u'b'),
+                     u_encode(u'org_list'): [u_encode(u'TODO')]}],
+                u_encode(u'exists("b:org_both")'): u_encode(u'1'),
+                u_encode(u'b:org_both'): u_encode(u'b'),
+                u_encode(u'exists("g:org_both")'): u_encode(u'1'),
+                u_encode(u'g:org_both'): u_encode(u'g'),
+                u_encode(u'exists("b:org_global")'): u_encode(u'0'),
+                u_encode(u'exists("g:org_global")'): u_encode(u'1'),
+                u_encode(u'g:org_global'): u_encode(u'g'),
+                u_encode(u'exists("b:org_missing")'): u_encode(u'0'),
+                u_encode(u'exists("g:org_missing")'): u_encode(u'0'),
+                }
+        settings.snapshots_enabled = True
+        settings.invalidate()
+        settings.reset_stats()
+
+    def tearDown(self):
+        settings.snapshots_enabled = False
+
+    def test_snapshot(self):
+        self.assertEqual(settings.get(u'org_both'), u'b')
+        self.assertEqual(settings.get(u'org_global'), u'g')
+        self.assertEqual(settings.get(u'org_list'), [u_encode(u'TODO')])
+        self.assertEqual(settings.get(u'org_missing', u'default'), u'default')
+        # all settings were read with a single eval
+        self.assertEqual(vim.EVALHISTORY, [u_encode(settings.SNAPSHOT_EXPR)])
+        self.assertEqual(settings.stats(),
+                         {u'lookups': 4, u'snapshots': 1, u'evals_saved': 9})
+
+    def test_scope(self):
+        self.assertEqual(settings.get(u'org_both', scope=settings.SCOPE_GLOBAL),
+                         u'g')
+        self.assertEqual(settings.get(u'org_global',
+                                      scope=settings.SCOPE_BUFFER), None)
+
+        # without a snapshot as well
+        settings.snapshots_enabled = False
+        self.assertEqual(settings.get(u'org_both', scope=settings.SCOPE_GLOBAL),
+                         u'g')
+        self.assertEqual(settings.get(u'org_global',
+                                      scope=settings.SCOPE_BUFFER), None)
+
+    def test_invalidate(self):
+        settings.get(u'org_both')
+        settings.invalidate()
+        settings.get(u'org_both')
+        self.assertEqual(len(vim.EVALHISTORY), 2)
+
+        # setting a variable invalidates the snapshot
+        vim.EVALRESULTS[u_encode(settings.SNAPSHOT_EXPR)][1][
+            u_encode(u'org_both')] = u_encode(u'new')
+        settings.set(u'org_both', u'new', scope=settings.SCOPE_BUFFER,
+                     overwrite=True)
+        self.assertEqual(settings.get(u'org_both'), u'new')
+        self.assertEqual(settings.stats()[u'snapshots'], 3)
+
+    def test_entry_point(self):
+        # variables might have been changed by a mapping or a timer, every
+        # call from vim takes the snapshot again
+        settings.get(u'org_both')
+        settings.get(u'org_both')
+        ORGMODE.plugins
+        settings.get(u'org_both')
+        entry_point(lambda: settings.get(u'org_both'))()
+        self.assertEqual(settings.stats()[u'snapshots'], 3)
+
+    def test_fallback(self):
+        # without a snapshot every setting is evaluated on its own
+        del vim.EVALRESULTS[u_encode(settings.SNAPSHOT_EXPR)]
+        self.assertEqual(settings.get(u'org_both'), u'b')
+        self.assertEqual(settings.get(u'org_global'), u'g')
+        self.assertEqual(settings.get(u'org_missing', u'default'), u'default')
+        # the snapshot isn't retried until the next invalidation
+        self.assertEqual(vim.EVALHISTORY.count(
+            u_encode(settings.SNAPSHOT_EXPR)), 1)
+        self.assertEqual(settings.stats()[u'lookups'], 0)
+
+        settings.snapshots_enabled = False
+        vim.EVALHISTORY = []
+        settings.invalidate()
+        self.assertEqual(settings.get(u'org_both'), u'b')
+        self.assertEqual(len(vim.EVALHISTORY), 2)
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(SettingsTestCase)
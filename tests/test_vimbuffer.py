@@ -7,7 +7,8 @@ sys.path.append(u'../ftplugin')
 import vim
 
 from orgmode.liborgmode.headings import Heading
-from orgmode.vimbuffer import VimBuffer
+from orgmode._vim import OrgMode
+from orgmode.vimbuffer import VimBuffer, get_changedticks
 
 from orgmode.py3compat.encode_compatibility import *
 from orgmode.py3compat.unicode_compatibility import *
@@ -549,6 +550,39 @@ Bla Bla bla bla
         self.assertEqual(len(d.headings[0].children), 3)
         self.assertEqual(d.headings[0].children[-1].title, u'Test heading')
 
+    def test_write_calls(self):
+        # promote a subtree: the changed heading lines are merged into a
+        # single replacement
+        for h in list(self.document.all_headings())[:5]:
+            h.level += 1
+        self.assertEqual(self.document.write(), True)
+        # read the unchanged lines in between, write the replacement and
+        # the neovim workaround
+        self.assertEqual(self.document.write_calls, 4)
+        self.assertEqual(vim.current.buffer[2], u_encode(u'** Überschrift 1'))
+        self.assertEqual(vim.current.buffer[3], u_encode(u'Text 1'))
+        self.assertEqual(vim.current.buffer[16], u_encode(u'**** Überschrift 1.2.1'))
+        self.assertEqual(vim.current.buffer[17], u_encode(u'* Überschrift 2'))
+
+        # lines that didn't change are not written
+        self.document.headings[1].title = u'Überschrift 2'
+        self.assertEqual(self.document.write(), True)
+        self.assertEqual(self.document.write_calls, 0)
+
+        # sanity check
+        self.assertEqual(self._dom_structure(self.document),
+                self._dom_structure(VimBuffer().init_dom()))
+
+    def test_write_hash_collision(self):
+        # a line whose hash equals the hash of its new content is still
+        # written
+        h = self.document.headings[1]
+        h.title = u'Colliding title'
+        self.document._line_hashes[h._orig_start] = hash(unicode(h))
+        self.assertEqual(self.document.write(), True)
+        self.assertEqual(vim.current.buffer[h.start],
+                         u_encode(u'* Colliding title'))
+
     def test_write_add_heading_before_first_heading(self):
         # add a heading before the first heading
         self.assertEqual(len(self.document.headings), 3)
@@ -817,6 +851,35 @@ Bla Bla bla bla
         h = self.document.current_heading()
         self.assertEqual(h, None)
 
+    def test_heading_at(self):
+        d = self.document
+        expected = [None, None] + [h for h in d.all_headings()
+                                   for _ in range(len(h))]
+        self.assertEqual(len(expected), 21)
+        for position, h in enumerate(expected):
+            self.assertTrue(d.heading_at(position) is h)
+        self.assertEqual(d.heading_at(21), None)
+        self.assertEqual(d.heading_at(-1), None)
+
+    def test_heading_at_dirty_document(self):
+        d = self.document
+        d.headings[0].children[0].body.extend([u'more', u'text'])
+        d.meta_information = [u'meta']
+        self.assertTrue(d.is_dirty)
+        expected = [None] + [h for h in d.all_headings()
+                             for _ in range(len(h))]
+        for position, h in enumerate(expected):
+            self.assertTrue(d.heading_at(position) is h)
+            if h is not None:
+                self.assertTrue(h.start <= position <= h.end)
+        self.assertEqual(d.heading_at(len(expected)), None)
+
+        # the index follows structural changes of the document
+        del d.headings[0]
+        self.assertTrue(d.heading_at(1) is d.headings[0])
+        self.assertTrue(d.heading_at(4) is d.headings[1])
+        self.assertEqual(d.heading_at(5), None)
+
     def test_heading_start_and_end(self):
         # test heading start and end
         vim.current.window.cursor = (3, 0)
@@ -950,6 +1013,285 @@ Bla Bla bla bla
         h = self.document.current_heading()
         self.assertEqual(h, None)
 
+    def test_dom_irregular_levels(self):
+        vim.current.buffer[:] = [u_encode(i) for i in u"""meta
+** A
+*** B
+Text
+* C
+**** D
+** E
+*** F
+***** G
+**** H
+** I
+* J
+body
+*** K""".split(u'\n')]
+        d = VimBuffer().init_dom()
+        self.assertEqual(d.meta_information, [u'meta'])
+
+        def title(h):
+            return h.title if h else None
+
+        # title, start, parent, previous sibling, next sibling, children
+        expected = [
+            (u'A', 1, None, None, u'C', [u'B']),
+            (u'B', 2, u'A', None, None, []),
+            (u'C', 4, None, u'A', u'J', [u'D', u'E', u'I']),
+            (u'D', 5, u'C', None, u'E', []),
+            (u'E', 6, u'C', u'D', u'I', [u'F']),
+            (u'F', 7, u'E', None, None, [u'G', u'H']),
+            (u'G', 8, u'F', None, u'H', []),
+            (u'H', 9, u'F', u'G', None, []),
+            (u'I', 10, u'C', u'E', None, []),
+            (u'J', 11, None, u'C', None, [u'K']),
+            (u'K', 13, u'J', None, None, []),
+        ]
+        self.assertEqual([title(h) for h in d.headings], [u'A', u'C', u'J'])
+        self.assertEqual(len(list(d.all_headings())), len(expected))
+        for h, e in zip(d.all_headings(), expected):
+            self.assertEqual(
+                (h.title, h.start, title(h.parent), title(h.previous_sibling),
+                    title(h.next_sibling), [c.title for c in h.children]),
+                e)
+            self.assertEqual(h.document, d)
+            self.assertFalse(h.is_dirty)
+        self.assertEqual(d.headings[-1].children[0].body, [])
+        self.assertEqual(d.headings[-1].body, [u'body'])
+        self.assertFalse(d.is_dirty)
+
+    def _dom_structure(self, d):
+        def title(h):
+            return h.title if h else None
+        return (list(d.meta_information), [
+            (h.level, h.title, h.start, list(h.body), title(h.parent),
+                title(h.previous_sibling), title(h.next_sibling),
+                [c.title for c in h.children])
+            for h in d.all_headings()])
+
+    def _assert_update_dom(self, change):
+        u""" Apply change to the buffer and compare the incrementally updated
+        DOM with a freshly built one """
+        old_headings = list(self.document.all_headings())
+        change(vim.current.buffer)
+        self.assertEqual(self.document.update_dom(), True)
+        self.assertEqual(
+            self._dom_structure(self.document),
+            self._dom_structure(VimBuffer().init_dom()))
+        return old_headings
+
+    def test_update_dom_change_body(self):
+        def change(b):
+            b[12] = u_encode(u'Text 3 changed')
+        old = self._assert_update_dom(change)
+        # only the top level heading touching the change is parsed again
+        new = list(self.document.all_headings())
+        self.assertNotEqual(old[0], new[0])
+        self.assertEqual(old[-2:], new[-2:])
+
+    def test_update_dom_insert_lines(self):
+        def change(b):
+            b[7:7] = [u_encode(u'more text'), u_encode(u'** Neu'), u_encode(u'*** Neu 2')]
+        self._assert_update_dom(change)
+        self.assertEqual(self.document.headings[1].start, 20)
+        self.assertEqual(self.document.headings[0].children[1].title, u'Neu')
+
+    def test_update_dom_remove_lines(self):
+        def change(b):
+            del b[3:7]
+        self._assert_update_dom(change)
+        self.assertEqual(self.document.headings[1].start, 13)
+
+    def test_update_dom_remove_heading_line(self):
+        def change(b):
+            del b[17]
+        self._assert_update_dom(change)
+        self.assertEqual(len(self.document.headings), 2)
+        self.assertEqual(self.document.headings[1].title, u'Überschrift 3')
+
+    def test_update_dom_change_heading_level(self):
+        def change(b):
+            b[18] = u_encode(u'** Überschrift 3')
+        self._assert_update_dom(change)
+        self.assertEqual(len(self.document.headings), 2)
+        self.assertEqual(self.document.headings[1].children[0].title, u'Überschrift 3')
+
+    def test_update_dom_append(self):
+        def change(b):
+            b[len(b):] = [u_encode(u'* Überschrift 4'), u_encode(u'Text 4')]
+        self._assert_update_dom(change)
+        self.assertEqual(self.document.headings[-1].title, u'Überschrift 4')
+
+    def test_update_dom_explicit_range(self):
+        vim.current.buffer[12:13] = [u_encode(u'** Neu'), u_encode(u'Text')]
+        self.assertEqual(self.document.update_dom(12, 13, 14), True)
+        self.assertEqual(
+            self._dom_structure(self.document),
+            self._dom_structure(VimBuffer().init_dom()))
+
+    def test_update_dom_unchanged(self):
+        old = list(self.document.all_headings())
+        self.assertEqual(self.document.update_dom(), True)
+        self.assertEqual(old, list(self.document.all_headings()))
+
+    def test_update_dom_after_write(self):
+        orig = vim.current.buffer[:]
+        self.document.headings[1].title = u'changed'
+        self.document.write()
+        # changes undone in vim are detected although the written lines match
+        # the ones the DOM was built from
+        vim.current.buffer[:] = orig
+        self._assert_update_dom(lambda b: None)
+        self.assertEqual(self.document.headings[1].title, u'Überschrift 2')
+
+    def test_update_dom_changed_range(self):
+        # the changed lines are unknown after the DOM was built
+        self.assertEqual(self.document.pop_changed_range(), None)
+        self.assertEqual(self.document.pop_changed_range(), (0, 0))
+
+        # the lines of the top level headings that were parsed again are
+        # recorded, earlier ranges move with later changes
+        vim.current.buffer[12] = u_encode(u'Text 3 changed')
+        self.assertEqual(self.document.update_dom(), True)
+        vim.current.buffer[18:18] = [u_encode(u'more'), u_encode(u'text')]
+        self.assertEqual(self.document.update_dom(), True)
+        self.assertEqual(self.document.pop_changed_range(), (2, 20))
+        del vim.current.buffer[5]
+        self.assertEqual(self.document.update_dom(), True)
+        vim.current.buffer[20] = u_encode(u'changed')
+        self.assertEqual(self.document.update_dom(), True)
+        self.assertEqual(self.document.pop_changed_range(), (2, 22))
+
+        # writing the document loses track of the changed lines
+        self.document.headings[1].title = u'changed'
+        self.document.write()
+        self.assertEqual(self.document.pop_changed_range(), None)
+
+    def test_heading_start_dirty_document(self):
+        def expected_starts():
+            res = []
+            position = len(self.document.meta_information)
+            for h in self.document.all_headings():
+                res.append(position)
+                position += len(h)
+            return res
+
+        h = self.document.headings[0].children[1]
+        h.body.append(u'more text')
+        self.assertEqual(self.document.is_dirty, True)
+        self.assertEqual([h.start for h in self.document.all_headings()],
+                expected_starts())
+
+        # body changes are applied to the position index
+        self.document.headings[0].body = [u'one line']
+        del h.body[:]
+        self.assertEqual([h.start for h in self.document.all_headings()],
+                expected_starts())
+
+        # structural changes rebuild the position index
+        new = Heading(title=u'Neu', body=[u'a', u'b'])
+        self.document.headings[0].children.insert(1, new)
+        del self.document.headings[1]
+        self.assertEqual(new.start, expected_starts()[2])
+        self.assertEqual([h.start for h in self.document.all_headings()],
+                expected_starts())
+
+        self.document.meta_information.append(u'more meta')
+        self.assertEqual([h.start for h in self.document.all_headings()],
+                expected_starts())
+
+    def test_update_dom_rebuild_required(self):
+        # meta information changed
+        vim.current.buffer[0] = u_encode(u'#changed meta information')
+        self.assertEqual(self.document.update_dom(), False)
+
+        # the following top level heading would become a child
+        vim.current.buffer[:] = [u_encode(i) for i in
+                [u'** A', u'text', u'** B', u'** C']]
+        self.document = VimBuffer().init_dom()
+        vim.current.buffer[2] = u_encode(u'*** B')
+        self.assertEqual(self.document.update_dom(), True)
+        self.assertEqual(self.document.headings[0].children[0].title, u'B')
+        self.document = VimBuffer().init_dom()
+        vim.current.buffer[2] = u_encode(u'* B')
+        self.assertEqual(self.document.update_dom(), False)
+
+        # dirty documents are not updated
+        self.document = VimBuffer().init_dom()
+        self.document.headings[0].title = u'changed'
+        self.assertEqual(self.document.update_dom(), False)
+
+    def test_lines_snapshot(self):
+        lines = self.document.lines()
+        self.assertTrue(isinstance(lines, tuple))
+        self.assertEqual(lines[2], u'* Überschrift 1')
+        # the buffer is read just once per changedtick
+        self.assertTrue(self.document.lines() is lines)
+
+        vim.current.buffer[2] = u_encode(u'* Changed')
+        vim.EVALRESULTS[u_encode(u'b:changedtick')] = u_encode(u'%d' % (counter + 1000))
+        self.assertEqual(self.document.lines()[2], u'* Changed')
+
+    def test_find_heading_keeps_view(self):
+        h = self.document.find_heading(position=6)
+        self.assertEqual(h.title, u'Überschrift 1.1')
+        # the heading refers to the snapshot instead of a copy of its lines
+        self.assertTrue(h._source[0] is self.document.lines())
+        self.assertEqual(h._source[1:], (6, 10))
+        self.assertEqual(list(h.body), [u'Text 2', u'', u'Bla Bla bla'])
+
+    def test_lazy_headings(self):
+        vim.current.buffer[:] = [u_encode(i) for i in [
+                u'* TODO A :tag:', u'<2011-08-24 Wed>', u'** B', u'* C']]
+        self.document = VimBuffer().init_dom()
+        h = self.document.headings[0]
+        self.assertNotEqual(h._unparsed_heading, None)
+        self.assertEqual(h._unparsed_date, True)
+        self.assertEqual(h.level, 1)
+        self.assertEqual(h.children[0].level, 2)
+
+        # parsing on first access keeps the document clean
+        self.assertEqual(h.title, u'A')
+        self.assertEqual(h.todo, u'TODO')
+        self.assertEqual(list(h.tags), [u'tag'])
+        self.assertEqual(h._unparsed_heading, None)
+        self.assertEqual(unicode(h.active_date), u'<2011-08-24 Wed>')
+        self.assertEqual(h._unparsed_date, False)
+        self.assertEqual(self.document.headings[1].active_date, None)
+        self.assertEqual(self.document.is_dirty, False)
+
+        # changes of unparsed headings are written properly
+        h = self.document.headings[1]
+        h.tags.append(u'new')
+        self.assertEqual(h.title, u'C')
+        self.assertEqual(self.document.is_dirty, True)
+        self.document.headings[0].children[0].todo = u'DONE'
+        self.assertEqual(self.document.write(), True)
+        self.assertEqual(vim.current.buffer[2], u_encode(u'** DONE B'))
+        self.assertEqual(u_decode(vim.current.buffer[3]).split(), [u'*', u'C', u':new:'])
+
+    def test_compact_headings(self):
+        h = self.document.headings[0]
+        self.assertRaises(AttributeError, setattr, h, u'unknown', 1)
+        # lists are created on demand, bodies are copied on first access
+        self.assertEqual(h.children[0]._children, None)
+        self.assertEqual(h._tags, None)
+        self.assertEqual(h._checkboxes, None)
+        self.assertEqual(h._body, None)
+        self.assertEqual(len(h), 4)
+        self.assertEqual(h.end_of_last_child, 16)
+        self.assertEqual(h.body[0], u'Text 1')
+        self.assertNotEqual(h._source, None)
+        self.assertEqual(h.title, u'Überschrift 1')
+        self.assertEqual(h.active_date, None)
+        self.assertEqual(h._source, None)
+        self.assertEqual(self.document.is_dirty, False)
+
+        h.body.append(u'more text')
+        self.assertEqual(self.document.is_dirty, True)
+        self.assertEqual(self.document.headings[1].end, 18)
+
 class VimBufferTagsTestCase(unittest.TestCase):
     def setUp(self):
         global counter
@@ -1249,9 +1591,97 @@ Bla Bla bla bla
         self.assertRaises(ValueError, set_todo, u'DO\rNE')
         self.assertEqual(self.document.headings[0].todo, u'TODO')
 
+
+def ticks_expr(*bufnrs):
+    return u_encode(u'[%s]' % u', '.join(
+        u'getbufvar(%d, "changedtick", -1)' % b for b in bufnrs))
+
+
+class VimBufferSyncTestCase(unittest.TestCase):
+    def setUp(self):
+        vim.CMDHISTORY = []
+        vim.EVALHISTORY = []
+        vim.EVALRESULTS = {
+                u_encode(u'exists("b:org_todo_keywords")'): u_encode('0'),
+                u_encode(u'exists("g:org_todo_keywords")'): u_encode('0'),
+                u_encode(u'exists("g:org_debug")'): u_encode(u'0'),
+                u_encode(u'exists("b:org_debug")'): u_encode(u'0'),
+                u_encode(u'exists("*repeat#set()")'): u_encode(u'0'),
+                u_encode(u'b:changedtick'): u_encode(u'1'),
+                ticks_expr(2): [u_encode(u'5')],
+                ticks_expr(3): [u_encode(u'7')],
+                ticks_expr(2, 3): [u_encode(u'5'), u_encode(u'7')],
+                ticks_expr(3, 2): [u_encode(u'7'), u_encode(u'5')]}
+        vim.current.buffer[:] = [u_encode(u'* Current')]
+        vim.current.buffer.number = 1
+        self.buffers = []
+        for number, heading in ((2, u'* Second'), (3, u'* Third')):
+            b = vim.VimBuffer([u_encode(heading), u_encode(u'text')])
+            b.number = number
+            self.buffers.append(b)
+        vim.buffers = self.buffers
+
+    def tearDown(self):
+        del vim.buffers
+        vim.current.buffer.number = 0
+
+    def test_get_changedticks(self):
+        self.assertEqual(get_changedticks([]), [])
+        self.assertEqual(vim.EVALHISTORY, [])
+        self.assertEqual(get_changedticks([2, 3]), [5, 7])
+        self.assertEqual(vim.EVALHISTORY, [ticks_expr(2, 3)])
+
+    def test_changedtick_of_other_buffer(self):
+        d = VimBuffer(2)
+        self.assertEqual(d.changedtick, 5)
+        # the buffer isn't switched to read the changedtick
+        self.assertEqual(vim.CMDHISTORY, [])
+        self.assertTrue(d.is_insync)
+
+        vim.EVALRESULTS[ticks_expr(2)] = [u_encode(u'6')]
+        self.assertFalse(d.is_insync)
+
+    def test_sync_changedtick(self):
+        d = VimBuffer(2)
+        self.assertTrue(d.sync_changedtick(5))
+        self.assertFalse(d.sync_changedtick(6))
+        # once out of sync the document stays out of sync
+        self.assertFalse(d.sync_changedtick(5))
+
+    def test_get_documents(self):
+        orgmode = OrgMode()
+        second, third = orgmode.get_documents([2, 3])
+        self.assertEqual(unicode(second.headings[0]), u'* Second')
+        self.assertEqual(unicode(third.headings[0]), u'* Third')
+        self.assertEqual(vim.CMDHISTORY, [])
+
+        # documents in sync are validated with a single call into vim
+        vim.EVALHISTORY = []
+        documents = orgmode.get_documents([3, 2, 3])
+        self.assertEqual(vim.EVALHISTORY, [ticks_expr(3, 2)])
+        self.assertTrue(documents[0] is third)
+        self.assertTrue(documents[1] is second)
+        self.assertTrue(documents[2] is third)
+
+        # changed documents are updated
+        self.buffers[1][0] = u_encode(u'* Changed')
+        vim.EVALRESULTS[ticks_expr(2, 3)] = [u_encode(u'5'), u_encode(u'8')]
+        vim.EVALRESULTS[ticks_expr(3)] = [u_encode(u'8')]
+        second, third = orgmode.get_documents([2, 3])
+        self.assertTrue(second is documents[1])
+        self.assertEqual(unicode(third.headings[0]), u'* Changed')
+        self.assertTrue(third.is_insync)
+
+        # the current buffer is 0
+        current, = orgmode.get_documents([0])
+        self.assertEqual(current.bufnr, 1)
+        self.assertEqual(unicode(current.headings[0]), u'* Current')
+
+
 def suite():
     return (
         unittest.TestLoader().loadTestsFromTestCase(VimBufferTestCase),
         unittest.TestLoader().loadTestsFromTestCase(VimBufferTagsTestCase),
         unittest.TestLoader().loadTestsFromTestCase(VimBufferTodoTestCase),
+        unittest.TestLoader().loadTestsFromTestCase(VimBufferSyncTestCase),
     )